@@ -0,0 +1,115 @@
+import logging
+import re
+import threading
+import time
+import requests
+from django.core.cache import cache
+from google.auth import jwt
+
+logger = logging.getLogger(__name__)
+
+GOOGLE_CERTS_URL = 'https://www.googleapis.com/oauth2/v1/certs'
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+
+CERTS_CACHE_KEY = 'google_oauth2_certs'
+# Used when Google's response has no usable Cache-Control max-age
+DEFAULT_CERTS_MAX_AGE = 60 * 60
+# Minimum seconds between forced refreshes triggered by unknown key ids
+FORCED_REFRESH_INTERVAL = 60
+
+_MAX_AGE_RE = re.compile(r'max-age=(\d+)')
+
+# Pooled connections to googleapis.com, shared by all requests in this process
+_session = requests.Session()
+_lock = threading.Lock()
+_certs = None
+_certs_expire_at = 0.0
+_last_forced_refresh = 0.0
+
+
+def _fetch_certs():
+    """Download Google's signing certs and how long they may be cached"""
+    response = _session.get(GOOGLE_CERTS_URL, timeout=10)
+    response.raise_for_status()
+
+    match = _MAX_AGE_RE.search(response.headers.get('Cache-Control', ''))
+    max_age = int(match.group(1)) if match else DEFAULT_CERTS_MAX_AGE
+    logger.info(f"Fetched Google signing certs, cacheable for {max_age}s")
+    return response.json(), max_age
+
+
+def get_google_certs(force_refresh=False):
+    """
+    Return Google's current ID-token signing certs.
+
+    Certs are kept in process memory and in the shared cache until the
+    max-age Google sent with them expires, so only one worker in the fleet
+    downloads them per rotation period.
+
+    Args:
+        force_refresh: Skip cached copies, e.g. after seeing an unknown key id
+
+    Returns:
+        dict: Mapping of key id to PEM certificate
+    """
+    global _certs, _certs_expire_at, _last_forced_refresh
+
+    if not force_refresh and _certs is not None and time.time() < _certs_expire_at:
+        return _certs
+
+    with _lock:
+        now = time.time()
+        if force_refresh:
+            if now - _last_forced_refresh < FORCED_REFRESH_INTERVAL and _certs is not None:
+                return _certs
+            _last_forced_refresh = now
+        else:
+            if _certs is not None and now < _certs_expire_at:
+                return _certs
+
+            cached = cache.get(CERTS_CACHE_KEY)
+            if cached is not None:
+                certs, expire_at = cached
+                if now < expire_at:
+                    _certs, _certs_expire_at = certs, expire_at
+                    return certs
+
+        certs, max_age = _fetch_certs()
+        expire_at = now + max_age
+        if max_age > 0:
+            cache.set(CERTS_CACHE_KEY, (certs, expire_at), max_age)
+        _certs, _certs_expire_at = certs, expire_at
+        return certs
+
+
+def verify_google_id_token(token, audience):
+    """
+    Verify a Google ID token locally against cached signing certs.
+
+    Drop-in replacement for google.oauth2.id_token.verify_oauth2_token that
+    does not download the certs on every call.
+
+    Args:
+        token: The encoded ID token
+        audience: The OAuth client ID the token must be issued for
+
+    Returns:
+        dict: The verified token claims
+
+    Raises:
+        ValueError: If the token is malformed, expired, has a bad signature,
+            the wrong audience or the wrong issuer
+    """
+    certs = get_google_certs()
+
+    key_id = jwt.decode_header(token).get('kid')
+    if key_id and key_id not in certs:
+        # Google rotated its keys before our cached copy expired
+        certs = get_google_certs(force_refresh=True)
+
+    idinfo = jwt.decode(token, certs=certs, audience=audience)
+
+    if idinfo.get('iss') not in GOOGLE_ISSUERS:
+        raise ValueError(f"Wrong issuer. 'iss' should be one of the following: {GOOGLE_ISSUERS}")
+
+    return idinfo
@@ -0,0 +1,79 @@
+import decimal
+import math
+import orjson
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+_fallback_encoder = JSONEncoder()
+
+# Dates and times go through DRF's encoder too, so UTC datetimes end in Z like JSONRenderer's
+_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+# orjson writes these raw; JSONRenderer escapes them so the output is also valid JavaScript
+_LINE_SEPARATORS = ((b'\xe2\x80\xa8', b'\\u2028'), (b'\xe2\x80\xa9', b'\\u2029'))
+
+
+def _default(obj):
+    """Encode what orjson doesn't know natively (Decimal, lazy strings, ...) the way DRF does"""
+    return _fallback_encoder.default(obj)
+
+
+def _has_non_finite(data):
+    """Whether data holds a NaN or infinite number, which orjson would quietly write as null"""
+    stack = [data]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                return True
+        elif isinstance(value, decimal.Decimal):
+            if not value.is_finite():
+                return True
+        elif isinstance(value, dict):
+            stack.extend(value.values())
+        elif isinstance(value, (list, tuple)):
+            stack.extend(value)
+    return False
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Drop-in replacement for DRF's JSONRenderer backed by orjson
+
+    Compact, non-ASCII-escaped output, which is what JSONRenderer produces
+    with DRF's default settings, is rendered by orjson with the same bytes.
+    Indented responses (the browsable API, "; indent=" media types) and the
+    ensure_ascii and non-compact settings are left to JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if self.ensure_ascii or not self.compact or self.get_indent(accepted_media_type, renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+
+        ret = orjson.dumps(data, default=_default, option=_OPTIONS)
+        # NaN and Infinity can only have become null, so most responses skip the scan
+        if self.strict and b'null' in ret and _has_non_finite(data):
+            raise ValueError("Out of range float values are not JSON compliant")
+        for raw, escaped in _LINE_SEPARATORS:
+            if raw in ret:
+                ret = ret.replace(raw, escaped)
+        return ret
+
+
+def sse_event(event, data):
+    """Encode one Server-Sent Event with a JSON payload"""
+    return b'event: ' + event.encode() + b'\ndata: ' + orjson.dumps(data, default=_default, option=_OPTIONS) + b'\n\n'
+
+
+class EventStreamRenderer(BaseRenderer):
+    """Renders plain responses of Server-Sent Event endpoints, e.g. errors raised before streaming starts"""
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        response = renderer_context.get('response') if renderer_context else None
+        event = 'error' if response is not None and response.status_code >= 400 else 'message'
+        return sse_event(event, data)
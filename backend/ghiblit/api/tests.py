@@ -1,3 +1,269 @@
-from django.test import TestCase
+import time
+import uuid
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from config.caching import get_or_rebuild
+from users.models import UserProfile
+from . import google_auth
+from .renderers import ORJSONRenderer
 
-# Create your tests here.
+
+GOOGLE_CLAIMS = {
+    'iss': 'https://accounts.google.com',
+    'sub': '1234567890',
+    'email': 'ada@example.com',
+    'given_name': 'Ada',
+    'family_name': 'Lovelace',
+}
+
+
+# Budgets for the production setup with Redis, standing in for it with LocMemCache. Without Redis
+# every login also inserts an OutstandingToken, and cache reads and writes become queries
+@mock.patch.dict('os.environ', {'GOOGLE_CLIENT_ID': 'test-client-id'})
+@override_settings(
+    JWT_BLACKLIST_REDIS=True,
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class GoogleLoginQueryBudgetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def login(self, claims=GOOGLE_CLAIMS):
+        with mock.patch('api.views_auth.verify_google_id_token', return_value=claims):
+            return self.client.post(
+                reverse('google-login'),
+                {'id_token': 'token'},
+                content_type='application/json',
+            )
+
+    def test_existing_user_login(self):
+        # user+profile select
+        User.objects.create_user(username='google_1234567890', email='ada@example.com', first_name='Ada', last_name='Lovelace')
+
+        with self.assertNumQueries(1):
+            response = self.login()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['profile']['credit_balance'], 0)
+
+    def test_existing_user_login_with_changed_name(self):
+        # user+profile select, name update
+        User.objects.create_user(username='google_1234567890', email='ada@example.com', first_name='Augusta', last_name='King')
+
+        with self.assertNumQueries(2):
+            response = self.login()
+
+        self.assertEqual(response.status_code, 200)
+        user = User.objects.get(email='ada@example.com')
+        self.assertEqual((user.first_name, user.last_name), ('Ada', 'Lovelace'))
+
+    def test_new_user_login(self):
+        # user select, username allocation, user insert, profile insert
+        with self.assertNumQueries(4):
+            response = self.login()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['username'], 'google_1234567890')
+        self.assertTrue(UserProfile.objects.filter(user__email='ada@example.com').exists())
+
+    def test_existing_user_without_profile(self):
+        user = User.objects.create_user(username='google_1234567890', email='ada@example.com', first_name='Ada', last_name='Lovelace')
+        UserProfile.objects.filter(user=user).delete()
+        created = UserProfile(user=user, credit_balance=7)
+
+        # Another login creates the profile between this one's user select and its insert
+        real_get_or_create = UserProfile.objects.get_or_create
+
+        def get_or_create(**kwargs):
+            if not UserProfile.objects.filter(user=user).exists():
+                created.save()
+            return real_get_or_create(**kwargs)
+
+        with mock.patch.object(UserProfile.objects, 'get_or_create', side_effect=get_or_create):
+            response = self.login()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['user']['profile']['credit_balance'], 7)
+        self.assertEqual(UserProfile.objects.filter(user=user).count(), 1)
+
+    def test_new_user_username_collision(self):
+        User.objects.create_user(username='google_1234567890', email='other@example.com')
+        User.objects.create_user(username='google_1234567890_1', email='another@example.com')
+
+        with self.assertNumQueries(4):
+            response = self.login()
+
+        self.assertEqual(response.json()['user']['username'], 'google_1234567890_2')
+
+
+    @override_settings(COMPRESSION_MIN_SIZE=0)
+    def test_tokens_are_not_compressed(self):
+        User.objects.create_user(username='google_1234567890', email='ada@example.com', first_name='Ada', last_name='Lovelace')
+
+        with mock.patch('api.views_auth.verify_google_id_token', return_value=GOOGLE_CLAIMS):
+            response = self.client.post(
+                reverse('google-login'),
+                {'id_token': 'token'},
+                content_type='application/json',
+                HTTP_ACCEPT_ENCODING='gzip, br',
+            )
+
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.has_header('Content-Encoding'))
+        self.assertIn('access', response.json())
+
+
+class ORJSONRendererTests(TestCase):
+    def assert_matches_drf(self, data, accepted_media_type=None):
+        self.assertEqual(
+            ORJSONRenderer().render(data, accepted_media_type),
+            JSONRenderer().render(data, accepted_media_type),
+        )
+
+    def test_output_matches_json_renderer(self):
+        data = {
+            'created_at': datetime(2024, 5, 1, 12, 30, 15, 123456, tzinfo=timezone.utc),
+            'day': date(2024, 5, 1),
+            'amount': Decimal('9.99'),
+            'token': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'label': gettext_lazy('Ghibli'),
+            'caption': 'line\u2028break\u2029and \u00e9',
+            'sizes': (256, 512),
+            'ratio': 1.5,
+            'paid': None,
+        }
+        self.assert_matches_drf(data)
+        self.assert_matches_drf([data, data])
+
+    def test_indented_output_matches_json_renderer(self):
+        self.assert_matches_drf({'a': [1, {'b': 'c'}]}, 'application/json; indent=4')
+
+    def test_non_finite_floats_are_rejected(self):
+        for value in (float('nan'), float('inf'), Decimal('-Infinity')):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    ORJSONRenderer().render({'values': [1, {'x': value}]})
+
+
+class GoogleCertsCacheTests(TestCase):
+    CERTS = {'kid-1': 'cert-1'}
+
+    def setUp(self):
+        cache.clear()
+        # Start every test with a cold process-level copy
+        for name, value in (('_certs', None), ('_certs_expire_at', 0.0), ('_last_forced_refresh', 0.0)):
+            patcher = mock.patch.object(google_auth, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def fetch(self, certs=CERTS, cache_control='public, max-age=3600'):
+        response = mock.Mock(headers={'Cache-Control': cache_control})
+        response.json.return_value = certs
+        return mock.patch.object(google_auth._session, 'get', return_value=response)
+
+    def test_certs_are_fetched_once(self):
+        with self.fetch() as get:
+            self.assertEqual(google_auth.get_google_certs(), self.CERTS)
+            self.assertEqual(google_auth.get_google_certs(), self.CERTS)
+
+        get.assert_called_once()
+
+    def test_other_processes_use_the_shared_cache(self):
+        with self.fetch():
+            google_auth.get_google_certs()
+        google_auth._certs = None
+
+        with self.fetch() as get:
+            self.assertEqual(google_auth.get_google_certs(), self.CERTS)
+
+        get.assert_not_called()
+
+    def test_certs_expire_with_max_age(self):
+        with self.fetch(cache_control='public, max-age=60'):
+            google_auth.get_google_certs()
+
+        with mock.patch('api.google_auth.time.time', return_value=google_auth._certs_expire_at + 1):
+            with self.fetch({'kid-2': 'cert-2'}) as get:
+                self.assertEqual(google_auth.get_google_certs(), {'kid-2': 'cert-2'})
+
+        get.assert_called_once()
+
+    def test_forced_refreshes_are_rate_limited(self):
+        with self.fetch():
+            google_auth.get_google_certs()
+
+        with self.fetch({'kid-2': 'cert-2'}) as get:
+            self.assertEqual(google_auth.get_google_certs(force_refresh=True), {'kid-2': 'cert-2'})
+            self.assertEqual(google_auth.get_google_certs(force_refresh=True), {'kid-2': 'cert-2'})
+
+        get.assert_called_once()
+
+    def test_unknown_key_id_refreshes_certs(self):
+        with self.fetch():
+            google_auth.get_google_certs()
+
+        claims = dict(GOOGLE_CLAIMS, aud='test-client-id')
+        with self.fetch({'kid-2': 'cert-2'}) as get, \
+                mock.patch.object(google_auth.jwt, 'decode_header', return_value={'kid': 'kid-2'}), \
+                mock.patch.object(google_auth.jwt, 'decode', return_value=claims) as decode:
+            self.assertEqual(google_auth.verify_google_id_token('token', 'test-client-id'), claims)
+
+        get.assert_called_once()
+        decode.assert_called_once_with('token', certs={'kid-2': 'cert-2'}, audience='test-client-id')
+
+
+class GetOrRebuildTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.builder = mock.Mock(return_value='fresh')
+
+    def set_stale(self, value='stale'):
+        # Built a second ago and fresh until 10 seconds ago
+        cache.set('key', (value, time.time() - 10, 1.0), 60)
+
+    def test_cold_key_is_built_once(self):
+        self.assertEqual(get_or_rebuild('key', self.builder, timeout=60), 'fresh')
+        self.assertEqual(get_or_rebuild('key', self.builder, timeout=60), 'fresh')
+
+        self.builder.assert_called_once()
+
+    def test_fresh_value_is_not_rebuilt_early_without_beta(self):
+        cache.set('key', ('cached', time.time() + 1, 1000.0), 60)
+
+        self.assertEqual(get_or_rebuild('key', self.builder, timeout=60, beta=0), 'cached')
+        self.builder.assert_not_called()
+
+    def test_stale_value_is_rebuilt(self):
+        self.set_stale()
+
+        self.assertEqual(get_or_rebuild('key', self.builder, timeout=60), 'fresh')
+        self.assertEqual(cache.get('key')[0], 'fresh')
+
+    def test_stale_value_is_served_during_another_rebuild(self):
+        self.set_stale()
+        cache.add('key:rebuild_lock', True, 30)
+
+        self.assertEqual(get_or_rebuild('key', self.builder, timeout=60), 'stale')
+        self.builder.assert_not_called()
+
+    def test_failed_rebuild_serves_stale_value(self):
+        self.set_stale()
+        self.builder.side_effect = RuntimeError('database down')
+
+        self.assertEqual(get_or_rebuild('key', self.builder, timeout=60), 'stale')
+        self.assertIsNone(cache.get('key:rebuild_lock'))
+
+    def test_cold_key_waits_for_the_rebuilding_worker_then_builds(self):
+        cache.add('key:rebuild_lock', True, 30)
+
+        self.assertEqual(get_or_rebuild('key', self.builder, timeout=60, wait_timeout=0.1), 'fresh')
+        self.builder.assert_called_once()
+        # Only the lock holder caches
+        self.assertIsNone(cache.get('key'))
@@ -4,7 +4,7 @@ from rest_framework_simplejwt.views import (
     TokenRefreshView,
 )
 from users.views import UserProfileView, LogoutView
-from images.views import ImageTransformAPIView, recent_images, serve_cleaned_image, download_image, user_images
+from images.views import ImageTransformAPIView, ImageTransformStreamAPIView, recent_images, serve_cleaned_image, download_image, user_images, export_images, promote_draft, image_pool_stats
 from images.views_custom_styles import CustomStyleListCreateView, CustomStyleDeleteView
 from .views_auth import GoogleLoginView
 
@@ -15,9 +15,13 @@ urlpatterns = [
     path('google-login/', GoogleLoginView.as_view(), name='google-login'),
 
     path('transform/', ImageTransformAPIView.as_view(), name='transform-image'),
+    path('transform/stream/', ImageTransformStreamAPIView.as_view(), name='transform-image-stream'),
     path('images/recent/', recent_images, name='recent-images'),
     path('images/user/', user_images, name='user-images'),
     path('images/download/<int:image_id>/', download_image, name='download-image'),
+    path('images/export/', export_images, name='export-images'),
+    path('images/<int:image_id>/promote/', promote_draft, name='promote-draft'),
+    path('images/pool-stats/', image_pool_stats, name='image-pool-stats'),
 
     path('clean-image/<path:image_path>', serve_cleaned_image, name='clean-image'),
 
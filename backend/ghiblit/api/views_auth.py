@@ -5,14 +5,27 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
-from rest_framework_simplejwt.tokens import RefreshToken
-from google.oauth2 import id_token
-from google.auth.transport import requests as google_requests
 from users.models import UserProfile
-from django.core.cache import cache 
+from users.cache import invalidate_user_cache
+from users.tokens import CachedBlacklistRefreshToken
+from .google_auth import verify_google_id_token
 
 logger = logging.getLogger(__name__)
 
+
+def allocate_username(base_username):
+    """Return base_username, or the first free base_username_<n>, using a single query"""
+    taken = set(
+        User.objects.filter(username__startswith=base_username).values_list('username', flat=True)
+    )
+    username = base_username
+    counter = 1
+    while username in taken:
+        username = f"{base_username}_{counter}"
+        counter += 1
+    return username
+
+
 class GoogleLoginView(APIView):
     permission_classes = [AllowAny]
 
@@ -36,14 +49,7 @@ class GoogleLoginView(APIView):
                     status=status.HTTP_500_INTERNAL_SERVER_ERROR
                 )
 
-            idinfo = id_token.verify_oauth2_token(
-                id_token_jwt,
-                google_requests.Request(),
-                CLIENT_ID
-            )
-
-            if idinfo['iss'] not in ['accounts.google.com', 'https://accounts.google.com']:
-                raise ValueError('Invalid token issuer')
+            idinfo = verify_google_id_token(id_token_jwt, CLIENT_ID)
 
             google_id = idinfo['sub']
             email = idinfo.get('email', '')
@@ -60,47 +66,37 @@ class GoogleLoginView(APIView):
 
             logger.info(f"Google user authenticated: {email}")
 
-            user = None
-            profile_created = False
-            try:
-                user = User.objects.get(email=email)
+            account_changed = False
+            user = User.objects.select_related('profile').filter(email=email).first()
+            if user is not None:
                 if user.first_name != given_name or user.last_name != family_name:
                     user.first_name = given_name
                     user.last_name = family_name
-                    user.save()
+                    user.save(update_fields=['first_name', 'last_name'])
+                    account_changed = True
                     logger.info(f"Updated user profile names for {email}")
-
-            except User.DoesNotExist:
-                username = f"google_{google_id}"[:30]
-                base_username = username
-                counter = 1
-                while User.objects.filter(username=username).exists():
-                    username = f"{base_username}_{counter}"
-                    counter += 1
-
+            else:
                 user = User.objects.create_user(
-                    username=username,
+                    username=allocate_username(f"google_{google_id}"[:30]),
                     email=email,
                     first_name=given_name,
                     last_name=family_name,
                 )
+                account_changed = True
                 logger.info(f"Created new user for {email}")
 
-            profile, created = UserProfile.objects.get_or_create(user=user)
-            profile_created = created
-
-            if profile_created:
-                # profile.credit_balance = 1
-                profile.free_transform_used = False
-                profile.save()
-                # logger.info(f"Granted 1 initial credit to new user {email}")
-                cache.delete(f'user_profile_{user.id}')
-
-            cache.delete(f'user_profile_{user.id}')
+            try:
+                # Loaded by select_related, or cached by the post_save signal for new users
+                profile = user.profile
+            except UserProfile.DoesNotExist:
+                # Another login may create it first, so read back whichever row won
+                profile, _ = UserProfile.objects.get_or_create(user=user)
+                account_changed = True
 
-            refresh = RefreshToken.for_user(user)
+            if account_changed:
+                invalidate_user_cache(user.id)
 
-            profile.refresh_from_db()
+            refresh = CachedBlacklistRefreshToken.for_user(user)
 
             return Response({
                 'access': str(refresh.access_token),
@@ -0,0 +1,220 @@
+import logging
+import os
+import pickle
+import threading
+import time
+from cachetools import TTLCache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django_redis.cache import RedisCache
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = 'cache_invalidation'
+# Published instead of a key list when every local entry must be dropped
+INVALIDATE_ALL = '*'
+
+
+class TwoTierRedisCache(RedisCache):
+    """
+    Redis cache with a small in-process LRU in front of it for hot keys.
+
+    Only keys starting with one of the configured prefixes are kept locally.
+    Every write or delete of such a key is broadcast over Redis pub/sub and
+    each process drops its local copy, so reads take microseconds while
+    invalidation stays correct across workers and nodes. Local entries also
+    expire after a short TTL in case an invalidation message is lost.
+
+    Configured through an "L1" dict next to the usual django-redis settings:
+    MAX_ENTRIES, TIMEOUT (seconds) and KEY_PREFIXES.
+    """
+
+    def __init__(self, server, params):
+        super().__init__(server, params)
+        l1_options = params.get('L1', {})
+        self._l1 = TTLCache(
+            maxsize=l1_options.get('MAX_ENTRIES', 1024),
+            ttl=l1_options.get('TIMEOUT', 60),
+        )
+        self._l1_prefixes = tuple(l1_options.get('KEY_PREFIXES', ()))
+        self._l1_lock = threading.Lock()
+        # Incremented on every invalidation; a read that raced one is not stored locally
+        self._l1_generation = 0
+        self._listener_pid = None
+        self._listener_ready = threading.Event()
+
+    # Local tier
+
+    def _is_hot(self, key):
+        return bool(self._l1_prefixes) and str(key).startswith(self._l1_prefixes)
+
+    def _ensure_listener(self):
+        """Start the invalidation listener for this process (again after a fork)"""
+        pid = os.getpid()
+        if self._listener_pid == pid:
+            return
+        with self._l1_lock:
+            if self._listener_pid == pid:
+                return
+            self._listener_pid = pid
+            self._listener_ready = threading.Event()
+            self._l1.clear()
+            thread = threading.Thread(
+                target=self._listen,
+                args=(self._listener_ready,),
+                name='cache-invalidation-listener',
+                daemon=True,
+            )
+            thread.start()
+
+    def _listen(self, ready):
+        while True:
+            pubsub = None
+            try:
+                pubsub = self.client.get_client(write=False).pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                ready.set()
+                for message in pubsub.listen():
+                    if message.get('type') != 'message':
+                        continue
+                    data = message['data']
+                    if isinstance(data, bytes):
+                        data = data.decode()
+                    self._evict_local(None if data == INVALIDATE_ALL else data.split('\n'))
+            except Exception as e:
+                logger.warning(f"Cache invalidation listener disconnected: {str(e)}")
+            finally:
+                # Without a subscription local entries can't be trusted
+                ready.clear()
+                self._evict_local(None)
+                if pubsub is not None:
+                    try:
+                        pubsub.close()
+                    except Exception:
+                        pass
+            time.sleep(1)
+
+    def _evict_local(self, full_keys):
+        with self._l1_lock:
+            self._l1_generation += 1
+            if full_keys is None:
+                self._l1.clear()
+            else:
+                for full_key in full_keys:
+                    self._l1.pop(full_key, None)
+
+    def _invalidate(self, keys, version=None):
+        """Drop keys locally and tell every other process to do the same"""
+        full_keys = [str(self.make_key(key, version=version)) for key in keys if self._is_hot(key)]
+        if not full_keys:
+            return
+        self._evict_local(full_keys)
+        try:
+            self.client.get_client(write=True).publish(INVALIDATION_CHANNEL, '\n'.join(full_keys))
+        except Exception as e:
+            logger.warning(f"Failed to broadcast cache invalidation: {str(e)}")
+
+    def _local_enabled(self):
+        self._ensure_listener()
+        return self._listener_ready.is_set()
+
+    # Reads
+
+    def get(self, key, default=None, version=None, client=None):
+        if client is not None or not self._is_hot(key) or not self._local_enabled():
+            return super().get(key, default=default, version=version, client=client)
+
+        full_key = str(self.make_key(key, version=version))
+        with self._l1_lock:
+            pickled = self._l1.get(full_key)
+            generation = self._l1_generation
+        if pickled is not None:
+            return pickle.loads(pickled)
+
+        missing = object()
+        value = super().get(key, default=missing, version=version)
+        if value is missing:
+            return default
+
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._l1_lock:
+            if self._l1_generation == generation:
+                self._l1[full_key] = pickled
+        return value
+
+    def get_many(self, keys, version=None, client=None):
+        if client is not None or not self._local_enabled():
+            return super().get_many(keys, version=version, client=client)
+
+        found = {}
+        remote_keys = []
+        for key in keys:
+            if not self._is_hot(key):
+                remote_keys.append(key)
+                continue
+            full_key = str(self.make_key(key, version=version))
+            with self._l1_lock:
+                pickled = self._l1.get(full_key)
+            if pickled is None:
+                remote_keys.append(key)
+            else:
+                found[key] = pickle.loads(pickled)
+
+        if remote_keys:
+            found.update(super().get_many(remote_keys, version=version))
+        return found
+
+    # Writes
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None, nx=False, xx=False):
+        result = super().set(key, value, timeout=timeout, version=version, client=client, nx=nx, xx=xx)
+        self._invalidate([key], version=version)
+        return result
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        result = super().add(key, value, timeout=timeout, version=version, client=client)
+        if result:
+            self._invalidate([key], version=version)
+        return result
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        result = super().set_many(data, timeout=timeout, version=version, client=client)
+        self._invalidate(list(data), version=version)
+        return result
+
+    def delete(self, key, version=None, prefix=None, client=None):
+        result = super().delete(key, version=version, prefix=prefix, client=client)
+        self._invalidate([key], version=version)
+        return result
+
+    def delete_many(self, keys, version=None, client=None):
+        keys = list(keys)
+        result = super().delete_many(keys, version=version, client=client)
+        self._invalidate(keys, version=version)
+        return result
+
+    def incr(self, key, delta=1, version=None, client=None, ignore_key_check=False):
+        result = super().incr(key, delta=delta, version=version, client=client, ignore_key_check=ignore_key_check)
+        self._invalidate([key], version=version)
+        return result
+
+    def decr(self, key, delta=1, version=None, client=None, ignore_key_check=False):
+        result = super().decr(key, delta=delta, version=version, client=client, ignore_key_check=ignore_key_check)
+        self._invalidate([key], version=version)
+        return result
+
+    def delete_pattern(self, *args, **kwargs):
+        result = super().delete_pattern(*args, **kwargs)
+        self._broadcast_clear()
+        return result
+
+    def clear(self, *args, **kwargs):
+        result = super().clear(*args, **kwargs)
+        self._broadcast_clear()
+        return result
+
+    def _broadcast_clear(self):
+        self._evict_local(None)
+        try:
+            self.client.get_client(write=True).publish(INVALIDATION_CHANNEL, INVALIDATE_ALL)
+        except Exception as e:
+            logger.warning(f"Failed to broadcast cache clear: {str(e)}")
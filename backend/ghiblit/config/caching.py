@@ -0,0 +1,78 @@
+import logging
+import math
+import random
+import time
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+
+def _rebuild(key, builder, timeout, stale_timeout):
+    started = time.time()
+    value = builder()
+    finished = time.time()
+    # Entries outlive their freshness window so stale copies can be served during a rebuild
+    cache.set(key, (value, finished + timeout, finished - started), timeout + stale_timeout)
+    return value
+
+
+def get_or_rebuild(key, builder, timeout, stale_timeout=None, beta=1.0, lock_timeout=30, wait_timeout=5):
+    """
+    Return a cached value, rebuilding it with at most one worker per key.
+
+    Fresh values are returned as-is. As an entry nears expiry, callers
+    volunteer to refresh it early with a probability that grows with how
+    long the last rebuild took (XFetch), which spreads refreshes out before
+    the deadline. Stale entries are served while the single worker holding
+    the rebuild lock recomputes them, and cold keys make other callers wait
+    briefly for that worker instead of all recomputing at once.
+
+    Args:
+        key: Cache key for the value
+        builder: Zero-argument callable that computes the value
+        timeout: Seconds the value is considered fresh
+        stale_timeout: Extra seconds a stale value may be served while rebuilding
+            (defaults to timeout)
+        beta: Early-refresh eagerness; 0 disables early refresh
+        lock_timeout: Seconds before an abandoned rebuild lock expires
+        wait_timeout: Seconds a caller waits on a cold key before building itself
+
+    Returns:
+        The cached or freshly built value
+    """
+    if stale_timeout is None:
+        stale_timeout = timeout
+    lock_key = f'{key}:rebuild_lock'
+
+    entry = cache.get(key)
+    if entry is not None:
+        value, fresh_until, build_seconds = entry
+        early_by = -build_seconds * beta * math.log(1.0 - random.random())
+        if time.time() + early_by < fresh_until:
+            return value
+
+        if not cache.add(lock_key, True, lock_timeout):
+            return value
+        try:
+            return _rebuild(key, builder, timeout, stale_timeout)
+        except Exception as e:
+            logger.exception(f"Rebuilding cache key {key} failed, serving stale value: {str(e)}")
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    if cache.add(lock_key, True, lock_timeout):
+        try:
+            return _rebuild(key, builder, timeout, stale_timeout)
+        finally:
+            cache.delete(lock_key)
+
+    deadline = time.monotonic() + wait_timeout
+    while time.monotonic() < deadline:
+        time.sleep(0.05)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry[0]
+
+    logger.warning(f"Timed out waiting for cache key {key} to be rebuilt, building without caching")
+    return builder()
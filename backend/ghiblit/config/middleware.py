@@ -0,0 +1,75 @@
+import re
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+_ACCEPTS_BR = re.compile(r'\bbr\b')
+_ACCEPTS_GZIP = re.compile(r'\bgzip\b')
+
+
+class JSONCompressionMiddleware:
+    """
+    Compress JSON responses above COMPRESSION_MIN_SIZE bytes.
+
+    Brotli is preferred when the client accepts it and the brotli package is
+    installed, otherwise gzip. Images and other already-compressed content
+    are left alone, unlike Django's GZipMiddleware.
+
+    Compressed sizes can leak secrets that share a response with reflected
+    input (BREACH), so responses of COMPRESSION_EXCLUDED_URL_NAMES, the
+    views that return JWTs, are never compressed, and gzip output gets the
+    same random-length padding GZipMiddleware adds.
+    """
+
+    # As in GZipMiddleware
+    max_random_bytes = 100
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.min_size = getattr(settings, 'COMPRESSION_MIN_SIZE', 1024)
+        self.content_types = tuple(getattr(settings, 'COMPRESSION_CONTENT_TYPES', ('application/json',)))
+        self.excluded_url_names = frozenset(getattr(settings, 'COMPRESSION_EXCLUDED_URL_NAMES', ()))
+
+    def __call__(self, request):
+        response = self.get_response(request)
+
+        if response.streaming or response.has_header('Content-Encoding'):
+            return response
+        if not response.get('Content-Type', '').startswith(self.content_types):
+            return response
+        resolver_match = getattr(request, 'resolver_match', None)
+        if resolver_match is not None and resolver_match.url_name in self.excluded_url_names:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if len(response.content) < self.min_size:
+            return response
+
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if brotli is not None and _ACCEPTS_BR.search(accept_encoding):
+            compressed = brotli.compress(response.content, quality=4)
+            encoding = 'br'
+        elif _ACCEPTS_GZIP.search(accept_encoding):
+            compressed = compress_string(response.content, max_random_bytes=self.max_random_bytes)
+            encoding = 'gzip'
+        else:
+            return response
+
+        if len(compressed) >= len(response.content):
+            return response
+
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        response['Content-Encoding'] = encoding
+
+        # The compressed body is a different representation, so a strong ETag no longer holds
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+
+        return response
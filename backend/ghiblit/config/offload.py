@@ -0,0 +1,74 @@
+import mimetypes
+from urllib.parse import quote
+from django.conf import settings
+from django.http import Http404, HttpResponse
+from django.utils._os import safe_join
+from django.views.static import serve
+
+X_ACCEL_REDIRECT = 'x-accel-redirect'
+X_SENDFILE = 'x-sendfile'
+
+
+def _offload_mode():
+    return getattr(settings, 'MEDIA_OFFLOAD_MODE', '').lower()
+
+
+def _offloaded_response(header, location, content_type, filename, as_attachment):
+    response = HttpResponse(content_type=content_type)
+    response[header] = location
+    if filename:
+        disposition = 'attachment' if as_attachment else 'inline'
+        response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
+    return response
+
+
+def offload_media_file(path, content_type, filename=None, as_attachment=False):
+    """
+    Hand a file under MEDIA_ROOT to the front proxy.
+
+    Returns:
+        HttpResponse: An empty response carrying the offload header, or None
+            when MEDIA_OFFLOAD_MODE is off
+    """
+    mode = _offload_mode()
+    if mode not in (X_ACCEL_REDIRECT, X_SENDFILE):
+        return None
+
+    # Raises SuspiciousFileOperation for paths escaping MEDIA_ROOT
+    full_path = safe_join(settings.MEDIA_ROOT, path)
+
+    if mode == X_ACCEL_REDIRECT:
+        location = settings.MEDIA_OFFLOAD_MEDIA_LOCATION + quote(path.lstrip('/'))
+        return _offloaded_response('X-Accel-Redirect', location, content_type, filename, as_attachment)
+    return _offloaded_response('X-Sendfile', full_path, content_type, filename, as_attachment)
+
+
+def offload_storage_object(bucket_name, object_name, content_type, filename=None, as_attachment=False):
+    """
+    Hand an object in public storage to the front proxy.
+
+    Only nginx can do this: MEDIA_OFFLOAD_STORAGE_LOCATION must be an
+    `internal` location that proxies to the storage public URL prefix.
+
+    Returns:
+        HttpResponse: An empty response carrying X-Accel-Redirect, or None
+            when offload is off or the proxy can't fetch remote objects
+    """
+    if _offload_mode() != X_ACCEL_REDIRECT:
+        return None
+
+    object_name = object_name.lstrip('/')
+    if '..' in object_name.split('/'):
+        raise Http404("Invalid image path")
+
+    location = f"{settings.MEDIA_OFFLOAD_STORAGE_LOCATION}{bucket_name}/{quote(object_name)}"
+    return _offloaded_response('X-Accel-Redirect', location, content_type, filename, as_attachment)
+
+
+def serve_media(request, path):
+    """Serve MEDIA_ROOT files through the front proxy when offload is on, else via Django"""
+    content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    response = offload_media_file(path, content_type)
+    if response is None:
+        return serve(request, path, document_root=settings.MEDIA_ROOT)
+    return response
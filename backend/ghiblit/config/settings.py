@@ -39,6 +39,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'config.middleware.JSONCompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -103,23 +104,107 @@ AWS_S3_OBJECT_PARAMETERS = {
     'CacheControl': 'max-age=86400',
 }
 
+# Redirect image downloads to short-lived signed storage URLs instead of proxying the bytes
+IMAGE_DOWNLOAD_REDIRECT = os.environ.get('IMAGE_DOWNLOAD_REDIRECT', 'False') == 'True'
+IMAGE_DOWNLOAD_URL_EXPIRES = int(os.environ.get('IMAGE_DOWNLOAD_URL_EXPIRES', 300))
+
+# Resize generated images back to the upload's full resolution (costs CPU, adds no detail)
+IMAGE_UPSCALE_TO_ORIGINAL = os.environ.get('IMAGE_UPSCALE_TO_ORIGINAL', 'False') == 'True'
+
+# Credits charged per transform; drafts are quick low-quality renders that can be promoted later
+TRANSFORM_CREDIT_COST = int(os.environ.get('TRANSFORM_CREDIT_COST', 1))
+DRAFT_CREDIT_COST = int(os.environ.get('DRAFT_CREDIT_COST', 0))
+PROMOTE_CREDIT_COST = int(os.environ.get('PROMOTE_CREDIT_COST', 1))
+DRAFT_DAILY_LIMIT = int(os.environ.get('DRAFT_DAILY_LIMIT', 20))
+IMAGE_DRAFT_QUALITY = os.environ.get('IMAGE_DRAFT_QUALITY', 'low')
+IMAGE_DRAFT_MAX_SIZE = int(os.environ.get('IMAGE_DRAFT_MAX_SIZE', 768))
+
+# Partial renders (0-3) relayed by the streaming transform endpoint
+IMAGE_STREAM_PARTIAL_IMAGES = int(os.environ.get('IMAGE_STREAM_PARTIAL_IMAGES', 2))
+
+# Output encoder: format ('JPEG' or 'WEBP') and the lowest SSIM against the source a quality may score
+IMAGE_OUTPUT_FORMAT = os.environ.get('IMAGE_OUTPUT_FORMAT', 'JPEG')
+IMAGE_TARGET_SSIM = float(os.environ.get('IMAGE_TARGET_SSIM', 0.99))
+IMAGE_QUALITY_RANGE = (
+    int(os.environ.get('IMAGE_QUALITY_MIN', 60)),
+    int(os.environ.get('IMAGE_QUALITY_MAX', 95)),
+)
+ENCODER_QUALITY_CACHE_TIMEOUT = int(os.environ.get('ENCODER_QUALITY_CACHE_TIMEOUT', 60 * 60 * 24))
+
+# Bulk ZIP export: concurrent storage downloads per export, and where finished archives are kept for resumes
+IMAGE_EXPORT_FETCH_CONCURRENCY = int(os.environ.get('IMAGE_EXPORT_FETCH_CONCURRENCY', 4))
+IMAGE_EXPORT_CACHE_DIR = os.environ.get('IMAGE_EXPORT_CACHE_DIR', '')
+IMAGE_EXPORT_CACHE_TIMEOUT = int(os.environ.get('IMAGE_EXPORT_CACHE_TIMEOUT', 60 * 60))
+
+# Process pool for CPU-bound Pillow work in each web worker; 0 workers splits the available
+# cores between the WEB_CONCURRENCY web worker processes
+IMAGE_POOL_ENABLED = os.environ.get('IMAGE_POOL_ENABLED', 'True') == 'True'
+IMAGE_POOL_WORKERS = int(os.environ.get('IMAGE_POOL_WORKERS', 0))
+# Each process shares its pool counters through the cache every IMAGE_POOL_STATS_INTERVAL seconds
+# for the admin stats endpoint; processes idle for IMAGE_POOL_STATS_TIMEOUT seconds drop out
+IMAGE_POOL_STATS_INTERVAL = int(os.environ.get('IMAGE_POOL_STATS_INTERVAL', 5))
+IMAGE_POOL_STATS_TIMEOUT = int(os.environ.get('IMAGE_POOL_STATS_TIMEOUT', 60 * 10))
+
+# Resized/re-encoded variants served by /clean-image/ (?w=&h=&fmt=): sizes snap up to the nearest of
+# IMAGE_VARIANT_SIZES, renders wait up to IMAGE_VARIANT_QUEUE_TIMEOUT for an image pool slot, variants up
+# to IMAGE_VARIANT_CACHE_MAX_BYTES are cached whole and larger ones are re-read from storage
+IMAGE_VARIANT_SIZES = tuple(
+    int(size) for size in os.environ.get('IMAGE_VARIANT_SIZES', '256,512,768,1024,1536').split(',')
+)
+IMAGE_VARIANT_QUALITY = int(os.environ.get('IMAGE_VARIANT_QUALITY', 80))
+IMAGE_VARIANT_QUEUE_TIMEOUT = float(os.environ.get('IMAGE_VARIANT_QUEUE_TIMEOUT', 0.5))
+IMAGE_VARIANT_RENDER_TIMEOUT = int(os.environ.get('IMAGE_VARIANT_RENDER_TIMEOUT', 10))
+IMAGE_VARIANT_CACHE_MAX_BYTES = int(os.environ.get('IMAGE_VARIANT_CACHE_MAX_BYTES', 32 * 1024))
+IMAGE_VARIANT_CACHE_TIMEOUT = int(os.environ.get('IMAGE_VARIANT_CACHE_TIMEOUT', 60 * 60 * 24))
+
 CACHES = {
     "default": {
-        "BACKEND": "django_redis.cache.RedisCache",
+        "BACKEND": "config.cache.TwoTierRedisCache",
         "LOCATION": os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/1'),
         "OPTIONS": {
             "CLIENT_CLASS": "django_redis.client.DefaultClient",
-        }
+        },
+        # Process-local LRU for hot keys, invalidated over Redis pub/sub
+        "L1": {
+            "MAX_ENTRIES": int(os.environ.get('CACHE_L1_MAX_ENTRIES', 2048)),
+            "TIMEOUT": int(os.environ.get('CACHE_L1_TIMEOUT', 60)),
+            "KEY_PREFIXES": [
+                'auth_principal_',
+                'user_cache_version_',
+                'user_profile_',
+                'geoip_country_',
+                'pricing_plans_',
+                'recent_images_',
+                'google_oauth2_certs',
+                'encoder_quality_',
+                'image_variant_',
+                'style_prompt_',
+                'views.decorators.cache.',
+            ],
+        },
     }
 }
 
+# Without Redis, production still needs a cache every worker shares (draft promotion and checkout locks,
+# user cache versions, style prompts), so it falls back to a table created by `manage.py createcachetable`;
+# the per-process LocMemCache is only used in development
 if not os.environ.get('REDIS_URL'):
-    CACHES = {
-        'default': {
-            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-            'LOCATION': 'unique-ghiblit',
+    if DEBUG:
+        CACHES = {
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+                'LOCATION': 'unique-ghiblit',
+            }
         }
-    }
+    else:
+        CACHES = {
+            'default': {
+                'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+                'LOCATION': 'ghiblit_cache',
+            }
+        }
+
+STYLE_PROMPT_CACHE_TIMEOUT = int(os.environ.get('STYLE_PROMPT_CACHE_TIMEOUT', 60 * 60))
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -138,21 +223,40 @@ AUTH_PASSWORD_VALIDATORS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
 }
 
+# JSON responses smaller than this are sent uncompressed
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+# Views whose responses carry access and refresh tokens, which are never compressed (BREACH)
+COMPRESSION_EXCLUDED_URL_NAMES = ('google-login', 'token_refresh')
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(hours=1),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),
     'ROTATE_REFRESH_TOKENS': True,
     'BLACKLIST_AFTER_ROTATION': True,
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.CachedBlacklistTokenRefreshSerializer',
 }
 
+# Refresh-token blacklist in Redis (users.tokens); without Redis it stays in simplejwt's tables
+JWT_BLACKLIST_REDIS = bool(os.environ.get('REDIS_URL'))
+JWT_BLACKLIST_CACHE_ALIAS = 'default'
+
 CORS_ALLOW_ALL_ORIGINS = False
 CORS_ALLOWED_ORIGINS = [
     "https://ghiblit-backend.onrender.com",
@@ -181,6 +285,16 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Uploads larger than this are spooled to a temporary file instead of being held in memory
+FILE_UPLOAD_MAX_MEMORY_SIZE = int(os.environ.get('FILE_UPLOAD_MAX_MEMORY_SIZE', 1024 * 1024))
+
+# Let the front proxy send file bytes after Django authorizes the request:
+# '' (off), 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache/lighttpd, MEDIA_ROOT files only)
+MEDIA_OFFLOAD_MODE = os.environ.get('MEDIA_OFFLOAD_MODE', '')
+# nginx `internal` locations: one aliased to MEDIA_ROOT, one proxying to the storage public URL prefix
+MEDIA_OFFLOAD_MEDIA_LOCATION = os.environ.get('MEDIA_OFFLOAD_MEDIA_LOCATION', '/internal/media/')
+MEDIA_OFFLOAD_STORAGE_LOCATION = os.environ.get('MEDIA_OFFLOAD_STORAGE_LOCATION', '/internal/storage/')
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 SITE_ID = 1
@@ -193,6 +307,24 @@ DODO_API_KEY = os.environ.get('DODO_API_KEY', '')
 DODO_WEBHOOK_SECRET = os.environ.get('DODO_WEBHOOK_SECRET', '')
 DODO_TEST_MODE = os.environ.get('DODO_TEST_MODE', 'True') == 'True'
 
+# Timeout of Dodo API calls, and extra attempts for transient payment creation failures (same idempotency key)
+DODO_REQUEST_TIMEOUT = int(os.environ.get('DODO_REQUEST_TIMEOUT', 15))
+DODO_CREATE_PAYMENT_RETRIES = int(os.environ.get('DODO_CREATE_PAYMENT_RETRIES', 2))
+
+# Minimum seconds between Dodo status lookups for the same payment
+DODO_STATUS_POLL_INTERVAL = int(os.environ.get('DODO_STATUS_POLL_INTERVAL', 10))
+# Seconds during which a repeated checkout for the same plan reuses the pending payment link
+PAYMENT_LINK_REUSE_SECONDS = int(os.environ.get('PAYMENT_LINK_REUSE_SECONDS', 900))
+# Upper bound for how long the long-poll status endpoint holds a request. Keep it a few seconds under
+# gunicorn's worker --timeout (30s by default), or sync workers are killed mid-wait; with the gthread
+# worker it is the thread, not the process, that is held
+PAYMENT_STATUS_WAIT_TIMEOUT = int(os.environ.get('PAYMENT_STATUS_WAIT_TIMEOUT', 25))
+# Long-polls waiting at once per process; keep it below gunicorn's --threads so other requests get served.
+# Callers over the cap get the current status immediately and are told to retry after
+# PAYMENT_STATUS_BUSY_RETRY_AFTER seconds
+PAYMENT_STATUS_MAX_WAITERS = int(os.environ.get('PAYMENT_STATUS_MAX_WAITERS', 4))
+PAYMENT_STATUS_BUSY_RETRY_AFTER = int(os.environ.get('PAYMENT_STATUS_BUSY_RETRY_AFTER', 2))
+
 # URLs for Dodo
 DODO_SUCCESS_URL = os.environ.get('DODO_SUCCESS_URL', '')
 DODO_FAILURE_URL = os.environ.get('DODO_FAILURE_URL', '')
\ No newline at end of file
@@ -13,6 +13,41 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+def clean_supabase_content(content):
+    """
+    Clean Supabase's extra metadata from file content.
+    """
+    if not content:
+        return content
+
+    if content.startswith(b'\x89PNG') or content.startswith(b'\xff\xd8\xff'):
+        return content
+    if content.startswith(b'RIFF') and content[8:12] == b'WEBP':
+        return content
+
+    # Checked first: JPEG and PNG signatures can occur by chance inside WebP data
+    webp_pos = content.find(b'WEBPVP8')
+    if webp_pos >= 8 and content[webp_pos - 8:webp_pos - 4] == b'RIFF':
+        return content[webp_pos - 8:]
+
+    png_pos = content.find(b'\x89PNG\r\n\x1a\n')
+    jpeg_pos = content.find(b'\xff\xd8\xff')
+
+    if png_pos > 0:
+        return content[png_pos:]
+    if jpeg_pos > 0:
+        return content[jpeg_pos:]
+
+    match = re.search(b'\r\n\r\n', content)
+    if match:
+        return content[match.end():]
+
+    match = re.search(b'\d+\r\n', content)
+    if match and match.end() < 100:
+        return content[match.end():]
+
+    return content
+
 class GeneratedImagesStorage(S3Boto3Storage):
     """
     Custom storage class for generated images.
@@ -94,32 +129,40 @@ class GeneratedImagesStorage(S3Boto3Storage):
         """
         Clean Supabase's extra metadata from file content.
         """
-        if not content:
-            return content
-            
-        if content.startswith(b'\x89PNG') or content.startswith(b'\xff\xd8\xff'):
-            return content
-            
-        png_pos = content.find(b'\x89PNG\r\n\x1a\n')
-        jpeg_pos = content.find(b'\xff\xd8\xff')
-        
-        if png_pos > 0:
-            return content[png_pos:]
-        if jpeg_pos > 0:
-            return content[jpeg_pos:]
-            
-        match = re.search(b'\r\n\r\n', content)
-        if match:
-            return content[match.end():]
-            
-        match = re.search(b'\d+\r\n', content)
-        if match and match.end() < 100:
-            return content[match.end():]
-            
-        return content
+        return clean_supabase_content(content)
 
 class PaymentScreenshotsStorage(GeneratedImagesStorage):
     """
     Reuse the same implementation but change the bucket name.
     """
-    bucket_name = 'payments'
\ No newline at end of file
+    bucket_name = 'payments'
+
+
+def signed_download_url(field_file, filename, expires_in=300):
+    """
+    Generate a short-lived signed GET URL for a stored file.
+
+    The URL asks storage to serve the object as an attachment named
+    filename, so clients can be redirected to it instead of Django
+    proxying the bytes.
+
+    Args:
+        field_file: The FieldFile (e.g. GeneratedImage.image) to sign
+        filename: Download filename for the Content-Disposition header
+        expires_in: Seconds the URL stays valid
+
+    Returns:
+        str: The signed URL
+    """
+    storage = field_file.storage
+    content_type = mimetypes.guess_type(field_file.name)[0] or 'application/octet-stream'
+    return storage.bucket.meta.client.generate_presigned_url(
+        'get_object',
+        Params={
+            'Bucket': storage.bucket_name,
+            'Key': field_file.name,
+            'ResponseContentDisposition': f'attachment; filename="{filename}"',
+            'ResponseContentType': content_type,
+        },
+        ExpiresIn=expires_in,
+    )
\ No newline at end of file
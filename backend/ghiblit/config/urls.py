@@ -3,8 +3,8 @@ from django.urls import path, include, re_path
 from django.conf import settings
 from django.conf.urls.static import static
 from django.http import HttpResponse
-from django.views.static import serve
 from images.views import serve_cleaned_image
+from config.offload import serve_media
 
 def home(request):
     return HttpResponse("Welcome to Ghiblify Home")
@@ -16,7 +16,7 @@ urlpatterns = [
     path('api/payments/', include('payments.urls')),
     path('clean-image/<path:image_path>', serve_cleaned_image, name='clean-image'),
 
-    re_path(r'^media/(?P<path>.*)$', serve, {'document_root': settings.MEDIA_ROOT}),
+    re_path(r'^media/(?P<path>.*)$', serve_media),
 ]
 
 
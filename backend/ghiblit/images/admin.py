@@ -1,6 +1,6 @@
 # images/admin.py
 from django.contrib import admin
-from .models import GeneratedImage, UserCustomStyle
+from .models import GeneratedImage, StylePrompt, UserCustomStyle
 
 
 @admin.register(GeneratedImage)
@@ -11,6 +11,13 @@ class GeneratedImageAdmin(admin.ModelAdmin):
     readonly_fields = ('download_token',)
 
 
+@admin.register(StylePrompt)
+class StylePromptAdmin(admin.ModelAdmin):
+    list_display = ('id', 'style_key', 'is_active', 'updated_at')
+    list_filter = ('is_active',)
+    search_fields = ('style_key',)
+
+
 @admin.register(UserCustomStyle)
 class UserCustomStyleAdmin(admin.ModelAdmin):
     list_display = ('id', 'display_name', 'style_key', 'user', 'is_active', 'created_at')
@@ -0,0 +1,18 @@
+import time
+from django.core.cache import cache
+
+RECENT_IMAGES_TIMEOUT = 60 * 10
+RECENT_IMAGES_STALE_TIMEOUT = 60 * 60 * 6
+# Part of every recent_images key, so all cached lists can be retired at once
+RECENT_IMAGES_VERSION_KEY = 'recent_images_version'
+
+
+def recent_images_cache_key(limit, base_url):
+    version = cache.get(RECENT_IMAGES_VERSION_KEY, 0)
+    return f'recent_images_{version}_{limit}_{base_url}'
+
+
+def invalidate_recent_images():
+    """Stop serving every cached recent_images list, e.g. before the previews they link to are deleted"""
+    # A timestamp rather than a counter, so an evicted version can't bring back lists built under it
+    cache.set(RECENT_IMAGES_VERSION_KEY, time.time_ns(), None)
@@ -0,0 +1,238 @@
+import logging
+from collections import namedtuple
+from io import BytesIO
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from PIL import Image
+
+logger = logging.getLogger(__name__)
+
+# Longest side of the copy the quality search runs on
+PROBE_SIZE = 512
+# Quality of the old fixed encoder, used as the baseline for bytes saved
+BASELINE_QUALITY = 95
+SSIM_WINDOW = 8
+
+EXTENSIONS = {'JPEG': '.jpg', 'WEBP': '.webp', 'AVIF': '.avif', 'PNG': '.png'}
+CONTENT_TYPES = {'JPEG': 'image/jpeg', 'WEBP': 'image/webp', 'AVIF': 'image/avif', 'PNG': 'image/png'}
+
+EncodedImage = namedtuple('EncodedImage', ['data', 'format', 'quality', 'ssim', 'bytes_saved'])
+EncoderOptions = namedtuple('EncoderOptions', ['format', 'target_ssim', 'quality_range', 'cached_quality'])
+
+
+def sniff_format(data):
+    """Image format of encoded bytes from their signature, defaulting to JPEG"""
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'WEBP'
+    if data[:8] == b'\x89PNG\r\n\x1a\n':
+        return 'PNG'
+    if data[4:12] in (b'ftypavif', b'ftypavis'):
+        return 'AVIF'
+    return 'JPEG'
+
+
+def _box_mean(x, window):
+    """Mean of every window x window block, via a summed-area table"""
+    table = np.zeros((x.shape[0] + 1, x.shape[1] + 1), dtype=np.float64)
+    table[1:, 1:] = x.cumsum(axis=0).cumsum(axis=1)
+    sums = table[window:, window:] - table[:-window, window:] - table[window:, :-window] + table[:-window, :-window]
+    return sums / (window * window)
+
+
+def ssim(a, b, window=SSIM_WINDOW):
+    """Mean structural similarity of two greyscale arrays, using uniform windows"""
+    a = a.astype(np.float64)
+    b = b.astype(np.float64)
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+
+    mean_a = _box_mean(a, window)
+    mean_b = _box_mean(b, window)
+    var_a = _box_mean(a * a, window) - mean_a * mean_a
+    var_b = _box_mean(b * b, window) - mean_b * mean_b
+    covariance = _box_mean(a * b, window) - mean_a * mean_b
+
+    similarity = ((2 * mean_a * mean_b + c1) * (2 * covariance + c2)) / (
+        (mean_a * mean_a + mean_b * mean_b + c1) * (var_a + var_b + c2)
+    )
+    return float(similarity.mean())
+
+
+def encode_at_quality(img, image_format, quality, final=False):
+    """
+    Encode an image in the given format at a fixed quality
+
+    Args:
+        img: PIL image to encode
+        image_format: 'JPEG', 'WEBP', 'AVIF' or 'PNG' (PNG ignores quality)
+        quality: Encoder quality
+        final: Spend extra CPU on a smaller file (optimized progressive
+            JPEG, slower WebP method)
+
+    Returns:
+        bytes: The encoded image
+    """
+    output = BytesIO()
+    if image_format == 'WEBP':
+        img.save(output, format='WEBP', quality=quality, method=4 if final else 0)
+    elif image_format == 'PNG':
+        img.save(output, format='PNG', optimize=final)
+    elif image_format == 'AVIF':
+        img.save(output, format='AVIF', quality=quality)
+    elif final:
+        img.save(output, format='JPEG', quality=quality, optimize=True, progressive=True)
+    else:
+        # Huffman optimisation and progressive scans don't change decoded pixels
+        img.save(output, format='JPEG', quality=quality)
+    return output.getvalue()
+
+
+def supports_format(image_format):
+    """Whether this Pillow build can write image_format; AVIF needs Pillow built with libavif"""
+    Image.init()
+    return image_format in Image.SAVE
+
+
+class _Probe:
+    """Downscaled copy of an image that candidate qualities are scored on"""
+
+    def __init__(self, img, image_format):
+        self.image = img.copy()
+        self.image.thumbnail((PROBE_SIZE, PROBE_SIZE), Image.BILINEAR, reducing_gap=2.0)
+        self.reference = np.asarray(self.image.convert('L'))
+        self.format = image_format
+        self.scores = {}
+        self.sizes = {}
+
+    def score(self, quality):
+        if quality not in self.scores:
+            data = encode_at_quality(self.image, self.format, quality)
+            decoded = np.asarray(Image.open(BytesIO(data)).convert('L'))
+            self.scores[quality] = ssim(self.reference, decoded)
+            self.sizes[quality] = len(data)
+        return self.scores[quality]
+
+    def estimate_baseline(self, quality, size):
+        """
+        Size a q95 JPEG of the full image would have, given the size it has at quality
+
+        Scaled from both encodes of the probe, so the full image is never
+        encoded a second time just to report the saving.
+        """
+        self.score(quality)
+        baseline = BytesIO()
+        self.image.save(baseline, format='JPEG', quality=BASELINE_QUALITY)
+        return round(size * len(baseline.getvalue()) / self.sizes[quality])
+
+
+def _search_quality(probe, target, low, high):
+    """Lowest quality in [low, high] whose probe scores at least target (high if none does)"""
+    while low < high:
+        middle = (low + high) // 2
+        if probe.score(middle) >= target:
+            high = middle
+        else:
+            low = middle + 1
+    return high
+
+
+def encoder_options(style=None, image_format=None, target_ssim=None):
+    """
+    Settings and the style's cached quality, resolved where Django is available
+
+    Returns:
+        EncoderOptions: Everything encode_with_options needs
+    """
+    image_format = (image_format or getattr(settings, 'IMAGE_OUTPUT_FORMAT', 'JPEG')).upper()
+    return EncoderOptions(
+        image_format,
+        target_ssim or getattr(settings, 'IMAGE_TARGET_SSIM', 0.99),
+        tuple(getattr(settings, 'IMAGE_QUALITY_RANGE', (60, 95))),
+        cache.get(_quality_cache_key(image_format, style)),
+    )
+
+
+def remember_quality(style, options, encoded):
+    """Cache the quality a search settled on, so the style's next image starts there"""
+    if encoded.quality != options.cached_quality:
+        cache.set(
+            _quality_cache_key(options.format, style),
+            encoded.quality,
+            getattr(settings, 'ENCODER_QUALITY_CACHE_TIMEOUT', 60 * 60 * 24)
+        )
+
+
+def _quality_cache_key(image_format, style):
+    return f'encoder_quality_{image_format}_{style or "default"}'
+
+
+def encode_with_options(img, options):
+    """
+    Encode an image at the lowest quality that still looks like the original
+
+    Candidate qualities are scored by SSIM on a downscaled greyscale copy.
+    The quality cached for the image's style is tried first, along with the
+    one below it, so most images need two probes; the search runs below the
+    cached quality when both pass, above it when it falls short of the
+    target, and over the whole range when nothing is cached. The result is
+    a progressive, optimized JPEG or a WebP. Doesn't touch settings or the
+    cache, so it can run in the image pool.
+
+    Args:
+        img: PIL image to encode
+        options: EncoderOptions from encoder_options
+
+    Returns:
+        EncodedImage: The encoded bytes, format, chosen quality, its SSIM
+            and the bytes saved against the previous fixed q95 JPEG, estimated
+            on the probe
+    """
+    image_format, target, (low, high), cached = options
+
+    if img.mode not in ('RGB', 'L'):
+        img = img.convert('RGB')
+
+    probe = _Probe(img, image_format)
+    if cached is not None and low <= cached <= high and probe.score(cached) >= target:
+        # Without a look below, the cached quality could only ever ratchet up
+        if cached > low and probe.score(cached - 1) >= target:
+            quality = _search_quality(probe, target, low, cached - 1)
+        else:
+            quality = cached
+    else:
+        # A cached quality that fell short is a lower bound for this image
+        start = cached + 1 if cached is not None and low <= cached < high else low
+        quality = _search_quality(probe, target, start, high)
+
+    data = encode_at_quality(img, image_format, quality, final=True)
+
+    bytes_saved = probe.estimate_baseline(quality, len(data)) - len(data)
+
+    logger.info(
+        f"Encoded {img.width}x{img.height} {image_format} at quality {quality} "
+        f"(SSIM {probe.score(quality):.4f}): {len(data)} bytes, {bytes_saved} bytes saved vs q{BASELINE_QUALITY}"
+    )
+    return EncodedImage(data, image_format, quality, probe.score(quality), bytes_saved)
+
+
+def encode_image(img, style=None, image_format=None, target_ssim=None):
+    """
+    Encode an image at the lowest quality that still looks like the original
+
+    See encode_with_options; the quality chosen for a style is cached and
+    shared by later images of that style.
+
+    Args:
+        img: PIL image to encode
+        style: Style key the cached quality is shared by
+        image_format: 'JPEG' or 'WEBP'; defaults to IMAGE_OUTPUT_FORMAT
+        target_ssim: Minimum SSIM; defaults to IMAGE_TARGET_SSIM
+
+    Returns:
+        EncodedImage: The encoded image and its quality
+    """
+    options = encoder_options(style, image_format, target_ssim)
+    encoded = encode_with_options(img, options)
+    remember_quality(style, options, encoded)
+    return encoded
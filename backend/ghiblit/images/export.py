@@ -0,0 +1,224 @@
+import io
+import logging
+import os
+import re
+import tempfile
+import time
+import uuid
+import zipfile
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from django.conf import settings
+
+from config.storage import clean_supabase_content
+
+logger = logging.getLogger(__name__)
+
+# Bytes per chunk when replaying a finished archive from the export cache
+FILE_CHUNK_SIZE = 64 * 1024
+
+# Partial archives are still being written by another request until this old,
+# as a slow client can leave one untouched for a long time
+ABANDONED_PART_AGE = 60 * 60 * 24
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Pooled connections to storage shared by all export workers in this process
+_session = requests.Session()
+
+
+class _ChunkWriter(io.RawIOBase):
+    """Unseekable sink that lets zipfile write an archive we hand out in chunks"""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+def export_cache_dir():
+    path = getattr(settings, 'IMAGE_EXPORT_CACHE_DIR', None) or os.path.join(tempfile.gettempdir(), 'ghiblit-exports')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def export_cache_path(archive_key):
+    return os.path.join(export_cache_dir(), f'{archive_key}.zip')
+
+
+def cached_export(archive_key):
+    """Return the path of a finished, unexpired archive for this key, or None"""
+    path = export_cache_path(archive_key)
+    try:
+        age = time.time() - os.path.getmtime(path)
+    except OSError:
+        return None
+    if age > getattr(settings, 'IMAGE_EXPORT_CACHE_TIMEOUT', 60 * 60):
+        return None
+    return path
+
+
+def _prune_export_cache(directory):
+    """Delete archives older than the cache timeout and abandoned partial archives"""
+    now = time.time()
+    cutoffs = {
+        '.zip': now - getattr(settings, 'IMAGE_EXPORT_CACHE_TIMEOUT', 60 * 60),
+        '.part': now - ABANDONED_PART_AGE,
+    }
+    for entry in os.scandir(directory):
+        cutoff = cutoffs.get(os.path.splitext(entry.name)[1])
+        try:
+            if cutoff is not None and entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass
+
+
+def _fetch_image(url):
+    response = _session.get(url, timeout=30)
+    if response.status_code != 200:
+        return None
+    return clean_supabase_content(response.content)
+
+
+def stream_images_zip(images, archive_key=None, concurrency=4):
+    """
+    Build a ZIP of stored images on the fly, yielding it chunk by chunk.
+
+    At most `concurrency` images are downloaded ahead of the writer, so
+    memory stays bounded no matter how many images are exported. Images are
+    stored uncompressed since JPEG/PNG data doesn't shrink further.
+
+    When archive_key is given, the archive is also written to the export
+    cache and published there once complete, so a client can resume the
+    download with a Range request. Archives missing an image that could not
+    be fetched are not published, so the next export tries it again.
+
+    Args:
+        images: List of (archive_name, url, created_at) tuples
+        archive_key: Optional export cache key
+        concurrency: Maximum number of concurrent storage downloads
+
+    Yields:
+        bytes: Consecutive pieces of the ZIP archive
+    """
+    writer = _ChunkWriter()
+    cache_file = None
+    temp_path = None
+    if archive_key:
+        directory = export_cache_dir()
+        _prune_export_cache(directory)
+        temp_path = os.path.join(directory, f'{archive_key}.{uuid.uuid4().hex}.part')
+        cache_file = open(temp_path, 'wb')
+
+    def emit():
+        data = writer.drain()
+        if cache_file is not None and data:
+            cache_file.write(data)
+        return data
+
+    completed = False
+    skipped = False
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            pending = iter(images)
+            in_flight = deque()
+
+            def schedule():
+                for archive_name, url, created_at in pending:
+                    in_flight.append((archive_name, created_at, pool.submit(_fetch_image, url)))
+                    if len(in_flight) >= concurrency:
+                        break
+
+            schedule()
+            with zipfile.ZipFile(writer, mode='w', compression=zipfile.ZIP_STORED) as archive:
+                while in_flight:
+                    archive_name, created_at, future = in_flight.popleft()
+                    schedule()
+                    try:
+                        content = future.result()
+                    except Exception as e:
+                        logger.warning(f"Skipping {archive_name} in export: {str(e)}")
+                        skipped = True
+                        continue
+                    if content is None:
+                        logger.warning(f"Skipping {archive_name} in export: not found in storage")
+                        skipped = True
+                        continue
+
+                    info = zipfile.ZipInfo(archive_name, date_time=created_at.timetuple()[:6])
+                    info.compress_type = zipfile.ZIP_STORED
+                    archive.writestr(info, content)
+                    data = emit()
+                    if data:
+                        yield data
+
+            data = emit()
+            if data:
+                yield data
+        completed = True
+    finally:
+        if cache_file is not None:
+            cache_file.close()
+            if completed and not skipped:
+                os.replace(temp_path, export_cache_path(archive_key))
+            else:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+
+
+def parse_range_header(header, size):
+    """
+    Parse a single-range "bytes=" Range header.
+
+    Returns:
+        tuple: (start, end) inclusive byte offsets, or None if the header is
+            absent, malformed or not satisfiable
+    """
+    match = _RANGE_RE.match(header.strip()) if header else None
+    if not match or size == 0:
+        return None
+
+    start, end = match.groups()
+    if start == '':
+        if end == '':
+            return None
+        length = min(int(end), size)
+        return (size - length, size - 1) if length else None
+
+    start = int(start)
+    end = min(int(end), size - 1) if end else size - 1
+    if start > end:
+        return None
+    return start, end
+
+
+def iter_file_range(path, start, end, chunk_size=FILE_CHUNK_SIZE):
+    """Yield bytes start..end (inclusive) of a file"""
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            data = f.read(min(chunk_size, remaining))
+            if not data:
+                break
+            remaining -= len(data)
+            yield data
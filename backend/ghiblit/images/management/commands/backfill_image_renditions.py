@@ -0,0 +1,341 @@
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from io import BytesIO
+import django
+import requests
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from PIL import Image
+from config.storage import clean_supabase_content
+from images.cache import invalidate_recent_images
+from images.encoder import EXTENSIONS, encode_image, sniff_format
+from images.models import GeneratedImage
+from images.variants import _store_variant, parse_variant_request, public_url, render_variant
+
+_session = requests.Session()
+
+
+def _transcode(data, renditions, quality, preview_data):
+    """
+    Render the missing renditions of one image; runs in the worker processes
+
+    Returns:
+        tuple: ([(name, bytes)] renditions, re-encoded preview bytes or None
+            when the stored preview is already as small)
+    """
+    rendered = [
+        (name, render_variant(data, width, height, image_format, quality))
+        for name, width, height, image_format in renditions
+    ]
+
+    preview = None
+    if preview_data is not None:
+        img = Image.open(BytesIO(data)).convert('RGB')
+        encoded = encode_image(img, style='preview').data
+        if len(encoded) < len(preview_data):
+            preview = encoded
+    return rendered, preview
+
+
+def _download(name):
+    response = _session.get(public_url(name), timeout=30)
+    response.raise_for_status()
+    return clean_supabase_content(response.content)
+
+
+class Command(BaseCommand):
+    help = 'Renders the /clean-image/ renditions (and optionally smaller previews) of existing images'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--widths',
+            type=int,
+            nargs='+',
+            default=[256, 512, 1024],
+            help='Rendition widths in pixels',
+        )
+        parser.add_argument(
+            '--formats',
+            nargs='+',
+            default=['webp'],
+            help='Rendition formats (jpeg, webp, avif or png)',
+        )
+        parser.add_argument(
+            '--previews',
+            action='store_true',
+            help='Also re-encode previews with the current encoder when that makes them smaller',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Images read from the database per query',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=0,
+            help='Transcoding processes; 0 uses one per core',
+        )
+        parser.add_argument(
+            '--download-concurrency',
+            type=int,
+            default=8,
+            help='Concurrent downloads from storage',
+        )
+        parser.add_argument(
+            '--upload-concurrency',
+            type=int,
+            default=4,
+            help='Concurrent uploads to storage',
+        )
+        parser.add_argument(
+            '--max-rate',
+            type=float,
+            default=0,
+            help='Images per second to stay under; 0 for no limit',
+        )
+        parser.add_argument(
+            '--batch-pause',
+            type=float,
+            default=0.5,
+            help='Seconds to pause between batches to spare the database and storage',
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=0,
+            help='Stop after this many images; 0 for all',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default='backfill_image_renditions.json',
+            help='File recording progress, read on start to resume',
+        )
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            help='Ignore the checkpoint and start from the first image',
+        )
+        parser.add_argument(
+            '--retry-failed',
+            action='store_true',
+            help='First retry the images the checkpoint records as failed',
+        )
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.quality = getattr(settings, 'IMAGE_VARIANT_QUALITY', 80)
+        self.rendition_params = [
+            {'w': str(width), 'fmt': image_format}
+            for width in options['widths'] for image_format in options['formats']
+        ]
+        try:
+            for params in self.rendition_params:
+                parse_variant_request('check.jpg', params, '')
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        checkpoint = self._load_checkpoint()
+        last_id = checkpoint['last_id']
+        self.stdout.write(f"Starting after image {last_id}" if last_id else "Starting from the first image")
+
+        workers = options['workers'] or os.cpu_count() or 1
+        # spawn: the download and upload threads make forking this process unsafe
+        process_pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=django.setup,
+        )
+        downloads = ThreadPoolExecutor(max_workers=options['download_concurrency'])
+        uploads = ThreadPoolExecutor(max_workers=options['upload_concurrency'])
+
+        started = time.monotonic()
+        processed = 0
+        try:
+            if options['retry_failed'] and checkpoint['failed']:
+                self._retry_failed(checkpoint, downloads, process_pool, uploads)
+            while not options['limit'] or processed < options['limit']:
+                batch_size = options['batch_size']
+                if options['limit']:
+                    batch_size = min(batch_size, options['limit'] - processed)
+                # Keyset pagination: each query seeks on the primary key instead of counting an offset
+                batch = list(
+                    GeneratedImage.objects
+                    .filter(id__gt=last_id)
+                    .exclude(image='')
+                    .order_by('id')
+                    .only('id', 'image', 'preview_image')[:batch_size]
+                )
+                if not batch:
+                    break
+
+                stats = self._process_batch(batch, downloads, process_pool, uploads)
+                processed += len(batch)
+                last_id = batch[-1].id
+                checkpoint['last_id'] = last_id
+                checkpoint['processed'] += len(batch)
+                checkpoint['renditions'] += stats['renditions']
+                checkpoint['previews'] += stats['previews']
+                checkpoint['failed'].extend(stats['failed'])
+                self._save_checkpoint(checkpoint)
+
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f"Up to image {last_id}: {processed} images, {stats['renditions']} renditions, "
+                    f"{stats['previews']} previews, {len(stats['failed'])} failed in this batch, "
+                    f"{processed / elapsed:.1f} images/sec"
+                )
+                self._throttle(processed, elapsed)
+        finally:
+            downloads.shutdown(cancel_futures=True)
+            uploads.shutdown()
+            process_pool.shutdown(cancel_futures=True)
+
+        elapsed = time.monotonic() - started
+        summary = f"Backfilled {processed} images in {elapsed:.1f}s ({processed / max(elapsed, 1e-9):.1f} images/sec)"
+        if checkpoint['failed']:
+            self.stdout.write(self.style.WARNING(f"{summary}; failed so far: {checkpoint['failed']}"))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
+
+    def _retry_failed(self, checkpoint, downloads, process_pool, uploads):
+        """Process the images recorded as failed again, keeping only those that fail a second time"""
+        failed = sorted(set(checkpoint['failed']))
+        self.stdout.write(f"Retrying {len(failed)} failed images")
+        still_failed = []
+        for offset in range(0, len(failed), self.options['batch_size']):
+            batch = list(
+                GeneratedImage.objects
+                .filter(id__in=failed[offset:offset + self.options['batch_size']])
+                .exclude(image='')
+                .order_by('id')
+                .only('id', 'image', 'preview_image')
+            )
+            stats = self._process_batch(batch, downloads, process_pool, uploads)
+            checkpoint['renditions'] += stats['renditions']
+            checkpoint['previews'] += stats['previews']
+            still_failed.extend(stats['failed'])
+
+        # Images deleted since they failed are dropped along with those that succeeded
+        checkpoint['failed'] = still_failed
+        self._save_checkpoint(checkpoint)
+        self.stdout.write(f"Retried {len(failed)} failed images, {len(still_failed)} failed again")
+
+    def _process_batch(self, batch, downloads, process_pool, uploads):
+        """Download, transcode and upload one batch, overlapping the three stages"""
+        stats = {'renditions': 0, 'previews': 0, 'failed': []}
+        replaced_previews = []
+        download_futures = {downloads.submit(self._fetch_sources, image): image for image in batch}
+
+        transcode_futures = {}
+        for future in as_completed(download_futures):
+            image = download_futures[future]
+            try:
+                data, renditions, preview_data = future.result()
+            except Exception as e:
+                self.stderr.write(f"Image {image.id}: download failed: {str(e)}")
+                stats['failed'].append(image.id)
+                continue
+            if renditions or preview_data is not None:
+                transcode_futures[process_pool.submit(_transcode, data, renditions, self.quality, preview_data)] = image
+
+        upload_futures = {}
+        for future in as_completed(transcode_futures):
+            image = transcode_futures[future]
+            try:
+                rendered, preview = future.result()
+            except Exception as e:
+                self.stderr.write(f"Image {image.id}: transcoding failed: {str(e)}")
+                stats['failed'].append(image.id)
+                continue
+            upload_futures[uploads.submit(self._store, image, rendered, preview)] = image
+
+        for future in as_completed(upload_futures):
+            image = upload_futures[future]
+            try:
+                renditions, old_preview = future.result()
+            except Exception as e:
+                self.stderr.write(f"Image {image.id}: upload failed: {str(e)}")
+                stats['failed'].append(image.id)
+                continue
+            stats['renditions'] += renditions
+            if old_preview is not None:
+                replaced_previews.append(old_preview)
+
+        if replaced_previews:
+            # Cached recent_images lists still link the old previews, so retire them before deleting
+            invalidate_recent_images()
+            for name in replaced_previews:
+                default_storage.delete(name)
+            stats['previews'] = len(replaced_previews)
+        return stats
+
+    def _fetch_sources(self, image):
+        """Original bytes, the renditions storage doesn't have yet and, with --previews, the stored preview"""
+        renditions = []
+        for params in self.rendition_params:
+            spec = parse_variant_request(image.image.name, params, '')
+            # Storage never overwrites, so an existing rendition would be saved again under another name
+            if not default_storage.exists(spec.name):
+                renditions.append((spec.name, spec.width, spec.height, spec.format))
+
+        preview_data = None
+        if self.options['previews'] and image.preview_image:
+            preview_data = _download(image.preview_image.name)
+
+        if not renditions and preview_data is None:
+            return None, renditions, None
+        return _download(image.image.name), renditions, preview_data
+
+    def _store(self, image, rendered, preview):
+        """
+        Upload the renditions and the new preview
+
+        Returns:
+            tuple: (renditions stored, name of the replaced preview to delete
+                once nothing links it, or None)
+        """
+        for name, data in rendered:
+            _store_variant(name, data)
+
+        if preview is None:
+            return len(rendered), None
+        old_preview = image.preview_image.name
+        name = default_storage.save(
+            image.preview_image.field.generate_filename(
+                image, f"preview_{timezone.now().strftime('%Y%m%d%H%M%S')}{EXTENSIONS[sniff_format(preview)]}"
+            ),
+            ContentFile(preview)
+        )
+        # update() leaves updated_at alone, so export archives of unchanged images stay valid
+        GeneratedImage.objects.filter(pk=image.pk).update(preview_image=name)
+        return len(rendered), old_preview
+
+    def _throttle(self, processed, elapsed):
+        pause = self.options['batch_pause']
+        if self.options['max_rate']:
+            pause = max(pause, processed / self.options['max_rate'] - elapsed)
+        if pause > 0:
+            time.sleep(pause)
+
+    def _load_checkpoint(self):
+        empty = {'last_id': 0, 'processed': 0, 'renditions': 0, 'previews': 0, 'failed': []}
+        path = self.options['checkpoint']
+        if self.options['reset'] or not os.path.exists(path):
+            return empty
+        with open(path) as f:
+            return {**empty, **json.load(f)}
+
+    def _save_checkpoint(self, checkpoint):
+        path = self.options['checkpoint']
+        # Written aside and renamed so an interrupted run never leaves a truncated checkpoint
+        with open(f'{path}.tmp', 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(f'{path}.tmp', path)
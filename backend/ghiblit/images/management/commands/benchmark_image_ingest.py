@@ -0,0 +1,89 @@
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.core.management.base import BaseCommand
+from PIL import Image
+from images.services import MAX_INPUT_SIZE, load_upload_image
+
+# 4:3, the usual phone camera aspect ratio
+ASPECT_RATIO = 4 / 3
+
+
+def _full_decode(path):
+    """The previous ingestion path: full-resolution decode, then one LANCZOS resize"""
+    with Image.open(path) as img:
+        img.load()
+        scale = min(1.0, MAX_INPUT_SIZE / max(img.size))
+        return img.resize((round(img.width * scale), round(img.height * scale)), Image.LANCZOS)
+
+
+def _measure(method, path, repeat):
+    """Run in a fresh child process so peak RSS belongs to this method alone"""
+    func = load_upload_image if method == 'reduced' else _full_decode
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(path)
+        timings.append(time.perf_counter() - started)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux
+    return min(timings), (peak - baseline) / 1024
+
+
+def _write_sample(path, megapixels, image_format):
+    height = int((megapixels * 1_000_000 / ASPECT_RATIO) ** 0.5)
+    width = int(height * ASPECT_RATIO)
+    # Upscaled noise compresses like a photo rather than a flat fill
+    noise = Image.effect_noise((width // 16, height // 16), 64).convert('RGB')
+    sample = noise.resize((width, height), Image.BILINEAR)
+    if image_format == 'JPEG':
+        sample.save(path, format='JPEG', quality=90)
+    else:
+        sample.save(path, format=image_format)
+    return width, height
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks decode time and peak memory of upload ingestion across image sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--megapixels',
+            type=float,
+            nargs='+',
+            default=[1, 4, 12, 24, 48],
+            help='Sample image sizes in megapixels',
+        )
+        parser.add_argument(
+            '--format',
+            default='JPEG',
+            choices=['JPEG', 'PNG', 'WEBP'],
+            help='Encoding of the sample images',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=3,
+            help='Runs per measurement; the fastest is reported',
+        )
+
+    def handle(self, *args, **options):
+        context = multiprocessing.get_context('fork')
+        image_format = options['format']
+
+        self.stdout.write(f"{'size':>14} {'method':>8} {'decode ms':>10} {'peak MiB':>9}")
+        with tempfile.TemporaryDirectory() as directory:
+            for megapixels in options['megapixels']:
+                path = os.path.join(directory, f'sample_{megapixels}.{image_format.lower()}')
+                width, height = _write_sample(path, megapixels, image_format)
+
+                for method in ('full', 'reduced'):
+                    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                        seconds, peak_mib = pool.submit(_measure, method, path, options['repeat']).result()
+                    self.stdout.write(
+                        f"{f'{width}x{height}':>14} {method:>8} {seconds * 1000:>10.1f} {peak_mib:>9.1f}"
+                    )
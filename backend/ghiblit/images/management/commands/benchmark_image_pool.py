@@ -0,0 +1,70 @@
+import base64
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from PIL import Image
+from images.encoder import EncoderOptions
+from images.pool import image_pool
+from images.services import PreparedImage, _finish_task
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks finishing concurrent transforms in request threads against the image pool'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            nargs='+',
+            default=[1, 2, 4, 8],
+            help='Simultaneous transforms, as threads of one web worker',
+        )
+        parser.add_argument(
+            '--rounds',
+            type=int,
+            default=2,
+            help='Transforms per thread',
+        )
+
+    def handle(self, *args, **options):
+        # A 1536x1024 render, base64-encoded PNG like the ones OpenAI returns
+        source = Image.effect_noise((96, 64), 64).convert('RGB').resize((1536, 1024), Image.BICUBIC)
+        png = BytesIO()
+        source.save(png, format='PNG')
+        payload = base64.b64encode(png.getvalue())
+
+        prepared = PreparedImage(None, source.size, (0, 0) + source.size, source.size, source.size)
+        # No cached quality, so every image runs the full quality search
+        encoder_options = EncoderOptions(
+            getattr(settings, 'IMAGE_OUTPUT_FORMAT', 'JPEG').upper(),
+            getattr(settings, 'IMAGE_TARGET_SSIM', 0.99),
+            tuple(getattr(settings, 'IMAGE_QUALITY_RANGE', (60, 95))),
+            None,
+        )
+        task_args = (prepared, None, False, encoder_options)
+
+        def inline():
+            return _finish_task(memoryview(payload), *task_args)
+
+        def pooled():
+            return image_pool.run(_finish_task, payload, *task_args)
+
+        # Start the workers before timing
+        pooled()
+
+        self.stdout.write(f"Image pool: {image_pool.workers} workers")
+        self.stdout.write(f"{'threads':>8} {'inline/s':>9} {'pool/s':>8} {'speedup':>8}")
+        for threads in options['concurrency']:
+            rates = []
+            for finish in (inline, pooled):
+                jobs = threads * options['rounds']
+                started = time.perf_counter()
+                with ThreadPoolExecutor(max_workers=threads) as executor:
+                    for future in [executor.submit(finish) for _ in range(jobs)]:
+                        future.result()
+                rates.append(jobs / (time.perf_counter() - started))
+            self.stdout.write(f"{threads:>8} {rates[0]:>9.2f} {rates[1]:>8.2f} {rates[1] / rates[0]:>7.2f}x")
+
+        self.stdout.write(f"Pool stats: {image_pool.stats()}")
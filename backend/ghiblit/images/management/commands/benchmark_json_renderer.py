@@ -0,0 +1,77 @@
+import time
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.utils import timezone
+from django.utils.text import compress_string
+from rest_framework.renderers import JSONRenderer
+from api.renderers import ORJSONRenderer
+from images.models import GeneratedImage
+from images.serializers import GeneratedImageSerializer
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks rendering GeneratedImageSerializer lists with orjson against DRF, with compressed sizes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--counts',
+            type=int,
+            nargs='+',
+            default=[10, 100, 1000],
+            help='Images per response, like a user_images page for a growing history',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=20,
+            help='Renders per renderer and count; the median is reported',
+        )
+
+    def handle(self, *args, **options):
+        host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+        request = RequestFactory().get('/api/user/images/', HTTP_HOST=host)
+        user = User(id=1, username='benchmark')
+        now = timezone.now()
+
+        renderers = [('DRF JSONRenderer', JSONRenderer()), ('ORJSONRenderer', ORJSONRenderer())]
+        self.stdout.write(
+            f"{'images':>7} {'renderer':<17} {'median ms':>10} {'bytes':>9} {'gzip':>8} {'brotli':>8}"
+        )
+        for count in options['counts']:
+            # Unsaved rows shaped like real history: mostly paid, each with a preview
+            images = [
+                GeneratedImage(
+                    id=i + 1,
+                    user=user,
+                    image=f'images/{uuid.uuid4()}.jpg',
+                    preview_image=f'images/{uuid.uuid4()}.jpg',
+                    is_paid=i % 4 != 0,
+                    download_token=uuid.uuid4(),
+                    created_at=now - timedelta(minutes=i),
+                )
+                for i in range(count)
+            ]
+            data = GeneratedImageSerializer(images, many=True, context={'request': request}).data
+
+            for label, renderer in renderers:
+                timings = []
+                for _ in range(options['repeat']):
+                    started = time.perf_counter()
+                    body = renderer.render(data)
+                    timings.append((time.perf_counter() - started) * 1000)
+                timings.sort()
+                median = timings[len(timings) // 2]
+
+                # The same settings JSONCompressionMiddleware uses, less gzip's random-length padding
+                gzipped = len(compress_string(body))
+                brotlied = f"{len(brotli.compress(body, quality=4)):>8}" if brotli is not None else f"{'n/a':>8}"
+                self.stdout.write(f"{count:>7} {label:<17} {median:>10.3f} {len(body):>9} {gzipped:>8} {brotlied}")
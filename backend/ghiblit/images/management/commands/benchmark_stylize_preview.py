@@ -0,0 +1,50 @@
+import time
+from django.core.management.base import BaseCommand
+from PIL import Image
+from images.stylize import DEFAULT_PALETTE, parse_palette, stylize_preview
+
+# Placeholders must appear well before the first partial render
+LATENCY_BUDGET_MS = 200
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the local stylized preview across image sizes against its latency budget'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[256, 512, 768, 1024, 1536, 2048],
+            help='Longest side of the 4:3 sample images in pixels',
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Runs per size; the median is reported',
+        )
+
+    def handle(self, *args, **options):
+        palette = parse_palette(DEFAULT_PALETTE)
+        # Upscaled noise has smooth regions and edges, like a photo
+        source = Image.effect_noise((64, 48), 64).convert('RGB')
+
+        self.stdout.write(f"{'size':>10} {'median ms':>10} {'max ms':>8}")
+        for size in options['sizes']:
+            sample = source.resize((size, size * 3 // 4), Image.BICUBIC)
+            stylize_preview(sample, palette)
+
+            timings = []
+            for _ in range(options['repeat']):
+                started = time.perf_counter()
+                stylize_preview(sample, palette)
+                timings.append((time.perf_counter() - started) * 1000)
+            timings.sort()
+            median = timings[len(timings) // 2]
+
+            line = f"{f'{sample.width}x{sample.height}':>10} {median:>10.1f} {timings[-1]:>8.1f}"
+            if median > LATENCY_BUDGET_MS:
+                self.stdout.write(self.style.WARNING(f"{line}  over {LATENCY_BUDGET_MS} ms budget"))
+            else:
+                self.stdout.write(line)
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.7 on 2026-10-19 14:12
+
+from django.db import migrations, models
+import images.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0004_usercustomstyle'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='generatedimage',
+            name='is_draft',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='generatedimage',
+            name='source_image',
+            field=models.FileField(blank=True, null=True, upload_to=images.models.get_image_path),
+        ),
+        migrations.AddField(
+            model_name='generatedimage',
+            name='transform_params',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.7 on 2026-10-19 15:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('images', '0005_generatedimage_is_draft_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='styleprompt',
+            name='preview_palette',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -1,5 +1,8 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 import uuid
 import os
 
@@ -16,6 +19,10 @@ class GeneratedImage(models.Model):
     image = models.ImageField(upload_to=get_image_path)
     preview_image = models.ImageField(upload_to=get_image_path, null=True, blank=True)
     is_paid = models.BooleanField(default=False)
+    # Drafts are quick low-quality renders; the prepared input is kept so they can be promoted
+    is_draft = models.BooleanField(default=False)
+    source_image = models.FileField(upload_to=get_image_path, null=True, blank=True)
+    transform_params = models.JSONField(null=True, blank=True)
     download_token = models.UUIDField(default=uuid.uuid4, editable=False)
     token_expires_at = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -65,6 +72,8 @@ class GeneratedImage(models.Model):
 class StylePrompt(models.Model):
     style_key = models.CharField(max_length=50, unique=True)
     prompt = models.TextField()
+    # "#rrggbb" colours for the instant local preview; empty uses the default palette
+    preview_palette = models.JSONField(null=True, blank=True)
     is_active = models.BooleanField(default=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
@@ -77,6 +86,17 @@ class StylePrompt(models.Model):
         verbose_name_plural = 'Style Prompts'
 
 
+def style_prompt_cache_key(style_key):
+    return f'style_prompt_{style_key}'
+
+
+# Transforms read style prompts from the cache, so drop a style's entry whenever it changes
+@receiver(post_save, sender=StylePrompt)
+@receiver(post_delete, sender=StylePrompt)
+def invalidate_style_prompt(sender, instance, **kwargs):
+    cache.delete(style_prompt_cache_key(instance.style_key))
+
+
 class UserCustomStyle(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='custom_styles')
     display_name = models.CharField(max_length=100)
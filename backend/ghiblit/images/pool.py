@@ -0,0 +1,317 @@
+import logging
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+# Modules the fork server imports once, so new workers start with Pillow and the tasks loaded
+PRELOAD_MODULES = ['images.services', 'images.variants']
+
+# Set in pool workers, where tasks run inline instead of being sent to a pool of their own
+_in_worker = False
+
+# Cache keys of the web worker processes that have published pool stats
+STATS_REGISTRY_KEY = 'image_pool_stats_processes'
+
+
+class PoolBusy(Exception):
+    """No pool slot freed up within the time the caller was willing to wait"""
+
+
+def _init_worker():
+    global _in_worker
+    _in_worker = True
+
+
+def _to_shared(data):
+    """Copy bytes into a new shared memory block (never empty, which SharedMemory rejects)"""
+    block = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+    block.buf[:len(data)] = data
+    return block
+
+
+def _read_shared(name, size):
+    block = shared_memory.SharedMemory(name=name)
+    try:
+        return bytes(block.buf[:size])
+    finally:
+        block.close()
+        block.unlink()
+
+
+def _unlink_shared(name):
+    try:
+        block = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    block.close()
+    block.unlink()
+
+
+def _stats_key():
+    return f'image_pool_stats_{socket.gethostname()}_{os.getpid()}'
+
+
+def _summarize(raw):
+    """Counters with the mean queue and run times per completed task in place of the totals"""
+    stats = dict(raw)
+    completed = stats['completed'] or 1
+    stats['mean_queue_ms'] = round(stats.pop('queue_seconds') / completed * 1000, 1)
+    stats['mean_run_ms'] = round(stats.pop('run_seconds') / completed * 1000, 1)
+    return stats
+
+
+def _split_result(result):
+    if isinstance(result, tuple):
+        return result
+    return result, None
+
+
+def _run_task(func, input_name, input_size, args):
+    """
+    Worker side of ImagePool.run
+
+    The input is read straight out of the caller's shared memory block and
+    the output is written to a new one, so neither crosses the pipe as a
+    pickle; only block names and the small extra result do.
+    """
+    started = time.perf_counter()
+    block = None
+    buffer = None
+    if input_name is not None:
+        block = shared_memory.SharedMemory(name=input_name)
+        buffer = block.buf[:input_size]
+    try:
+        data, extra = _split_result(func(buffer, *args))
+    finally:
+        if block is not None:
+            buffer.release()
+            block.close()
+
+    output = _to_shared(data)
+    output.close()
+    return output.name, len(data), extra, time.perf_counter() - started
+
+
+class ImagePool:
+    """
+    Process pool for CPU-bound Pillow work, shared by all threads of a web worker
+
+    Threads of one process contend for the GIL during resizes, encodes and
+    base64 decodes; workers run them in parallel on every core. At most two
+    jobs per worker are in flight; further callers wait for a slot, or give
+    up with PoolBusy if they passed a wait limit. Workers are forked from a
+    fork server with the image modules preloaded, so they don't inherit the
+    web worker's threads, sockets or heap.
+
+    Tasks are module-level functions taking the input buffer (a memoryview,
+    or None) followed by picklable arguments, and returning output bytes or
+    an (output bytes, picklable extra) tuple.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._executor = None
+        self._slots = None
+        self._published = 0.0
+        self.workers = 0
+        self._stats = {
+            'submitted': 0,
+            'completed': 0,
+            'failed': 0,
+            'rejected': 0,
+            'waiting': 0,
+            'in_flight': 0,
+            'max_in_flight': 0,
+            'queue_seconds': 0.0,
+            'run_seconds': 0.0,
+        }
+
+    def _workers(self):
+        configured = getattr(settings, 'IMAGE_POOL_WORKERS', 0)
+        if configured:
+            return configured
+        # Cores this process may run on, split between the server's web worker processes
+        cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1
+        return max(1, cores // max(1, int(os.environ.get('WEB_CONCURRENCY', 1))))
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                self.workers = self._workers()
+                if 'forkserver' in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context('forkserver')
+                    context.set_forkserver_preload(PRELOAD_MODULES)
+                else:
+                    context = multiprocessing.get_context('spawn')
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=context,
+                    initializer=_init_worker,
+                )
+                self._slots = threading.BoundedSemaphore(self.workers * 2)
+                logger.info(f"Started image pool with {self.workers} workers")
+            return self._executor, self._slots
+
+    def _reset(self, broken):
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def _count(self, **changes):
+        with self._lock:
+            for key, change in changes.items():
+                self._stats[key] += change
+            self._stats['max_in_flight'] = max(self._stats['max_in_flight'], self._stats['in_flight'])
+
+    def run(self, func, data, *args, wait=None, timeout=None):
+        """
+        Run func(buffer, *args) in a worker process and return its result
+
+        Args:
+            func: Module-level task function
+            data: Bytes placed in shared memory for the task, or None
+            wait: Seconds to wait for a free slot; None waits as long as it takes
+            timeout: Seconds to wait for the result once submitted
+
+        Raises:
+            PoolBusy: If no slot freed up within wait
+            concurrent.futures.TimeoutError: If the result took longer than timeout
+        """
+        if _in_worker or not getattr(settings, 'IMAGE_POOL_ENABLED', True):
+            return func(None if data is None else memoryview(data), *args)
+        try:
+            return self._run(func, data, args, wait, timeout)
+        finally:
+            self.publish()
+
+    def _run(self, func, data, args, wait, timeout):
+        executor, slots = self._get_executor()
+        queued = time.perf_counter()
+        self._count(waiting=1)
+        acquired = slots.acquire(timeout=wait)
+        self._count(waiting=-1)
+        if not acquired:
+            self._count(rejected=1)
+            raise PoolBusy(f"All {self.workers * 2} image pool slots are busy")
+
+        block = _to_shared(data) if data is not None else None
+        try:
+            future = executor.submit(
+                _run_task, func, block and block.name, 0 if data is None else len(data), args
+            )
+        except BrokenProcessPool:
+            slots.release()
+            self._cleanup_input(block)
+            self._reset(executor)
+            raise
+        self._count(submitted=1, in_flight=1)
+
+        def release(done):
+            # The input must outlive the task, which may still be queued when the caller gives up
+            self._cleanup_input(block)
+            slots.release()
+            self._count(in_flight=-1, completed=0 if done.exception() else 1, failed=1 if done.exception() else 0)
+
+        future.add_done_callback(release)
+
+        try:
+            output_name, output_size, extra, run_seconds = future.result(timeout=timeout)
+        except FutureTimeoutError:
+            future.add_done_callback(_discard_output)
+            raise
+        except BrokenProcessPool:
+            logger.error(f"Image pool worker died running {func.__name__}, restarting the pool")
+            self._reset(executor)
+            raise
+
+        self._count(
+            queue_seconds=time.perf_counter() - queued - run_seconds,
+            run_seconds=run_seconds,
+        )
+        output = _read_shared(output_name, output_size)
+        return output if extra is None else (output, extra)
+
+    @staticmethod
+    def _cleanup_input(block):
+        if block is not None:
+            block.close()
+            block.unlink()
+
+    def _snapshot(self):
+        with self._lock:
+            return dict(self._stats, workers=self.workers, slots=self.workers * 2)
+
+    def stats(self):
+        """Counters of this process's pool, with mean queue and run times per completed task"""
+        return dict(_summarize(self._snapshot()), pid=os.getpid())
+
+    def publish(self, force=False):
+        """
+        Share this process's counters through the cache, at most every IMAGE_POOL_STATS_INTERVAL seconds
+
+        Entries expire IMAGE_POOL_STATS_TIMEOUT seconds after a process last
+        used its pool, so exited processes drop out of cluster_stats.
+        """
+        now = time.monotonic()
+        if not force and now - self._published < getattr(settings, 'IMAGE_POOL_STATS_INTERVAL', 5):
+            return
+        self._published = now
+
+        key = _stats_key()
+        try:
+            cache.set(key, self._snapshot(), getattr(settings, 'IMAGE_POOL_STATS_TIMEOUT', 60 * 10))
+            registry = cache.get(STATS_REGISTRY_KEY) or []
+            # Concurrent registrations can drop one another; the loser re-registers on its next publish
+            if key not in registry:
+                cache.set(STATS_REGISTRY_KEY, registry + [key], None)
+        except Exception as e:
+            logger.warning(f"Failed to publish image pool stats: {str(e)}")
+
+
+def _discard_output(future):
+    """Free the output of a task whose caller stopped waiting for it"""
+    if not future.cancelled() and future.exception() is None:
+        _unlink_shared(future.result()[0])
+
+
+def cluster_stats():
+    """
+    Pool stats summed over every web worker process that published recently
+
+    Returns:
+        dict: Totals across processes, with means weighted by completed
+            tasks, and each process's own stats under 'processes'
+    """
+    registry = cache.get(STATS_REGISTRY_KEY) or []
+    published = cache.get_many(registry)
+    if len(published) != len(registry):
+        cache.set(STATS_REGISTRY_KEY, [key for key in registry if key in published], None)
+
+    totals = {}
+    for raw in published.values():
+        for counter, value in raw.items():
+            if counter == 'max_in_flight':
+                totals[counter] = max(totals.get(counter, 0), value)
+            else:
+                totals[counter] = totals.get(counter, 0) + value
+    if not totals:
+        return {'processes': {}}
+
+    return dict(
+        _summarize(totals),
+        processes={key.removeprefix('image_pool_stats_'): _summarize(raw) for key, raw in sorted(published.items())},
+    )
+
+
+image_pool = ImagePool()
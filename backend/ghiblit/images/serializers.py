@@ -10,8 +10,8 @@ class GeneratedImageSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = GeneratedImage
-        fields = ['id', 'image_url', 'preview_url', 'download_url', 'is_paid', 'created_at']
-        read_only_fields = ['id', 'image_url', 'preview_url', 'download_url', 'is_paid', 'created_at']
+        fields = ['id', 'image_url', 'preview_url', 'download_url', 'is_paid', 'is_draft', 'created_at']
+        read_only_fields = ['id', 'image_url', 'preview_url', 'download_url', 'is_paid', 'is_draft', 'created_at']
     
     def get_image_url(self, obj):
         if obj.is_paid and obj.image:
@@ -1,12 +1,21 @@
 import os
+import math
 import requests
 import base64
 from io import BytesIO
 import logging
-from PIL import Image, ImageDraw
+from django.conf import settings
+from django.core.cache import cache
+from PIL import ExifTags, Image
 from dotenv import load_dotenv
 from openai import OpenAI
+from .stylize import parse_palette, stylize_preview
+from .encoder import encode_with_options, encoder_options, remember_quality
+from .pool import image_pool
+from .watermark import stamp_watermark
 import tempfile
+import time
+from collections import namedtuple
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -18,19 +27,143 @@ client = OpenAI(
     timeout=300 
 )
 
-def transform_image_to_ghibli(image_file, style='ghibli', user=None):
+# Longest side of the image sent to OpenAI
+MAX_INPUT_SIZE = 1024
+
+# EXIF orientation tag values and the transpose that undoes each of them
+_EXIF_TRANSPOSES = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+def load_upload_image(image_file, max_size=MAX_INPUT_SIZE):
     """
-    Transform the provided image into the requested style using OpenAI API
+    Decode an uploaded image at roughly the size it will be used at
+
+    Large uploads are opened from Django's temporary file instead of being
+    read into memory. Only the header is parsed up front; JPEGs are then
+    decoded by libjpeg at the smallest DCT scale that still covers the
+    target, other formats are shrunk with reduce() before the final LANCZOS
+    pass, and the EXIF orientation is applied to the small result.
 
     Args:
-        image_file: A file-like object containing the image data
-        style: The style to apply (default: 'ghibli')
+        image_file: An uploaded file, path or file-like object
+        max_size: Longest side of the returned image
+
+    Returns:
+        tuple: (RGB image no larger than max_size, (width, height) of the
+            full-resolution upload as displayed)
+    """
+    if hasattr(image_file, 'temporary_file_path'):
+        source = image_file.temporary_file_path()
+    else:
+        source = image_file
+        if hasattr(image_file, 'seek'):
+            image_file.seek(0)
+
+    with Image.open(source) as img:
+        orientation = img.getexif().get(ExifTags.Base.Orientation, 1)
+        width, height = img.size
+        scale = min(1.0, max_size / max(width, height))
+        target = (max(1, round(width * scale)), max(1, round(height * scale)))
+
+        if img.format == 'JPEG':
+            img.draft('RGB', target)
+
+        img.load()
+        if img.mode not in ('RGB', 'RGBA', 'L'):
+            img = img.convert('RGB')
+
+        factor = min(img.width // target[0], img.height // target[1])
+        if factor >= 2:
+            img = img.reduce(factor)
+
+        if img.size != target:
+            img = img.resize(target, Image.LANCZOS)
+
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    if orientation in _EXIF_TRANSPOSES:
+        img = img.transpose(_EXIF_TRANSPOSES[orientation])
+        if orientation >= 5:
+            # Quarter turns swap the displayed width and height
+            width, height = height, width
+
+    return img, (width, height)
+
+# Longest side of the partial renders relayed while a streaming transform runs
+PARTIAL_PREVIEW_SIZE = 512
+
+# Output sizes gpt-image-1 generates natively, as (width, height)
+OUTPUT_SIZES = ((1024, 1024), (1536, 1024), (1024, 1536))
+
+def choose_output_size(width, height):
+    """Pick the native output size whose aspect ratio is closest to width:height"""
+    ratio = width / height
+    return min(OUTPUT_SIZES, key=lambda size: abs(math.log(ratio * size[1] / size[0])))
+
+def pad_to_aspect(img, size):
+    """
+    Pad an image with black bars so it has the aspect ratio of size
+
+    Returns:
+        tuple: (padded image, (left, top, right, bottom) box of the original
+            content within it)
+    """
+    target_ratio = size[0] / size[1]
+    if img.width / img.height > target_ratio:
+        canvas = (img.width, max(img.height, round(img.width / target_ratio)))
+    else:
+        canvas = (max(img.width, round(img.height * target_ratio)), img.height)
+
+    left = (canvas[0] - img.width) // 2
+    top = (canvas[1] - img.height) // 2
+    box = (left, top, left + img.width, top + img.height)
+    if canvas == img.size:
+        return img, box
+
+    padded = Image.new('RGB', canvas, (0, 0, 0))
+    padded.paste(img, (left, top))
+    return padded, box
+
+def get_style_prompt(style):
+    """
+    A style's StylePrompt as a dict of prompt, preview_palette and is_active
+
+    Read on every transform and edited only in the admin, so rows are cached
+    and dropped from the cache when saved or deleted.
+
+    Returns:
+        dict: The style's fields, or None if no such style exists
+    """
+    from .models import StylePrompt, style_prompt_cache_key
+
+    key = style_prompt_cache_key(style)
+    row = cache.get(key)
+    if row is None:
+        row = StylePrompt.objects.filter(style_key=style).values('prompt', 'preview_palette', 'is_active').first()
+        # False caches a missing style, so unknown keys don't query either
+        cache.set(key, row or False, getattr(settings, 'STYLE_PROMPT_CACHE_TIMEOUT', 60 * 60))
+    return row or None
+
+def resolve_style_prompt(style, user=None):
+    """
+    Look up the prompt for a style, falling back to ghibli
+
+    Args:
+        style: The requested style key
         user: The authenticated User instance (required for custom styles)
 
     Returns:
-        BytesIO: A BytesIO object containing the transformed image
+        tuple: (style key actually used, prompt)
     """
-    from .models import StylePrompt, UserCustomStyle
+    from .models import UserCustomStyle
 
     if style.startswith('cust_'):
         if user is None:
@@ -46,99 +179,393 @@ def transform_image_to_ghibli(image_file, style='ghibli', user=None):
                 style = 'ghibli'
 
     if not style.startswith('cust_'):
-        try:
-            style_prompt = StylePrompt.objects.get(style_key=style, is_active=True)
-            prompt = style_prompt.prompt
-        except StylePrompt.DoesNotExist:
+        style_prompt = get_style_prompt(style)
+        if style_prompt is None or not style_prompt['is_active']:
             logger.warning(f"Style '{style}' not found, falling back to ghibli")
-            try:
-                style_prompt = StylePrompt.objects.get(style_key='ghibli', is_active=True)
-                prompt = style_prompt.prompt
-                style = 'ghibli'
-            except StylePrompt.DoesNotExist:
+            style_prompt = get_style_prompt('ghibli')
+            style = 'ghibli'
+            if style_prompt is None or not style_prompt['is_active']:
                 logger.error("Default 'ghibli' style not found in database")
                 raise Exception("Style configuration error")
+        prompt = style_prompt['prompt']
+
+    return style, prompt
+
+# The padded PNG sent to OpenAI plus what's needed to map the result back onto the upload
+PreparedImage = namedtuple('PreparedImage', ['png', 'canvas_size', 'content_box', 'original_size', 'output_size'])
+
+def _upload_source(image_file):
+    """
+    What the image pool needs to read an upload
+
+    Returns:
+        tuple: (bytes, None) for in-memory uploads, or (None, path) for
+            temporary files so they aren't read into memory
+    """
+    if hasattr(image_file, 'temporary_file_path'):
+        return None, image_file.temporary_file_path()
+    if hasattr(image_file, 'seek'):
+        image_file.seek(0)
+    return image_file.read(), None
+
+def _prepare_task(buffer, path):
+    """Image pool task behind prepare_transform_input"""
+    prepared = prepare_loaded_image(*load_upload_image(path if buffer is None else BytesIO(buffer)))
+    return prepared.png, prepared._replace(png=None)
+
+def prepare_transform_input(image_file):
+    """
+    Decode an upload and pad it to the closest native output aspect ratio
+
+    Returns:
+        PreparedImage: The encoded input and its geometry
+    """
+    png, prepared = image_pool.run(_prepare_task, *_upload_source(image_file))
+    return prepared._replace(png=png)
+
+def prepare_loaded_image(img, original_size):
+    """
+    Pad an image returned by load_upload_image to the closest native output aspect ratio
+
+    Returns:
+        PreparedImage: The encoded input and its geometry
+    """
+    output_width, output_height = choose_output_size(img.width, img.height)
+    padded_img, content_box = pad_to_aspect(img, (output_width, output_height))
+
+    wasted = 1 - (img.width * img.height) / (padded_img.width * padded_img.height)
+    logger.info(f"Requesting {output_width}x{output_height} output for {img.width}x{img.height} input ({wasted:.1%} padding)")
+
+    # Save to BytesIO instead of temporary file
+    byte_stream = BytesIO()
+    padded_img.save(byte_stream, format="PNG")
+
+    return PreparedImage(byte_stream.getvalue(), padded_img.size, content_box, original_size, (output_width, output_height))
+
+def _edit_params(prepared, prompt):
+    output_width, output_height = prepared.output_size
+    return {
+        'model': "gpt-image-1",
+        'image': ('image.png', BytesIO(prepared.png)),
+        'prompt': prompt,
+        'n': 1,
+        'size': f"{output_width}x{output_height}",
+    }
+
+def crop_to_content(img, prepared):
+    """Remove the padding added by prepare_transform_input from a generated image of any size"""
+    left, top, right, bottom = prepared.content_box
+    if (left, top, right, bottom) == (0, 0) + tuple(prepared.canvas_size):
+        return img
+
+    scale_x = img.width / prepared.canvas_size[0]
+    scale_y = img.height / prepared.canvas_size[1]
+    return img.crop((
+        round(left * scale_x),
+        round(top * scale_y),
+        round(right * scale_x),
+        round(bottom * scale_y),
+    ))
+
+def dump_prepared(prepared):
+    """Geometry of a PreparedImage as JSON-serializable data, to store next to its PNG"""
+    return {field: list(value) for field, value in prepared._asdict().items() if field != 'png'}
+
+def load_prepared(png, params):
+    """Rebuild a PreparedImage from its PNG and the output of dump_prepared"""
+    return PreparedImage(png, *(tuple(params[field]) for field in PreparedImage._fields[1:]))
+
+def _finish_task(buffer, prepared, max_size, upscale, options):
+    """Image pool task behind finish_transform"""
+    transformed_img = Image.open(BytesIO(base64.b64decode(buffer)))
+    transformed_img = crop_to_content(transformed_img, prepared)
+
+    if max_size:
+        transformed_img.thumbnail((max_size, max_size), Image.LANCZOS)
+    elif upscale and transformed_img.size != prepared.original_size:
+        transformed_img = transformed_img.resize(prepared.original_size, Image.LANCZOS)
+
+    encoded = encode_with_options(transformed_img, options)
+    return encoded.data, encoded._replace(data=None)
+
+def finish_transform(image_base64, prepared, style=None, max_size=None):
+    """
+    Decode, crop and encode the image returned by OpenAI
+
+    Args:
+        image_base64: The generated image, base64-encoded as OpenAI returns it
+        prepared: The PreparedImage it was generated from
+        style: Style key, shares the encoder's tuned quality between images
+        max_size: Optional longest side to downscale the result to
+
+    Returns:
+        BytesIO: A BytesIO object containing the transformed image
+    """
+    options = encoder_options(style)
+    data, encoded = image_pool.run(
+        _finish_task,
+        image_base64.encode('ascii'),
+        prepared._replace(png=None),
+        max_size,
+        getattr(settings, 'IMAGE_UPSCALE_TO_ORIGINAL', False),
+        options,
+    )
+    remember_quality(style, options, encoded)
+    return BytesIO(data)
+
+def render_prepared(prepared, prompt, quality=None):
+    """
+    Send a prepared input to OpenAI
+
+    Returns:
+        str: The generated image, base64-encoded
+    """
+    params = _edit_params(prepared, prompt)
+    if quality:
+        params['quality'] = quality
+
+    # Use the edit endpoint and get base64 data from response
+    response = client.images.edit(**params)
+
+    # Extract base64 data from the response
+    image_base64 = response.data[0].b64_json
+    if not image_base64:
+        raise Exception("OpenAI API did not return image data")
+        
+    logger.info(f"Received base64 image data from OpenAI.")
     
+    # Decoded in the image pool along with the rest of the CPU work
+    return image_base64
+
+def transform_image_to_ghibli(image_file, style='ghibli', user=None):
+    """
+    Transform the provided image into the requested style using OpenAI API
+
+    Args:
+        image_file: A file-like object containing the image data
+        style: The style to apply (default: 'ghibli')
+        user: The authenticated User instance (required for custom styles)
+
+    Returns:
+        BytesIO: A BytesIO object containing the transformed image
+    """
+    style, prompt = resolve_style_prompt(style, user)
     logger.info(f"Using style: {style} with prompt: {prompt}")
     
     try:
-        img = Image.open(image_file)
-        original_width, original_height = img.size
-        
-        max_size = 1024
-        if original_width > max_size or original_height > max_size:
-            if original_width > original_height:
-                new_width = max_size
-                new_height = int(original_height * (max_size / original_width))
-            else:
-                new_height = max_size
-                new_width = int(original_width * (max_size / original_height))
-                
-            img = img.resize((new_width, new_height), Image.LANCZOS)
-            
-        square_size = max(img.width, img.height)
-        square_img = Image.new('RGB', (square_size, square_size), (0, 0, 0))
+        prepared = prepare_transform_input(image_file)
         
-        paste_x = (square_size - img.width) // 2
-        paste_y = (square_size - img.height) // 2
-        square_img.paste(img, (paste_x, paste_y))
+        logger.info(f"Calling OpenAI API to transform image with {style} style using gpt-image-1 model")
+        image_base64 = render_prepared(prepared, prompt)
+        result = finish_transform(image_base64, prepared, style=style)
         
-        # Save to BytesIO instead of temporary file
-        byte_stream = BytesIO()
-        square_img.save(byte_stream, format="PNG")
-        byte_stream.seek(0)
+        logger.info(f"Successfully created {style} style image")
+        return result
         
-        logger.info(f"Calling OpenAI API to transform image with {style} style using gpt-image-1 model")
+    except Exception as e:
+        logger.error(f"Error transforming image: {str(e)}", exc_info=True)
+        if hasattr(e, 'response'):
+            logger.error(f"OpenAI API Response: {e.response.text}")
+        raise Exception(f"Failed to create {style} style image: {str(e)}")
+
+def create_draft_transform(image_file, style='ghibli', user=None):
+    """
+    Render a quick low-quality draft, keeping the prepared input for promotion
 
-        # Use the edit endpoint and get base64 data from response
-        response = client.images.edit(
-            model="gpt-image-1",
-            image=('image.png', byte_stream),
-            prompt=prompt,
-            n=1,
-            size="1024x1024"
+    Args:
+        image_file: A file-like object containing the image data
+        style: The style to apply (default: 'ghibli')
+        user: The authenticated User instance (required for custom styles)
+
+    Returns:
+        tuple: (BytesIO of the draft image, PreparedImage, style key used)
+    """
+    style, prompt = resolve_style_prompt(style, user)
+    logger.info(f"Using style: {style} with prompt: {prompt}")
+
+    try:
+        prepared = prepare_transform_input(image_file)
+
+        logger.info(f"Calling OpenAI API for a draft {style} style image")
+        image_base64 = render_prepared(prepared, prompt, quality=getattr(settings, 'IMAGE_DRAFT_QUALITY', 'low'))
+        result = finish_transform(
+            image_base64,
+            prepared,
+            style=f'{style}_draft',
+            max_size=getattr(settings, 'IMAGE_DRAFT_MAX_SIZE', 768)
         )
 
-        # Extract base64 data from the response
-        image_base64 = response.data[0].b64_json
-        if not image_base64:
-            raise Exception("OpenAI API did not return image data")
-            
-        logger.info(f"Received base64 image data from OpenAI.")
-        
-        # Decode base64 to binary
-        image_bytes = base64.b64decode(image_base64)
-        
-        # Open the image from bytes
-        transformed_img = Image.open(BytesIO(image_bytes))
-        
-        if original_width != original_height:
-            if original_width > original_height:
-                target_height = int(1024 * original_height / original_width)
-                top = (1024 - target_height) // 2
-                crop = (0, top, 1024, top + target_height)
-            else:
-                target_width = int(1024 * original_width / original_height)
-                left = (1024 - target_width) // 2
-                crop = (left, 0, left + target_width, 1024)
-                
-            transformed_img = transformed_img.crop(crop)
-        
-        transformed_img = transformed_img.resize((original_width, original_height), Image.LANCZOS)
-        
-        result = BytesIO()
-        transformed_img.save(result, format="JPEG", quality=95)
-        result.seek(0)
-        
-        logger.info(f"Successfully created {style} style image")
+        logger.info(f"Successfully created draft {style} style image")
+        return result, prepared, style
+
+    except Exception as e:
+        logger.error(f"Error creating draft image: {str(e)}", exc_info=True)
+        if hasattr(e, 'response'):
+            logger.error(f"OpenAI API Response: {e.response.text}")
+        raise Exception(f"Failed to create draft {style} style image: {str(e)}")
+
+def promote_draft_transform(prepared, style, user=None):
+    """
+    Render a draft's stored input at full quality
+
+    Args:
+        prepared: The PreparedImage kept with the draft
+        style: The style the draft was rendered with
+        user: The authenticated User instance (required for custom styles)
+
+    Returns:
+        BytesIO: A BytesIO object containing the transformed image
+    """
+    style, prompt = resolve_style_prompt(style, user)
+
+    try:
+        logger.info(f"Calling OpenAI API to promote a draft {style} style image")
+        result = finish_transform(render_prepared(prepared, prompt), prepared, style=style)
+
+        logger.info(f"Successfully promoted draft {style} style image")
         return result
-        
+
+    except Exception as e:
+        logger.error(f"Error promoting draft image: {str(e)}", exc_info=True)
+        if hasattr(e, 'response'):
+            logger.error(f"OpenAI API Response: {e.response.text}")
+        raise Exception(f"Failed to promote {style} style image: {str(e)}")
+
+def _partial_preview_task(buffer, prepared):
+    """Image pool task: downscale a base64 partial render and encode it as a small JPEG"""
+    img = Image.open(BytesIO(base64.b64decode(buffer)))
+    img = crop_to_content(img, prepared)
+    img.thumbnail((PARTIAL_PREVIEW_SIZE, PARTIAL_PREVIEW_SIZE), Image.BILINEAR, reducing_gap=2.0)
+    if img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    preview = BytesIO()
+    img.save(preview, format="JPEG", quality=70)
+    return preview.getvalue()
+
+def get_style_palette(style):
+    """Preview palette configured on the style's StylePrompt, as an array for stylize_preview"""
+    style_prompt = get_style_prompt(style)
+    return parse_palette(style_prompt and style_prompt['preview_palette'])
+
+def stylized_placeholder(img, style, palette=None):
+    """
+    Instant local approximation of a transform, encoded like a partial render
+
+    Args:
+        img: The decoded upload
+        style: Style key, used to look up the palette when none is given
+        palette: Array from parse_palette
+
+    Returns:
+        bytes: JPEG of the stylized preview
+    """
+    started = time.perf_counter()
+    if palette is None:
+        palette = get_style_palette(style)
+
+    small = img.copy()
+    small.thumbnail((PARTIAL_PREVIEW_SIZE, PARTIAL_PREVIEW_SIZE), Image.BILINEAR, reducing_gap=2.0)
+    stylized = stylize_preview(small, palette)
+
+    placeholder = BytesIO()
+    stylized.save(placeholder, format="JPEG", quality=70)
+    logger.info(f"Created {style} placeholder in {(time.perf_counter() - started) * 1000:.0f} ms")
+    return placeholder.getvalue()
+
+def _load_streamed_task(buffer, path, style, palette):
+    """
+    Image pool task: decode an upload and draw its placeholder
+
+    The decoded image comes back as raw RGB so _prepare_pixels_task can pad
+    and encode it without decoding the upload again.
+    """
+    img, original_size = load_upload_image(path if buffer is None else BytesIO(buffer))
+    placeholder = None
+    if palette is not None:
+        try:
+            placeholder = stylized_placeholder(img, style, palette)
+        except Exception as e:
+            logger.warning(f"Skipping placeholder for {style} style: {str(e)}")
+    return img.tobytes(), (img.size, original_size, placeholder)
+
+def _prepare_pixels_task(buffer, size, original_size):
+    """Image pool task: prepare_loaded_image for raw RGB pixels from _load_streamed_task"""
+    prepared = prepare_loaded_image(Image.frombytes('RGB', size, bytes(buffer)), original_size)
+    return prepared.png, prepared._replace(png=None)
+
+def stream_transform_image_to_ghibli(image_file, style='ghibli', user=None, partial_images=None):
+    """
+    Transform an image like transform_image_to_ghibli, yielding partial renders as they arrive
+
+    Args:
+        image_file: A file-like object containing the image data
+        style: The style to apply (default: 'ghibli')
+        user: The authenticated User instance (required for custom styles)
+        partial_images: Number of partial renders to request (0-3)
+
+    Yields:
+        tuple: ('placeholder', JPEG bytes of a local stylized preview) first,
+            then ('partial', JPEG bytes of a downscaled preview) for each
+            partial render, then ('completed', BytesIO of the final image)
+    """
+    if partial_images is None:
+        partial_images = getattr(settings, 'IMAGE_STREAM_PARTIAL_IMAGES', 2)
+
+    style, prompt = resolve_style_prompt(style, user)
+    logger.info(f"Using style: {style} with prompt: {prompt}")
+
+    try:
+        try:
+            palette = get_style_palette(style)
+        except Exception as e:
+            logger.warning(f"Skipping placeholder for {style} style: {str(e)}")
+            palette = None
+
+        pixels, (size, original_size, placeholder) = image_pool.run(
+            _load_streamed_task, *_upload_source(image_file), style, palette
+        )
+        if placeholder is not None:
+            yield 'placeholder', placeholder
+
+        png, prepared = image_pool.run(_prepare_pixels_task, pixels, size, original_size)
+        prepared = prepared._replace(png=png)
+
+        logger.info(f"Streaming OpenAI transform with {style} style and {partial_images} partial images")
+        stream = client.images.edit(**_edit_params(prepared, prompt), stream=True, partial_images=partial_images)
+
+        for event in stream:
+            if event.type == 'image_edit.partial_image':
+                logger.info(f"Received partial image {event.partial_image_index} from OpenAI")
+                yield 'partial', image_pool.run(
+                    _partial_preview_task, event.b64_json.encode('ascii'), prepared._replace(png=None)
+                )
+            elif event.type == 'image_edit.completed':
+                if not event.b64_json:
+                    raise Exception("OpenAI API did not return image data")
+                result = finish_transform(event.b64_json, prepared, style=style)
+                logger.info(f"Successfully created {style} style image")
+                yield 'completed', result
+                return
+
+        raise Exception("OpenAI stream ended without a completed image")
+
     except Exception as e:
         logger.error(f"Error transforming image: {str(e)}", exc_info=True)
         if hasattr(e, 'response'):
             logger.error(f"OpenAI API Response: {e.response.text}")
         raise Exception(f"Failed to create {style} style image: {str(e)}")
 
+def _preview_task(buffer, apply_watermark, options):
+    """Image pool task behind create_watermarked_preview"""
+    img = Image.open(BytesIO(buffer))
+    result_img = img if img.mode == 'RGB' else img.convert('RGB')
+    if apply_watermark:
+        stamp_watermark(result_img)
+
+    encoded = encode_with_options(result_img, options)
+    return encoded.data, encoded._replace(data=None)
+
 def create_watermarked_preview(image_file, apply_watermark=True):
     """
     Add a watermark to the image for preview purposes if apply_watermark is True,
@@ -153,39 +580,17 @@ def create_watermarked_preview(image_file, apply_watermark=True):
     """
     try:
         img = Image.open(image_file)
-        img = img.convert('RGBA')
-        
-        if apply_watermark:
-            overlay = Image.new('RGBA', img.size, (0, 0, 0, 0))
-            draw = ImageDraw.Draw(overlay)
-            
-            width, height = img.size
-            
-            try:
-                from PIL import ImageFont
-                font_size = max(16, min(width, height) // 20)
-                font = ImageFont.truetype("arial.ttf", font_size)
-            except Exception:
-                font = None
-            
-            text = "Ghibli.art"
-            
-            padding = max(10, min(width, height) // 30)
-            
-            position = (padding, height - padding - font_size)
-            
-            draw.text(position, text, fill=(255, 255, 255, 75), font=font)
-            
-            watermarked = Image.alpha_composite(img, overlay)
-            result_img = watermarked.convert('RGB')
-        else:
-            result_img = img.convert('RGB')
-        
-        result = BytesIO()
-        result_img.save(result, format='JPEG', quality=95)
-        result.seek(0)
-        
-        return result
+
+        if not apply_watermark and img.format in ('JPEG', 'WEBP') and img.mode in ('RGB', 'L'):
+            # Already encoded for delivery: pass the bytes through without decoding or re-encoding
+            image_file.seek(0)
+            return BytesIO(image_file.read())
+
+        image_file.seek(0)
+        options = encoder_options('preview')
+        data, encoded = image_pool.run(_preview_task, image_file.read(), apply_watermark, options)
+        remember_quality('preview', options, encoded)
+        return BytesIO(data)
         
     except Exception as e:
         logger.error(f"Error creating image preview: {str(e)}")
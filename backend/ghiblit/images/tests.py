@@ -1,3 +1,254 @@
-from django.test import TestCase
+import os
+import tempfile
+import time
+import zipfile
+from datetime import datetime
+from io import BytesIO
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from . import encoder
+from .export import _prune_export_cache, cached_export, parse_range_header, stream_images_zip
+from .models import GeneratedImage
+from .variants import parse_variant_request
+from .views import _save_transformed_image
 
-# Create your tests here.
+
+class ParseRangeHeaderTests(SimpleTestCase):
+    def test_satisfiable_ranges(self):
+        cases = {
+            'bytes=0-99': (0, 99),
+            'bytes=500-': (500, 999),
+            'bytes=-100': (900, 999),
+            # Lengths and ends past the file are clamped to it
+            'bytes=-5000': (0, 999),
+            'bytes=990-5000': (990, 999),
+            ' bytes=0-0 ': (0, 0),
+        }
+        for header, expected in cases.items():
+            with self.subTest(header=header):
+                self.assertEqual(parse_range_header(header, 1000), expected)
+
+    def test_ignored_ranges(self):
+        for header in (None, '', 'bytes=', 'bytes=-', 'bytes=-0', 'bytes=1000-', 'bytes=5-1',
+                       'bytes=0-1,5-6', 'items=0-1', 'bytes=a-b'):
+            with self.subTest(header=header):
+                self.assertIsNone(parse_range_header(header, 1000))
+
+    def test_empty_file(self):
+        self.assertIsNone(parse_range_header('bytes=0-', 0))
+
+
+class ExportCacheTests(SimpleTestCase):
+    IMAGES = [
+        ('a.jpg', 'https://storage.test/a.jpg', datetime(2024, 5, 1)),
+        ('b.jpg', 'https://storage.test/b.jpg', datetime(2024, 5, 2)),
+    ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        cache_dir = override_settings(IMAGE_EXPORT_CACHE_DIR=self.directory, IMAGE_EXPORT_CACHE_TIMEOUT=60)
+        cache_dir.enable()
+        self.addCleanup(cache_dir.disable)
+
+    def export(self, fetch):
+        with mock.patch('images.export._fetch_image', side_effect=fetch):
+            return b''.join(stream_images_zip(self.IMAGES, archive_key='key'))
+
+    def test_complete_archive_is_published(self):
+        body = self.export(lambda url: url.encode())
+
+        with open(cached_export('key'), 'rb') as f:
+            self.assertEqual(f.read(), body)
+        self.assertEqual(zipfile.ZipFile(BytesIO(body)).namelist(), ['a.jpg', 'b.jpg'])
+
+    def test_archive_missing_images_is_not_published(self):
+        body = self.export(lambda url: None if url.endswith('b.jpg') else url.encode())
+
+        self.assertEqual(zipfile.ZipFile(BytesIO(body)).namelist(), ['a.jpg'])
+        self.assertIsNone(cached_export('key'))
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_prune_spares_parts_being_written(self):
+        past_timeout = time.time() - 120
+        for name in ('old.zip', 'fresh.zip', 'slow.abc.part', 'abandoned.abc.part'):
+            open(os.path.join(self.directory, name), 'wb').close()
+        for name in ('old.zip', 'slow.abc.part'):
+            os.utime(os.path.join(self.directory, name), (past_timeout, past_timeout))
+        abandoned = time.time() - 60 * 60 * 48
+        os.utime(os.path.join(self.directory, 'abandoned.abc.part'), (abandoned, abandoned))
+
+        _prune_export_cache(self.directory)
+
+        self.assertEqual(sorted(os.listdir(self.directory)), ['fresh.zip', 'slow.abc.part'])
+
+
+class EncoderQualitySearchTests(SimpleTestCase):
+    # Upscaled noise has smooth regions and edges, like a photo
+    IMAGE = Image.effect_noise((32, 24), 64).convert('RGB').resize((256, 192), Image.BICUBIC)
+
+    def encode(self, cached, passing_from=80, quality_range=(60, 95)):
+        """Encode with every quality from passing_from up scoring as good enough, recording the probes"""
+        real_score = encoder._Probe.score
+        probed = []
+
+        def score(probe, quality):
+            real_score(probe, quality)
+            probed.append(quality)
+            return 1.0 if quality >= passing_from else 0.0
+
+        options = encoder.EncoderOptions('JPEG', 0.99, quality_range, cached)
+        with mock.patch.object(encoder._Probe, 'score', autospec=True, side_effect=score):
+            encoded = encoder.encode_with_options(self.IMAGE, options)
+        return encoded, set(probed)
+
+    def test_search_without_cached_quality(self):
+        encoded, _ = self.encode(cached=None)
+
+        self.assertEqual(encoded.quality, 80)
+        self.assertEqual(Image.open(BytesIO(encoded.data)).size, self.IMAGE.size)
+
+    def test_passing_cached_quality_costs_two_probes(self):
+        _, probed = self.encode(cached=80)
+
+        self.assertEqual(probed, {79, 80})
+
+    def test_cached_quality_moves_down(self):
+        encoded, _ = self.encode(cached=90)
+
+        self.assertEqual(encoded.quality, 80)
+
+    def test_failing_cached_quality_searches_above_it(self):
+        encoded, probed = self.encode(cached=70)
+
+        self.assertEqual(encoded.quality, 80)
+        self.assertEqual(min(probed), 70)
+
+    def test_cached_quality_outside_range_is_ignored(self):
+        encoded, _ = self.encode(cached=40)
+
+        self.assertEqual(encoded.quality, 80)
+
+    def test_nothing_passing_uses_the_top_of_the_range(self):
+        encoded, _ = self.encode(cached=None, passing_from=101)
+
+        self.assertEqual(encoded.quality, 95)
+
+    def test_bytes_saved_is_estimated_on_the_probe(self):
+        encoded, _ = self.encode(cached=None, passing_from=60)
+
+        baseline = BytesIO()
+        self.IMAGE.save(baseline, format='JPEG', quality=encoder.BASELINE_QUALITY)
+        self.assertGreater(encoded.bytes_saved, 0)
+        # The probe is the full image here, so the estimate is close to the real saving
+        self.assertAlmostEqual(
+            encoded.bytes_saved, len(baseline.getvalue()) - len(encoded.data), delta=len(baseline.getvalue()) * 0.25
+        )
+
+
+@override_settings(IMAGE_VARIANT_SIZES=(256, 512, 1024))
+class ParseVariantRequestTests(SimpleTestCase):
+    def test_original_needs_no_variant(self):
+        spec = parse_variant_request('images/a.jpg', {}, 'image/*')
+
+        self.assertIsNone(spec.name)
+        self.assertEqual((spec.width, spec.height, spec.format, spec.negotiated), (0, 0, 'JPEG', True))
+
+    def test_sizes_snap_up_to_the_allowed_sizes(self):
+        cases = {'1': 256, '256': 256, '300': 512, '1000': 1024, '5000': 1024}
+        for width, expected in cases.items():
+            with self.subTest(width=width):
+                spec = parse_variant_request('images/a.jpg', {'w': width, 'fmt': 'jpeg'}, '')
+                self.assertEqual(spec.width, expected)
+                self.assertEqual(spec.name, f'variants/images/a_w{expected}_h0.jpg')
+
+    def test_explicit_format(self):
+        spec = parse_variant_request('/images/a.jpg', {'fmt': 'png', 'h': '200'}, 'image/webp')
+
+        self.assertEqual(spec.name, 'variants/images/a_w0_h256.png')
+        self.assertEqual(spec.format, 'PNG')
+        self.assertFalse(spec.negotiated)
+
+    def test_format_is_negotiated_from_accept(self):
+        if not encoder.supports_format('WEBP'):
+            self.skipTest("Pillow was built without WebP")
+
+        spec = parse_variant_request('images/a.png', {'w': '512'}, 'image/webp,image/*')
+
+        self.assertEqual(spec.name, 'variants/images/a_w512_h0.webp')
+        self.assertEqual(spec.format, 'WEBP')
+        self.assertTrue(spec.negotiated)
+
+    def test_invalid_parameters(self):
+        for params in ({'w': 'x'}, {'w': '-1'}, {'h': '0'}, {'fmt': 'gif'}):
+            with self.subTest(params=params):
+                with self.assertRaises(ValueError):
+                    parse_variant_request('images/a.jpg', params, '')
+
+
+class PromoteDraftFilesTests(TestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        storages = override_settings(STORAGES={
+            'default': {
+                'BACKEND': 'django.core.files.storage.FileSystemStorage',
+                'OPTIONS': {'location': media_root.name},
+            },
+        })
+        storages.enable()
+        self.addCleanup(storages.disable)
+
+        self.user = User.objects.create_user(username='ada')
+        self.draft = GeneratedImage(user=self.user, is_draft=True, transform_params={'style': 'ghibli'})
+        self.draft.image.save('draft.jpg', ContentFile(b'draft'), save=False)
+        self.draft.preview_image.save('draft_preview.jpg', ContentFile(b'preview'), save=False)
+        self.draft.source_image.save('source.png', ContentFile(b'source'), save=False)
+        self.draft.save()
+        self.draft_files = [self.draft.image.name, self.draft.preview_image.name, self.draft.source_image.name]
+
+    def promote(self):
+        rendered = BytesIO()
+        Image.new('RGB', (8, 8)).save(rendered, format='JPEG')
+        request = RequestFactory().post('/')
+        request.user = self.user
+        return _save_transformed_image(request, rendered, generated_image=self.draft)
+
+    def test_draft_files_are_replaced(self):
+        self.promote()
+
+        self.draft.refresh_from_db()
+        self.assertFalse(self.draft.is_draft)
+        self.assertFalse(self.draft.source_image)
+        self.assertTrue(default_storage.exists(self.draft.image.name))
+        self.assertTrue(default_storage.exists(self.draft.preview_image.name))
+        for name in self.draft_files:
+            self.assertFalse(default_storage.exists(name))
+
+    def test_failed_save_keeps_the_draft_files(self):
+        with mock.patch.object(GeneratedImage, 'save', side_effect=RuntimeError('database down')):
+            with self.assertRaises(RuntimeError):
+                self.promote()
+
+        for name in self.draft_files:
+            self.assertTrue(default_storage.exists(name))
+
+
+class RecentImagesLimitTests(TestCase):
+    def test_limit_is_clamped(self):
+        cases = {'10000': 50, '0': 1, '-5': 1, 'x': 12, '20': 20}
+        for limit, expected in cases.items():
+            with self.subTest(limit=limit):
+                cache.clear()
+                with mock.patch('images.views._build_recent_images', return_value=[]) as build:
+                    response = self.client.get(reverse('recent-images'), {'limit': limit})
+
+                self.assertEqual(response.status_code, 200)
+                build.assert_called_once_with(mock.ANY, expected)
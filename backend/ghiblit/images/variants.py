@@ -0,0 +1,223 @@
+import logging
+import os
+from collections import namedtuple
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from io import BytesIO
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.http import Http404
+from PIL import Image
+
+from config.storage import clean_supabase_content
+from .encoder import CONTENT_TYPES, EXTENSIONS, encode_at_quality, supports_format
+from .pool import PoolBusy, image_pool
+
+logger = logging.getLogger(__name__)
+
+# Variants are stored under this prefix, next to the originals they were derived from
+VARIANT_PREFIX = 'variants/'
+VARIANT_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+# Values accepted by the fmt query parameter
+FORMAT_ALIASES = {
+    'auto': None,
+    'jpeg': 'JPEG',
+    'jpg': 'JPEG',
+    'webp': 'WEBP',
+    'avif': 'AVIF',
+    'png': 'PNG',
+}
+
+VariantSpec = namedtuple('VariantSpec', ['source', 'name', 'width', 'height', 'format', 'negotiated'])
+
+_session = requests.Session()
+
+
+def source_format(name):
+    """Image format of a stored object from its extension, defaulting to JPEG"""
+    extension = os.path.splitext(name)[1].lower()
+    for image_format, format_extension in EXTENSIONS.items():
+        if extension == format_extension:
+            return image_format
+    return 'JPEG'
+
+
+def _dimension(value):
+    """
+    Requested size rounded up to the nearest of IMAGE_VARIANT_SIZES (0 if unset)
+
+    The endpoint is public, so only that short list of sizes can ever be
+    rendered and stored per image, however many distinct values are requested.
+    """
+    if value in (None, ''):
+        return 0
+    size = int(value)
+    if size <= 0:
+        raise ValueError(f"Invalid size {value}")
+    sizes = sorted(getattr(settings, 'IMAGE_VARIANT_SIZES', (256, 512, 768, 1024, 1536)))
+    return next((allowed for allowed in sizes if allowed >= size), sizes[-1])
+
+
+def _negotiate(accept, fallback):
+    """Best format the client accepts, preferring AVIF over WebP over the original"""
+    for image_format in ('AVIF', 'WEBP'):
+        if CONTENT_TYPES[image_format] in accept and supports_format(image_format):
+            return image_format
+    return fallback
+
+
+def parse_variant_request(image_path, params, accept):
+    """
+    Work out which variant of a stored image a request wants
+
+    Args:
+        image_path: Name of the original in storage
+        params: Query parameters; w and h bound the size, fmt picks the format
+            ('auto', the default, negotiates it from the Accept header)
+        accept: The request's Accept header
+
+    Returns:
+        VariantSpec: The variant to serve; its name is None when the original
+            already matches
+
+    Raises:
+        ValueError: If a parameter is malformed or the format can't be encoded
+    """
+    requested = params.get('fmt', 'auto').lower()
+    if requested not in FORMAT_ALIASES:
+        raise ValueError(f"Unknown format {requested}")
+
+    original_format = source_format(image_path)
+    negotiated = FORMAT_ALIASES[requested] is None
+    image_format = _negotiate(accept, original_format) if negotiated else FORMAT_ALIASES[requested]
+    if not supports_format(image_format):
+        raise ValueError(f"{image_format} output is not supported")
+
+    width = _dimension(params.get('w'))
+    height = _dimension(params.get('h'))
+
+    name = None
+    if width or height or image_format != original_format:
+        stem = os.path.splitext(image_path.lstrip('/'))[0]
+        name = f"{VARIANT_PREFIX}{stem}_w{width}_h{height}{EXTENSIONS[image_format]}"
+    return VariantSpec(image_path, name, width, height, image_format, negotiated)
+
+
+def render_variant(data, width, height, image_format, quality):
+    """
+    Resize and re-encode an image; runs in the image pool
+
+    The image is shrunk to fit width x height (0 leaves a side unbounded)
+    and never enlarged. JPEG sources are decoded at a reduced DCT scale
+    first, so large originals are cheap to shrink.
+
+    Returns:
+        bytes: The encoded variant
+    """
+    img = Image.open(BytesIO(data))
+    bounds = (width or img.width, height or img.height)
+    # thumbnail() drafts JPEGs before decoding and keeps the aspect ratio
+    img.thumbnail(bounds, Image.LANCZOS, reducing_gap=3.0)
+
+    if image_format == 'JPEG' or img.mode not in ('RGB', 'RGBA', 'L'):
+        img = img.convert('RGB')
+    return encode_at_quality(img, image_format, quality, final=True)
+
+
+def _render_in_pool(data, spec):
+    """Render a variant in the image pool, or return None if the pool is saturated"""
+    try:
+        return image_pool.run(
+            render_variant, data, spec.width, spec.height, spec.format,
+            getattr(settings, 'IMAGE_VARIANT_QUALITY', 80),
+            wait=getattr(settings, 'IMAGE_VARIANT_QUEUE_TIMEOUT', 0.5),
+            timeout=getattr(settings, 'IMAGE_VARIANT_RENDER_TIMEOUT', 10),
+        )
+    except PoolBusy:
+        logger.warning(f"Image pool saturated, serving the original of {spec.source}")
+    except FutureTimeoutError:
+        logger.warning(f"Rendering variant {spec.name} timed out")
+    return None
+
+
+def public_url(name):
+    from decouple import config
+
+    return f"https://{config('SUPABASE_PROJECT_ID')}.supabase.co/storage/v1/object/public/ghiblits/{name.lstrip('/')}"
+
+
+def _fetch(name):
+    response = _session.get(public_url(name), timeout=30)
+    if response.status_code != 200:
+        return None
+    return clean_supabase_content(response.content)
+
+
+def _store_variant(name, data):
+    """
+    Save a variant under exactly its deterministic name
+
+    Storage never overwrites (AWS_S3_FILE_OVERWRITE = False) and saves a
+    clash under a suffixed name instead, so an existing object is kept and a
+    copy that lost a race is removed.
+    """
+    if default_storage.exists(name):
+        return
+    saved_name = default_storage.save(name, ContentFile(data))
+    if saved_name != name:
+        default_storage.delete(saved_name)
+
+
+def variant_cache_key(name):
+    return f'image_variant_{name}'
+
+
+def is_stored_variant(spec):
+    """Whether the variant is known to be in storage without its bytes being cached"""
+    return cache.get(variant_cache_key(spec.name)) is True
+
+
+def get_variant(spec):
+    """
+    Bytes of a variant, rendering and storing it on first request
+
+    Variants are looked up in the cache, then in storage, and only rendered
+    when neither has them. Small variants are cached whole; larger ones are
+    cached as a marker that storage has them. One request per variant renders
+    it while concurrent ones fall back to the original.
+
+    Returns:
+        bytes: The variant, or None when it can't be produced right now
+
+    Raises:
+        Http404: If the original doesn't exist
+    """
+    key = variant_cache_key(spec.name)
+    cached = cache.get(key)
+    if isinstance(cached, bytes):
+        return cached
+
+    # Rendered by an earlier request whose cache entry has since expired
+    data = _fetch(spec.name)
+    if data is None:
+        lock_key = f'{key}:lock'
+        if not cache.add(lock_key, True, getattr(settings, 'IMAGE_VARIANT_RENDER_TIMEOUT', 10) + 30):
+            return None
+        try:
+            original = _fetch(spec.source)
+            if original is None:
+                raise Http404("Image not found")
+            data = _render_in_pool(original, spec)
+            if data is None:
+                return None
+            _store_variant(spec.name, data)
+            logger.info(f"Stored variant {spec.name} ({len(data)} bytes from {len(original)})")
+        finally:
+            cache.delete(lock_key)
+
+    small = len(data) <= getattr(settings, 'IMAGE_VARIANT_CACHE_MAX_BYTES', 32 * 1024)
+    cache.set(key, data if small else True, getattr(settings, 'IMAGE_VARIANT_CACHE_TIMEOUT', 60 * 60 * 24))
+    return data
@@ -1,153 +1,352 @@
 from rest_framework import status, views, permissions
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from django.core.files.base import ContentFile
+from django.db.models import F
 from django.utils import timezone
 from datetime import timedelta
+import base64
 import logging
+import os
 import requests
-import re
-from django.http import HttpResponse, Http404
+from django.http import HttpResponse, HttpResponseNotModified, HttpResponseRedirect, Http404, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+from django.conf import settings
+from django.core.cache import cache
 from django.core.files.storage import default_storage
 from .serializers import GeneratedImageSerializer, ImageUploadSerializer
 from .models import GeneratedImage
-from .services import transform_image_to_ghibli, create_watermarked_preview
+from .cache import RECENT_IMAGES_STALE_TIMEOUT, RECENT_IMAGES_TIMEOUT, recent_images_cache_key
+from .services import (
+    create_draft_transform,
+    create_watermarked_preview,
+    dump_prepared,
+    load_prepared,
+    promote_draft_transform,
+    stream_transform_image_to_ghibli,
+    transform_image_to_ghibli,
+)
 from users.models import UserProfile
+from users.cache import invalidate_user_cache
 
-from django.views.decorators.cache import cache_page
-from django.core.cache import cache
+from api.renderers import EventStreamRenderer, ORJSONRenderer, sse_event
+from config.caching import get_or_rebuild
+from config.offload import offload_storage_object
+from config.storage import clean_supabase_content, signed_download_url
+from .encoder import CONTENT_TYPES, EXTENSIONS, sniff_format
+from .export import cached_export, iter_file_range, parse_range_header, stream_images_zip
+from .pool import cluster_stats, image_pool
+from .variants import VARIANT_CACHE_CONTROL, get_variant, is_stored_variant, parse_variant_request
 
 logger = logging.getLogger(__name__)
 
+def reserve_credits(user, credits):
+    """
+    Take credits from a user's balance before the work they pay for
+
+    A single conditional UPDATE, so concurrent requests can't spend the same
+    credits twice and credits added meanwhile (e.g. by a payment) are kept.
+
+    Returns:
+        bool: False if the balance doesn't cover the credits
+    """
+    if credits <= 0:
+        return True
+    reserved = UserProfile.objects.filter(user=user, credit_balance__gte=credits).update(
+        credit_balance=F('credit_balance') - credits
+    )
+    if not reserved:
+        return False
+    logger.info(f"Reserved {credits} credits from {user.username}")
+    invalidate_user_cache(user.id)
+    return True
+
+
+def refund_credits(user, credits):
+    """Give back credits reserved for work that failed"""
+    if credits <= 0:
+        return
+    UserProfile.objects.filter(user=user).update(credit_balance=F('credit_balance') + credits)
+    logger.info(f"Refunded {credits} credits to {user.username}")
+    invalidate_user_cache(user.id)
+
+
+def _insufficient_credits():
+    return Response(
+        {"error": "No credits available. Please purchase credits to continue."},
+        status=status.HTTP_402_PAYMENT_REQUIRED
+    )
+
+
+def _authorize_transform(request, required_credits=1, charge=None):
+    """
+    Validate a transform request and reserve the credits it costs
+
+    Args:
+        required_credits: Balance the user must have
+        charge: Credits reserved now; defaults to required_credits. The
+            caller refunds them if the transform fails.
+
+    Returns:
+        tuple: (image file, style, None) or (None, None, error Response)
+    """
+    serializer = ImageUploadSerializer(data=request.data)
+    if not serializer.is_valid():
+        logger.warning(f"Image upload validation failed: {serializer.errors}")
+        return None, None, Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+    image_file = serializer.validated_data['image']
+    style = request.data.get('style', 'ghibli')
+    
+    logger.info(f"Processing image with style: {style}")
+
+    user = request.user
+
+    if user.is_authenticated:
+        try:
+            user_profile = UserProfile.objects.get(user=user)
+        except UserProfile.DoesNotExist:
+            logger.error(f"UserProfile not found for authenticated user {user.username}")
+            return None, None, Response({"error": "User profile not found."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        if user_profile.credit_balance < max(required_credits, 1):
+            logger.info(f"User {user.username} has {user_profile.credit_balance} credits. Payment required.")
+            return None, None, _insufficient_credits()
+        # The balance read above may already be stale; the reservation is what counts
+        if not reserve_credits(user, required_credits if charge is None else charge):
+            logger.info(f"User {user.username} ran out of credits. Payment required.")
+            return None, None, _insufficient_credits()
+
+        logger.info(f"User {user.username} has {user_profile.credit_balance} credits. Proceeding with paid transform.")
+        return image_file, style, None
+    else:
+        logger.info("Anonymous user attempted transformation. Login required.")
+        return None, None, Response(
+            {"error": "Please sign in to transform images."},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+
+
+def _save_transformed_image(request, transformed_image, generated_image=None, draft_source=None):
+    """
+    Store a finished transform whose credits were reserved up front
+
+    Args:
+        generated_image: A draft being promoted, or None to create a new image
+        draft_source: (PreparedImage, style) to keep with a new draft so it
+            can be promoted later
+
+    Returns:
+        dict: Serialized GeneratedImage plus the updated credit balance
+    """
+    user = request.user
+    preview_image = create_watermarked_preview(transformed_image, apply_watermark=False)
+
+    transformed_image.seek(0)
+    preview_image.seek(0)
+
+    # The draft's files are only deleted once the row points at their replacements
+    replaced_files = []
+    if generated_image is None:
+        generated_image = GeneratedImage()
+        generated_image.user = user
+    else:
+        replaced_files = [generated_image.image.name, generated_image.preview_image.name]
+
+    generated_image.is_draft = draft_source is not None
+    generated_image.is_paid = not generated_image.is_draft
+
+    # Both files come straight from the encoder, so they are stored as-is
+    image_data = transformed_image.getvalue()
+    preview_data = preview_image.getvalue()
+    timestamp = timezone.now().strftime('%Y%m%d%H%M%S')
+
+    generated_image.image.save(
+        f"ghibli_{timestamp}{EXTENSIONS[sniff_format(image_data)]}",
+        ContentFile(image_data),
+        save=False
+    )
+
+    generated_image.preview_image.save(
+        f"preview_{timestamp}{EXTENSIONS[sniff_format(preview_data)]}",
+        ContentFile(preview_data),
+        save=False
+    )
+
+    if draft_source is not None:
+        prepared, style = draft_source
+        generated_image.source_image.save(
+            f"source_{timezone.now().strftime('%Y%m%d%H%M%S')}.png",
+            ContentFile(prepared.png),
+            save=False
+        )
+        generated_image.transform_params = {'style': style, **dump_prepared(prepared)}
+    else:
+        if generated_image.source_image:
+            replaced_files.append(generated_image.source_image.name)
+            generated_image.source_image = None
+        generated_image.token_expires_at = timezone.now() + timedelta(days=1)
+
+    generated_image.save()
+    logger.info(f"Saved generated image {generated_image.id} for user {user.username}")
+
+    for name in replaced_files:
+        if name:
+            default_storage.delete(name)
+
+    serializer = GeneratedImageSerializer(
+        generated_image,
+        context={'request': request}
+    )
+    response_data = serializer.data
+
+    response_data['updated_credit_balance'] = UserProfile.objects.values_list('credit_balance', flat=True).get(user=user)
+    return response_data
+
+
+def _claim_daily_draft(user):
+    """Count a draft against the user's daily allowance; False once it is used up"""
+    key = f"draft_transforms_{user.id}_{timezone.now().strftime('%Y%m%d')}"
+    cache.add(key, 0, 60 * 60 * 24)
+    return cache.incr(key) <= getattr(settings, 'DRAFT_DAILY_LIMIT', 20)
+
+
 class ImageTransformAPIView(views.APIView):
     permission_classes = [AllowAny]
 
     def post(self, request):
-        serializer = ImageUploadSerializer(data=request.data)
-        if not serializer.is_valid():
-            logger.warning(f"Image upload validation failed: {serializer.errors}")
-            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        # "draft" renders a quick low-quality preview that can be promoted later
+        is_draft = request.data.get('mode', 'full') == 'draft'
+        full_cost = getattr(settings, 'TRANSFORM_CREDIT_COST', 1)
 
-        image_file = serializer.validated_data['image']
-        style = request.data.get('style', 'ghibli')
-        
-        logger.info(f"Processing image with style: {style}")
+        charge = getattr(settings, 'DRAFT_CREDIT_COST', 0) if is_draft else full_cost
+
+        # Drafts still require enough credits to promote them
+        image_file, style, error_response = _authorize_transform(request, required_credits=full_cost, charge=charge)
+        if error_response is not None:
+            return error_response
 
         user = request.user
-        user_profile = None
-        can_transform = False
-        credits_to_deduct = 0
-
-        if user.is_authenticated:
-            try:
-                user_profile = UserProfile.objects.get(user=user)
-                if user_profile.credit_balance > 0:
-                    can_transform = True
-                    credits_to_deduct = 1
-                    logger.info(f"User {user.username} has {user_profile.credit_balance} credits. Proceeding with paid transform.")
-                else:
-                    logger.info(f"User {user.username} has 0 credits. Payment required.")
-                    return Response(
-                        {"error": "No credits available. Please purchase credits to continue."},
-                        status=status.HTTP_402_PAYMENT_REQUIRED
-                    )
-            except UserProfile.DoesNotExist:
-                logger.error(f"UserProfile not found for authenticated user {user.username}")
-                return Response({"error": "User profile not found."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
-        else:
-            logger.info("Anonymous user attempted transformation. Login required.")
+        if is_draft and not _claim_daily_draft(user):
+            refund_credits(user, charge)
             return Response(
-                {"error": "Please sign in to transform images."},
-                status=status.HTTP_401_UNAUTHORIZED
+                {"error": "Daily draft limit reached. Please try again tomorrow or run a full transform."},
+                status=status.HTTP_429_TOO_MANY_REQUESTS
             )
 
-        if not can_transform:
-            logger.error(f"Authorization check failed unexpectedly for user {user.username if user.is_authenticated else 'Anonymous'}")
-            return Response({"error": "Authorization failed."}, status=status.HTTP_403_FORBIDDEN)
-
         try:
-            logger.info(f"Starting image transformation for user {user.username}")
-            transformed_image = transform_image_to_ghibli(image_file, style=style, user=user)
-
-            preview_image = create_watermarked_preview(transformed_image, apply_watermark=False)
-
-            transformed_image.seek(0)
-            preview_image.seek(0)
-
-            if user_profile and credits_to_deduct > 0:
-                user_profile.credit_balance -= credits_to_deduct
-                user_profile.save()
-                logger.info(f"Deducted {credits_to_deduct} credit from {user.username}. New balance: {user_profile.credit_balance}")
-
-                cache.delete(f'user_profile_{user.id}')
-                logger.info(f"Invalidated cache for user_profile_{user.id}")
-
-                generated_image = GeneratedImage()
-                generated_image.user = user
-                generated_image.is_paid = True
-
-                from PIL import Image
-                import io
-
-                img_data = transformed_image.getvalue()
-                try:
-                    pil_image = Image.open(io.BytesIO(img_data))
-                    output = io.BytesIO()
-                    pil_image.save(output, format=pil_image.format or 'JPEG')
-                    clean_img_data = output.getvalue()
-                    
-                    generated_image.image.save(
-                        f"ghibli_{timezone.now().strftime('%Y%m%d%H%M%S')}.jpg",
-                        ContentFile(clean_img_data),
-                        save=False
-                    )
-                except Exception as e:
-                    logger.error(f"Error cleaning image data: {str(e)}")
-                    generated_image.image.save(
-                        f"ghibli_{timezone.now().strftime('%Y%m%d%H%M%S')}.jpg",
-                        ContentFile(transformed_image.getvalue()),
-                        save=False
-                    )
-
-                generated_image.preview_image.save(
-                    f"preview_{timezone.now().strftime('%Y%m%d%H%M%S')}.jpg",
-                    ContentFile(preview_image.getvalue()),
-                    save=False
-                )
-
-                generated_image.token_expires_at = timezone.now() + timedelta(days=1)
-
-                generated_image.save()
-                logger.info(f"Saved generated image {generated_image.id} for user {user.username}")
-
-                serializer = GeneratedImageSerializer(
-                    generated_image,
-                    context={'request': request}
-                )
-                response_data = serializer.data
-
-                response_data['updated_credit_balance'] = user_profile.credit_balance
-
-                return Response(response_data, status=status.HTTP_201_CREATED)
-
+            if is_draft:
+                logger.info(f"Starting draft image transformation for user {user.username}")
+                draft_image, prepared, style = create_draft_transform(image_file, style=style, user=user)
+                response_data = _save_transformed_image(request, draft_image, draft_source=(prepared, style))
             else:
-                logger.error("Reached unexpected state during image saving.")
-                return Response({"error": "An internal error occurred."}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+                logger.info(f"Starting image transformation for user {user.username}")
+                transformed_image = transform_image_to_ghibli(image_file, style=style, user=user)
+                response_data = _save_transformed_image(request, transformed_image)
+
+            return Response(response_data, status=status.HTTP_201_CREATED)
 
         except Exception as e:
+            refund_credits(user, charge)
             logger.exception(f"Image transformation error for user {user.username if user.is_authenticated else 'Anonymous'}: {str(e)}")
             return Response(
                 {"error": "Failed to transform image. Please try again later."},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-@api_view(['GET'])
-@permission_classes([AllowAny])
-@cache_page(60 * 60 * 6)  # Cache for 6 hours
-def recent_images(request):
-    limit = int(request.query_params.get('limit', 12))
-    
+
+class ImageTransformStreamAPIView(views.APIView):
+    """
+    Same as ImageTransformAPIView, but relays partial renders over Server-Sent Events
+
+    Emits a "placeholder" event with a local stylized preview right away and
+    "partial" events carrying a small JPEG data URL as OpenAI renders,
+    then a "completed" event with the same payload the non-streaming
+    endpoint returns, or an "error" event.
+    """
+    permission_classes = [AllowAny]
+    renderer_classes = [ORJSONRenderer, EventStreamRenderer]
+
+    def post(self, request):
+        cost = getattr(settings, 'TRANSFORM_CREDIT_COST', 1)
+        image_file, style, error_response = _authorize_transform(request, required_credits=cost)
+        if error_response is not None:
+            return error_response
+
+        response = StreamingHttpResponse(
+            self._events(request, image_file, style, cost),
+            content_type='text/event-stream'
+        )
+        response['Cache-Control'] = 'no-cache'
+        # Stop nginx from buffering the stream
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+    def _events(self, request, image_file, style, cost):
+        user = request.user
+        saved = False
+        # Flush headers right away so the client knows the transform started
+        yield b': transform started\n\n'
+        try:
+            logger.info(f"Starting streaming image transformation for user {user.username}")
+            for event, payload in stream_transform_image_to_ghibli(image_file, style=style, user=user):
+                if event in ('placeholder', 'partial'):
+                    data_url = 'data:image/jpeg;base64,' + base64.b64encode(payload).decode('ascii')
+                    yield sse_event(event, {'image': data_url})
+                else:
+                    response_data = _save_transformed_image(request, payload)
+                    saved = True
+                    yield sse_event('completed', response_data)
+        except Exception as e:
+            logger.exception(f"Streaming image transformation error for user {user.username}: {str(e)}")
+            yield sse_event('error', {"error": "Failed to transform image. Please try again later."})
+        finally:
+            # Also runs when the client disconnects and the generator is closed
+            if not saved:
+                refund_credits(user, cost)
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def promote_draft(request, image_id):
+    """Render a draft again at full quality from its stored input"""
+    cost = getattr(settings, 'PROMOTE_CREDIT_COST', 1)
+
+    try:
+        image = GeneratedImage.objects.get(id=image_id, user=request.user, is_draft=True)
+    except GeneratedImage.DoesNotExist:
+        return Response({"error": "Draft not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    lock_key = f'promote_draft_{image.id}'
+    if not cache.add(lock_key, True, 60 * 5):
+        return Response({"error": "This draft is already being upgraded."}, status=status.HTTP_409_CONFLICT)
+
+    # Reserved before rendering so parallel promotions can't overdraw the balance
+    if not reserve_credits(request.user, cost):
+        cache.delete(lock_key)
+        return _insufficient_credits()
+
+    try:
+        with image.source_image.open('rb') as source:
+            prepared = load_prepared(source.read(), image.transform_params)
+
+        transformed_image = promote_draft_transform(prepared, image.transform_params['style'], user=request.user)
+        response_data = _save_transformed_image(request, transformed_image, generated_image=image)
+        logger.info(f"Promoted draft {image.id} for user {request.user.username}")
+        return Response(response_data)
+
+    except Exception as e:
+        refund_credits(request.user, cost)
+        logger.exception(f"Draft promotion error for image {image_id}, user {request.user.username}: {str(e)}")
+        return Response(
+            {"error": "Failed to upgrade image. Please try again later."},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    finally:
+        cache.delete(lock_key)
+
+def _build_recent_images(base_url, limit):
     buffer_limit = limit * 2
     images = GeneratedImage.objects.filter(is_paid=True).order_by('-created_at')[:buffer_limit]
     
@@ -161,7 +360,7 @@ def recent_images(request):
         if valid_count >= limit:
             break
             
-        preview_url = request.build_absolute_uri(f'/api/clean-image/{img.preview_image.name}')
+        preview_url = f'{base_url}api/clean-image/{img.preview_image.name}'
         original_placeholder = preview_url
         
         result.append({
@@ -173,6 +372,25 @@ def recent_images(request):
         
         valid_count += 1
 
+    return result
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def recent_images(request):
+    try:
+        limit = int(request.query_params.get('limit', 12))
+    except ValueError:
+        limit = 12
+    # Every distinct limit is its own cache entry and query size
+    limit = min(max(limit, 1), 50)
+    base_url = request.build_absolute_uri('/')
+
+    result = get_or_rebuild(
+        recent_images_cache_key(limit, base_url),
+        lambda: _build_recent_images(base_url, limit),
+        timeout=RECENT_IMAGES_TIMEOUT,
+        stale_timeout=RECENT_IMAGES_STALE_TIMEOUT,
+    )
     return Response(result)
 
 @api_view(['GET'])
@@ -183,6 +401,19 @@ def user_images(request):
     return Response(serializer.data)
 
 
+def _image_content_type(name):
+    extension = os.path.splitext(name)[1].lower()
+    if extension == '.png':
+        return 'image/png'
+    if extension == '.webp':
+        return 'image/webp'
+    return 'image/jpeg'
+
+
+def _download_filename(image):
+    return f"ghiblified-image-{image.id}{os.path.splitext(image.image.name)[1] or '.jpg'}"
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def download_image(request, image_id):
@@ -199,9 +430,27 @@ def download_image(request, image_id):
         if not image.is_paid:
              return Response({"error": "You don't have permission to download this image"}, status=status.HTTP_403_FORBIDDEN)
 
+        if getattr(settings, 'IMAGE_DOWNLOAD_REDIRECT', False):
+            logger.info(f"User {request.user.username} downloading image {image_id} via signed URL")
+            return HttpResponseRedirect(signed_download_url(
+                image.image,
+                filename=_download_filename(image),
+                expires_in=getattr(settings, 'IMAGE_DOWNLOAD_URL_EXPIRES', 300)
+            ))
+
+        offloaded = offload_storage_object(
+            'ghiblits',
+            image.image.name,
+            _image_content_type(image.image.name),
+            filename=_download_filename(image),
+            as_attachment=True
+        )
+        if offloaded is not None:
+            logger.info(f"User {request.user.username} downloading image {image_id} via proxy offload")
+            return offloaded
+
         from decouple import config
         import requests
-        import re
         
         project_id = config('SUPABASE_PROJECT_ID')
         supabase_url = f"https://{project_id}.supabase.co/storage/v1/object/public/ghiblits/{image.image.name}"
@@ -210,28 +459,13 @@ def download_image(request, image_id):
         if response.status_code != 200:
             return Response({"error": "Image not found on storage"}, status=status.HTTP_404_NOT_FOUND)
         
-        content = response.content
+        content = clean_supabase_content(response.content)
         
-        if not content.startswith(b'\x89PNG') and not content.startswith(b'\xff\xd8\xff'):
-            png_pos = content.find(b'\x89PNG\r\n\x1a\n')
-            jpeg_pos = content.find(b'\xff\xd8\xff')
-            
-            if png_pos > 0:
-                content = content[png_pos:]
-            elif jpeg_pos > 0:
-                content = content[jpeg_pos:]
-            else:
-                match = re.search(b'\d+\r\n', content)
-                if match and match.end() < 100:
-                    content = content[match.end():]
-        
-        content_type = 'image/jpeg'
-        if image.image.name.lower().endswith('.png'):
-            content_type = 'image/png'
+        content_type = _image_content_type(image.image.name)
         
         logger.info(f"User {request.user.username} downloading image {image_id}")
         response = HttpResponse(content, content_type=content_type)
-        response['Content-Disposition'] = f'attachment; filename="ghiblified-image-{image_id}.jpg"'
+        response['Content-Disposition'] = f'attachment; filename="{_download_filename(image)}"'
         return response
 
     except GeneratedImage.DoesNotExist:
@@ -242,8 +476,135 @@ def download_image(request, image_id):
         return Response({"error": "Failed to download image"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def _serve_cached_export(request, path, etag, filename):
+    """Serve a finished export archive, honouring a single Range so clients can resume"""
+    size = os.path.getsize(path)
+    byte_range = None
+    range_header = request.META.get('HTTP_RANGE')
+    if range_header and request.META.get('HTTP_IF_RANGE', etag) == etag:
+        byte_range = parse_range_header(range_header, size)
+        if byte_range is None:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{size}'
+            return response
+
+    start, end = byte_range or (0, size - 1)
+    response = StreamingHttpResponse(iter_file_range(path, start, end), content_type='application/zip')
+    if byte_range is not None:
+        response.status_code = 206
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    response['Content-Length'] = str(end - start + 1)
+    response['Accept-Ranges'] = 'bytes'
+    response['ETag'] = etag
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_images(request):
+    images = list(
+        GeneratedImage.objects.filter(user=request.user, is_paid=True)
+        .only('id', 'image', 'created_at', 'updated_at')
+        .order_by('created_at', 'id')
+    )
+    if not images:
+        return Response({"error": "No downloadable images found"}, status=status.HTTP_404_NOT_FOUND)
+
+    # Any new, removed or updated image changes the key, so a stale archive is never resumed
+    latest_update = max(image.updated_at for image in images)
+    archive_key = f"{request.user.id}-{len(images)}-{int(latest_update.timestamp())}"
+    etag = quote_etag(archive_key)
+    filename = "ghiblified-images.zip"
+
+    cached_path = cached_export(archive_key)
+    if cached_path is not None:
+        logger.info(f"User {request.user.username} downloading cached export of {len(images)} images")
+        return _serve_cached_export(request, cached_path, etag, filename)
+
+    entries = [
+        (
+            _download_filename(image),
+            image.get_image_url(),
+            image.created_at,
+        )
+        for image in images
+    ]
+
+    logger.info(f"User {request.user.username} exporting {len(entries)} images")
+    response = StreamingHttpResponse(
+        stream_images_zip(
+            entries,
+            archive_key=archive_key,
+            concurrency=getattr(settings, 'IMAGE_EXPORT_FETCH_CONCURRENCY', 4)
+        ),
+        content_type='application/zip'
+    )
+    response['ETag'] = etag
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def image_pool_stats(request):
+    """Queue metrics of the image pool, summed over the web worker processes that used it recently"""
+    # This process's own entry may be up to IMAGE_POOL_STATS_INTERVAL old
+    image_pool.publish(force=True)
+    return Response(cluster_stats())
+
+
+def _variant_response(spec, response):
+    # Variant names encode the original, size and format, and nothing is stored over them
+    response['Cache-Control'] = VARIANT_CACHE_CONTROL
+    response['ETag'] = quote_etag(spec.name)
+    if spec.negotiated:
+        patch_vary_headers(response, ('Accept',))
+    return response
+
+
+def _serve_variant(request, spec):
+    """Response for an image variant, or None when it should fall back to the original"""
+    if quote_etag(spec.name) in parse_etags(request.headers.get('If-None-Match', '')):
+        return _variant_response(spec, HttpResponseNotModified())
+
+    content_type = CONTENT_TYPES[spec.format]
+    if is_stored_variant(spec):
+        offloaded = offload_storage_object('ghiblits', spec.name, content_type)
+        if offloaded is not None:
+            return _variant_response(spec, offloaded)
+
+    content = get_variant(spec)
+    if content is None:
+        return None
+    return _variant_response(spec, HttpResponse(content, content_type=content_type))
+
+
 def serve_cleaned_image(request, image_path):
     from decouple import config
+
+    try:
+        spec = parse_variant_request(image_path, request.GET, request.headers.get('Accept', ''))
+    except ValueError as e:
+        return HttpResponse(str(e), status=400)
+
+    if spec.name is not None:
+        try:
+            response = _serve_variant(request, spec)
+        except Http404:
+            return HttpResponse("Image not found", status=404)
+        except Exception as e:
+            logger.error(f"Error serving variant {spec.name}: {str(e)}")
+            response = None
+        if response is not None:
+            return response
+        # The variant can't be rendered right now; the original is the next best thing
+
+    offloaded = offload_storage_object('ghiblits', image_path, _image_content_type(image_path))
+    if offloaded is not None:
+        if spec.negotiated:
+            patch_vary_headers(offloaded, ('Accept',))
+        return offloaded
     
     project_id = config('SUPABASE_PROJECT_ID')
     
@@ -254,26 +615,14 @@ def serve_cleaned_image(request, image_path):
         if response.status_code != 200:
             return HttpResponse("Image not found", status=404)
         
-        content = response.content
+        content = clean_supabase_content(response.content)
         
-        if not content.startswith(b'\x89PNG') and not content.startswith(b'\xff\xd8\xff'):
-            png_pos = content.find(b'\x89PNG\r\n\x1a\n')
-            jpeg_pos = content.find(b'\xff\xd8\xff')
-            
-            if png_pos > 0:
-                content = content[png_pos:]
-            elif jpeg_pos > 0:
-                content = content[jpeg_pos:]
-            else:
-                match = re.search(b'\d+\r\n', content)
-                if match and match.end() < 100:
-                    content = content[match.end():]
-        
-        content_type = 'image/jpeg'
-        if image_path.lower().endswith('.png'):
-            content_type = 'image/png'
+        content_type = _image_content_type(image_path)
         
-        return HttpResponse(content, content_type=content_type)
+        response = HttpResponse(content, content_type=content_type)
+        if spec.negotiated:
+            patch_vary_headers(response, ('Accept',))
+        return response
     except Exception as e:
         logger.error(f"Error serving cleaned image {image_path}: {str(e)}")
-        return HttpResponse("Error processing image", status=500)
\ No newline at end of file
+        return HttpResponse("Error processing image", status=500)
@@ -0,0 +1,66 @@
+import logging
+from functools import lru_cache
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger(__name__)
+
+WATERMARK_TEXT = "Ghibli.art"
+WATERMARK_FILL = (255, 255, 255, 75)
+
+# Tried in order; the first one FreeType can load wins
+FONT_CANDIDATES = ("arial.ttf", "DejaVuSans.ttf")
+
+# Font sizes are rounded down to a multiple of this so stamps can be reused across image sizes
+FONT_SIZE_STEP = 4
+MIN_FONT_SIZE = 16
+
+
+@lru_cache(maxsize=32)
+def load_font(size):
+    """Load the watermark font once per size, falling back to Pillow's bundled font"""
+    for name in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    logger.warning(f"No watermark font found in {FONT_CANDIDATES}, using Pillow's default font")
+    return ImageFont.load_default(size=size)
+
+
+@lru_cache(maxsize=32)
+def _stamp(font_size):
+    """
+    Pre-render the watermark text on a transparent image just large enough to hold it
+
+    Returns:
+        tuple: (RGBA stamp, (x, y) offset of the stamp from the text anchor)
+    """
+    font = load_font(font_size)
+    left, top, right, bottom = font.getbbox(WATERMARK_TEXT)
+    stamp = Image.new('RGBA', (max(1, right - left), max(1, bottom - top)), (0, 0, 0, 0))
+    ImageDraw.Draw(stamp).text((-left, -top), WATERMARK_TEXT, fill=WATERMARK_FILL, font=font)
+    return stamp, (left, top)
+
+
+def _font_size(width, height):
+    font_size = max(MIN_FONT_SIZE, min(width, height) // 20)
+    # MIN_FONT_SIZE is a multiple of the step, so rounding down never goes below it
+    return font_size - font_size % FONT_SIZE_STEP
+
+
+def stamp_watermark(img):
+    """
+    Blend the watermark into the bottom-left corner of an RGB image in place
+
+    Only the stamp's bounding box is touched, so the cost depends on the
+    stamp size rather than the image size.
+    """
+    width, height = img.size
+    font_size = _font_size(width, height)
+    padding = max(10, min(width, height) // 30)
+    stamp, (offset_x, offset_y) = _stamp(font_size)
+
+    position = (padding + offset_x, height - padding - font_size + offset_y)
+    # Using the stamp as its own mask alpha-blends it onto the region it covers
+    img.paste(stamp, position, stamp)
+    return img
@@ -1,12 +1,25 @@
 # payments/admin.py
 from django.contrib import admin
 from .models import Payment, PricingPlan, WebhookEvent
+from .services import invalidate_pricing_plans
 
 @admin.register(PricingPlan)
 class PricingPlanAdmin(admin.ModelAdmin):
     list_display = ('name', 'credits', 'price_inr', 'is_active')
     list_filter = ('is_active',)
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        invalidate_pricing_plans()
+
+    def delete_model(self, request, obj):
+        super().delete_model(request, obj)
+        invalidate_pricing_plans()
+
+    def delete_queryset(self, request, queryset):
+        super().delete_queryset(request, queryset)
+        invalidate_pricing_plans()
+
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
     list_display = ('id', 'user', 'amount', 'credits_purchased', 
@@ -1,5 +1,6 @@
 import requests
 import logging
+import time
 import hmac
 import hashlib
 import json
@@ -10,6 +11,9 @@ from .utils import get_user_country
 
 logger = logging.getLogger(__name__)
 
+# Upstream responses worth retrying with the same idempotency key
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
 class DodoPaymentsClient:
     """Client for Dodo Payments API integration"""
 
@@ -19,7 +23,7 @@ class DodoPaymentsClient:
         self.api_key = settings.DODO_API_KEY
         self.webhook_secret = settings.DODO_WEBHOOK_SECRET
 
-    def create_payment(self, request, pricing_plan, user):
+    def create_payment(self, request, pricing_plan, user, idempotency_key=None, retries=None):
         """
         Create a payment link for a user and pricing plan.
         
@@ -27,6 +31,10 @@ class DodoPaymentsClient:
             request: The HTTP request object (used for country detection)
             pricing_plan: The PricingPlan instance
             user: The User instance making the payment
+            idempotency_key: Optional key so retried requests don't create duplicate payments
+            retries: Extra attempts after timeouts, connection errors and 429/5xx
+                responses; only made when idempotency_key is set (defaults to
+                DODO_CREATE_PAYMENT_RETRIES)
             
         Returns:
             dict: Payment data including payment_id and payment_link
@@ -39,6 +47,8 @@ class DodoPaymentsClient:
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
+        if idempotency_key:
+            headers["Idempotency-Key"] = idempotency_key
 
         customer_name = f"{user.first_name} {user.last_name}".strip() or user.username
 
@@ -92,17 +102,33 @@ class DodoPaymentsClient:
             "return_url": settings.DODO_SUCCESS_URL
         }
 
+        if retries is None:
+            retries = getattr(settings, 'DODO_CREATE_PAYMENT_RETRIES', 2)
+        # Without a key a retry could create a second payment
+        attempts = 1 + (retries if idempotency_key else 0)
+
         try:
-            response = requests.post(
-                f"{self.base_url}/payments",
-                headers=headers,
-                json=payload
-            )
-            logger.info(f"Dodo create_payment response status: {response.status_code}")
-            if response.status_code != 200:
-                logger.warning(f"Dodo create_payment response text: {response.text}")
-            response.raise_for_status()
-            return response.json()
+            for attempt in range(attempts):
+                try:
+                    response = requests.post(
+                        f"{self.base_url}/payments",
+                        headers=headers,
+                        json=payload,
+                        timeout=getattr(settings, 'DODO_REQUEST_TIMEOUT', 15)
+                    )
+                except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                    if attempt + 1 == attempts:
+                        raise
+                    logger.warning(f"Dodo create_payment attempt {attempt + 1} failed: {str(e)}, retrying")
+                else:
+                    logger.info(f"Dodo create_payment response status: {response.status_code}")
+                    if response.status_code != 200:
+                        logger.warning(f"Dodo create_payment response text: {response.text}")
+                    if response.status_code not in RETRYABLE_STATUS_CODES or attempt + 1 == attempts:
+                        response.raise_for_status()
+                        return response.json()
+                    logger.warning(f"Dodo create_payment attempt {attempt + 1} got {response.status_code}, retrying")
+                time.sleep(0.5 * 2 ** attempt)
 
         except requests.exceptions.RequestException as e:
             logger.error(f"Dodo payment creation failed: {str(e)}")
@@ -110,12 +136,13 @@ class DodoPaymentsClient:
                 logger.error(f"Response status: {e.response.status_code}, Response text: {e.response.text}")
             raise
 
-    def get_payment_status(self, payment_id):
+    def get_payment_status(self, payment_id, timeout=None):
         """
         Check the status of a payment
 
         Args:
             payment_id: The Dodo payment ID
+            timeout: Optional request timeout in seconds
 
         Returns:
             dict: Payment details including status if successful
@@ -131,9 +158,11 @@ class DodoPaymentsClient:
         try:
             response = requests.get(
                 f"{self.base_url}/payments/{payment_id}",
-                headers=headers
+                headers=headers,
+                timeout=timeout
             )
-            logger.info(f"Dodo get_payment_status raw response for {payment_id} - Status: {response.status_code}, Body: {response.text}")
+            logger.info(f"Dodo get_payment_status response for {payment_id} - Status: {response.status_code}")
+            logger.debug(f"Dodo get_payment_status body for {payment_id}: {response.text}")
 
             response.raise_for_status()
             return response.json()
@@ -0,0 +1,110 @@
+import json
+import logging
+import time
+from contextlib import contextmanager
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+# How long a waiter sleeps between DB re-reads when Redis pub/sub is unavailable
+FALLBACK_WAIT_SECONDS = 2
+
+
+def _channel_name(payment_id):
+    return f'payment_status_{payment_id}'
+
+
+def _get_redis_connection():
+    """Return the raw Redis client behind the default cache, or None for non-Redis caches"""
+    try:
+        from django_redis import get_redis_connection
+        return get_redis_connection('default')
+    except Exception:
+        return None
+
+
+def publish_payment_status(payment):
+    """
+    Notify waiting clients that a payment changed status.
+
+    The message is sent after the surrounding transaction commits so waiters
+    never re-read a status that has not been persisted yet.
+    """
+    payment_id = payment.id
+    message = json.dumps({'payment_id': payment_id, 'status': payment.status})
+
+    def _publish():
+        redis = _get_redis_connection()
+        if redis is None:
+            return
+        try:
+            redis.publish(_channel_name(payment_id), message)
+        except Exception as e:
+            logger.warning(f"Failed to publish status for payment {payment_id}: {str(e)}")
+
+    transaction.on_commit(_publish)
+
+
+class PaymentStatusSubscription:
+    """Subscription to status changes of a single payment"""
+
+    def __init__(self, payment_id):
+        self.payment_id = payment_id
+        self.pubsub = None
+
+        redis = _get_redis_connection()
+        if redis is not None:
+            try:
+                self.pubsub = redis.pubsub(ignore_subscribe_messages=True)
+                self.pubsub.subscribe(_channel_name(payment_id))
+            except Exception as e:
+                logger.warning(f"Payment status subscription failed for payment {payment_id}: {str(e)}")
+                self.pubsub = None
+
+    def wait(self, timeout):
+        """
+        Block until a status change is published or the timeout elapses.
+
+        Returns:
+            dict: The published status message, or None on timeout
+        """
+        if self.pubsub is None:
+            time.sleep(min(timeout, FALLBACK_WAIT_SECONDS))
+            return None
+
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            try:
+                message = self.pubsub.get_message(timeout=remaining)
+            except Exception as e:
+                logger.warning(f"Payment status wait failed for payment {self.payment_id}: {str(e)}")
+                return None
+            if message and message.get('type') == 'message':
+                return json.loads(message['data'])
+
+    def close(self):
+        if self.pubsub is not None:
+            try:
+                self.pubsub.close()
+            except Exception:
+                pass
+
+
+@contextmanager
+def subscribe_payment_status(payment_id):
+    """
+    Subscribe to a payment's status channel.
+
+    Subscribe before reading the current status from the database so an
+    update published in between is not missed.
+    """
+    subscription = PaymentStatusSubscription(payment_id)
+    try:
+        yield subscription
+    finally:
+        subscription.close()
@@ -0,0 +1,91 @@
+import random
+import time
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from payments.models import Payment, WebhookEvent
+
+
+class Command(BaseCommand):
+    help = 'Benchmarks the webhook payment lookup and event idempotency against a large payments table'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rows',
+            type=int,
+            default=1_000_000,
+            help='Payments to seed; everything is rolled back afterwards',
+        )
+        parser.add_argument(
+            '--lookups',
+            type=int,
+            default=200,
+            help='Lookups and webhook events timed per variant',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=10_000,
+            help='Payments inserted per bulk INSERT',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            self._run(options['rows'], options['lookups'], options['batch_size'])
+            transaction.set_rollback(True)
+        self.stdout.write("Rolled back the seeded rows")
+
+    def _run(self, rows, lookups, batch_size):
+        user = User.objects.create(username=f'benchmark_webhook_{time.time_ns()}')
+        started = time.perf_counter()
+        for offset in range(0, rows, batch_size):
+            # order_id carries the same value without an index, standing in for the lookup before the migration
+            Payment.objects.bulk_create(
+                Payment(
+                    user=user,
+                    amount=1,
+                    dodo_payment_id=f'bench_pay_{i}',
+                    order_id=f'bench_pay_{i}',
+                )
+                for i in range(offset, min(offset + batch_size, rows))
+            )
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute(f"ANALYZE {connection.ops.quote_name(Payment._meta.db_table)}")
+        self.stdout.write(f"Seeded {rows} payments in {time.perf_counter() - started:.1f}s")
+
+        sample = [f'bench_pay_{random.randrange(rows)}' for _ in range(lookups)]
+        payment = Payment.objects.get(dodo_payment_id=sample[0])
+
+        def unindexed_lookup(value):
+            Payment.objects.get(order_id=value)
+
+        def indexed_lookup(value):
+            Payment.objects.get(dodo_payment_id=value)
+
+        def exists_then_create(value):
+            # The idempotency check record_once replaced: two round trips, racing between them
+            if not WebhookEvent.objects.filter(event_id=value).exists():
+                WebhookEvent.objects.create(event_id=value, event_type='payment.succeeded', payload={}, payment=payment)
+
+        def insert_on_conflict(value):
+            WebhookEvent.objects.record_once(value, 'payment.succeeded', {}, payment=payment)
+
+        self.stdout.write(f"{'':<28} {'median ms':>10} {'p95 ms':>8}")
+        self._report('lookup, unindexed column', unindexed_lookup, sample)
+        self._report('lookup by dodo_payment_id', indexed_lookup, sample)
+        # Each new event is followed by a redelivery, as Dodo retries unacknowledged webhooks
+        events = [f'bench_evt_{i // 2}' for i in range(lookups * 2)]
+        self._report('exists() then create()', exists_then_create, [f'{value}_a' for value in events])
+        self._report('record_once', insert_on_conflict, [f'{value}_b' for value in events])
+
+    def _report(self, label, func, values):
+        timings = []
+        for value in values:
+            started = time.perf_counter()
+            func(value)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        median = timings[len(timings) // 2]
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(f"{label:<28} {median:>10.3f} {p95:>8.3f}")
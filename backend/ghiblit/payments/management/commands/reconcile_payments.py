@@ -0,0 +1,102 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from payments.dodo import DodoPaymentsClient
+from payments.models import Payment
+from payments.services import PENDING_STATUSES, apply_dodo_status
+
+class Command(BaseCommand):
+    help = 'Reconciles stale pending payments against Dodo Payments'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--older-than',
+            type=int,
+            default=15,
+            help='Only reconcile payments created at least this many minutes ago',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=200,
+            help='Number of payments loaded from the database per page',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=8,
+            help='Maximum number of concurrent Dodo status requests',
+        )
+        parser.add_argument(
+            '--max-seconds',
+            type=int,
+            default=300,
+            help='Stop starting new pages after this many seconds',
+        )
+        parser.add_argument(
+            '--request-timeout',
+            type=float,
+            default=10,
+            help='Timeout in seconds for each Dodo status request',
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(minutes=options['older_than'])
+        request_timeout = options['request_timeout']
+        started = time.monotonic()
+        deadline = started + options['max_seconds']
+
+        client = DodoPaymentsClient()
+        pending = Payment.objects.filter(
+            status__in=PENDING_STATUSES,
+            created_at__lt=cutoff,
+            dodo_payment_id__isnull=False,
+        ).order_by('id')
+
+        checked = 0
+        updated = 0
+        unresolved = 0
+        last_id = 0
+        timed_out = False
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as pool:
+            while True:
+                if time.monotonic() >= deadline:
+                    timed_out = True
+                    break
+
+                page = list(pending.filter(id__gt=last_id)[:options['batch_size']])
+                if not page:
+                    break
+                last_id = page[-1].id
+
+                # Only the HTTP calls run in the pool; DB writes stay on this thread.
+                futures = {
+                    pool.submit(client.get_payment_status, payment.dodo_payment_id, request_timeout): payment
+                    for payment in page
+                }
+                done, not_done = wait(futures, timeout=max(deadline - time.monotonic(), request_timeout))
+                for future in not_done:
+                    future.cancel()
+                unresolved += len(not_done)
+
+                for future in done:
+                    payment = futures[future]
+                    previous_status = payment.status
+                    apply_dodo_status(payment, future.result())
+                    checked += 1
+                    if payment.status != previous_status:
+                        updated += 1
+
+        elapsed = time.monotonic() - started
+        rate = checked / elapsed if elapsed > 0 else 0
+        summary = (
+            f"Checked {checked} payments, updated {updated}, unresolved {unresolved} "
+            f"in {elapsed:.1f}s ({rate:.1f} payments/s)"
+        )
+        if timed_out:
+            self.stdout.write(self.style.WARNING(f"{summary}. Time limit reached; remaining payments will be picked up next run."))
+        else:
+            self.stdout.write(self.style.SUCCESS(summary))
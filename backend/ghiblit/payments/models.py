@@ -1,5 +1,6 @@
-from django.db import models
+from django.db import models, connection
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 class PricingPlan(models.Model):
     name = models.CharField(max_length=100)
@@ -34,7 +35,7 @@ class Payment(models.Model):
     currency = models.CharField(max_length=3, default='INR')
     credits_purchased = models.IntegerField(default=0)
     status = models.CharField(max_length=20, choices=PAYMENT_STATUS, default='pending')
-    dodo_payment_id = models.CharField(max_length=255, blank=True, null=True)
+    dodo_payment_id = models.CharField(max_length=255, blank=True, null=True, unique=True)
     dodo_payment_link = models.URLField(max_length=1000, blank=True, null=True)
     order_id = models.CharField(max_length=255, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -48,6 +49,56 @@ class Payment(models.Model):
         verbose_name = 'Payment'
         verbose_name_plural = 'Payments'
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['user', '-created_at'], name='payment_user_created_idx'),
+            models.Index(fields=['status', 'id'], name='payment_status_id_idx'),
+        ]
+
+class WebhookEventManager(models.Manager):
+    def record_once(self, event_id, event_type, payload, payment=None):
+        """
+        Insert a webhook event unless one with the same event_id already exists.
+
+        Uses a single INSERT ... ON CONFLICT DO NOTHING statement so concurrent
+        deliveries of the same event cannot both be processed.
+
+        Returns:
+            WebhookEvent: The newly recorded event, or None if it was a duplicate
+        """
+        created_at = timezone.now()
+        table = connection.ops.quote_name(self.model._meta.db_table)
+        sql = (
+            f"INSERT INTO {table} (event_id, event_type, payment_id, payload, processed, created_at) "
+            f"VALUES (%s, %s, %s, %s, %s, %s) "
+            f"ON CONFLICT (event_id) DO NOTHING RETURNING id"
+        )
+        params = [
+            event_id,
+            event_type,
+            payment.id if payment else None,
+            self.model._meta.get_field('payload').get_db_prep_save(payload, connection),
+            False,
+            connection.ops.adapt_datetimefield_value(created_at),
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+
+        if row is None:
+            return None
+
+        event = self.model(
+            id=row[0],
+            event_id=event_id,
+            event_type=event_type,
+            payment=payment,
+            payload=payload,
+            processed=False,
+            created_at=created_at,
+        )
+        event._state.adding = False
+        event._state.db = self.db
+        return event
 
 class WebhookEvent(models.Model):
     event_id = models.CharField(max_length=255, unique=True)
@@ -57,6 +108,8 @@ class WebhookEvent(models.Model):
     processed = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    objects = WebhookEventManager()
+
     def __str__(self):
         return f"{self.event_type} - {self.event_id}"
 
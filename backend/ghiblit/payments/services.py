@@ -0,0 +1,112 @@
+import logging
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from users.cache import invalidate_user_cache
+from users.models import UserProfile
+from .events import FINAL_STATUSES, publish_payment_status
+from .models import Payment
+
+logger = logging.getLogger(__name__)
+
+PENDING_STATUSES = ('pending', 'processing')
+
+PRICING_PLANS_TIMEOUT = 60 * 5
+PRICING_REGIONS = ('IN', 'GLOBAL')
+
+# Dodo payment statuses that settle a payment, mapped to our Payment statuses
+DODO_FINAL_STATUSES = {
+    'succeeded': 'completed',
+    'failed': 'failed',
+    'cancelled': 'cancelled',
+}
+
+
+def transition_payment(payment, new_status):
+    """
+    Move a payment to a final status, crediting the user on completion.
+
+    Safe to call from the webhook, the status check and the reconciler at the
+    same time: the status change is a conditional UPDATE, so only the caller
+    that actually changes the row grants credits.
+
+    Args:
+        payment: The Payment instance
+        new_status: One of 'completed', 'failed' or 'cancelled'
+
+    Returns:
+        bool: True if this call changed the payment
+    """
+    if new_status not in FINAL_STATUSES:
+        raise ValueError(f"Unsupported payment transition to '{new_status}'")
+
+    now = timezone.now()
+    payments = Payment.objects.filter(pk=payment.pk)
+    if new_status == 'completed':
+        # A payment may still succeed after an earlier failed attempt on the same link
+        payments = payments.exclude(status='completed')
+    else:
+        payments = payments.filter(status__in=PENDING_STATUSES)
+
+    with transaction.atomic():
+        changed = payments.update(status=new_status, updated_at=now) == 1
+
+        if changed and new_status == 'completed':
+            profile_updates = {
+                'credit_balance': F('credit_balance') + payment.credits_purchased,
+                'updated_at': now,
+            }
+            if payment.metadata.get('is_intro'):
+                profile_updates['intro_offer_redeemed'] = True
+            UserProfile.objects.filter(user_id=payment.user_id).update(**profile_updates)
+
+    if changed:
+        payment.status = new_status
+        payment.updated_at = now
+        publish_payment_status(payment)
+        if new_status == 'completed':
+            user_id = payment.user_id
+            transaction.on_commit(lambda: invalidate_user_cache(user_id))
+            logger.info(f"Payment {payment.id} completed. Added {payment.credits_purchased} credits to user {payment.user_id}")
+        else:
+            logger.info(f"Payment {payment.id} marked as {new_status}")
+    else:
+        payment.refresh_from_db(fields=['status', 'updated_at'])
+
+    return changed
+
+
+def apply_dodo_status(payment, status_data):
+    """
+    Apply a Dodo payment status response to a payment.
+
+    Args:
+        payment: The Payment instance
+        status_data: The response of DodoPaymentsClient.get_payment_status
+
+    Returns:
+        str: The lowercased Dodo status, or None if Dodo did not report one
+    """
+    if not status_data or status_data.get('status') is None:
+        return None
+
+    dodo_status = status_data['status'].lower()
+    new_status = DODO_FINAL_STATUSES.get(dodo_status)
+    if new_status:
+        transition_payment(payment, new_status)
+    return dodo_status
+
+
+def pricing_plans_cache_key(region, intro_offer_redeemed):
+    return f'pricing_plans_{region}_{int(bool(intro_offer_redeemed))}'
+
+
+def invalidate_pricing_plans():
+    """Drop every cached pricing plan listing after a plan changes"""
+    cache.delete_many([
+        pricing_plans_cache_key(region, intro_offer_redeemed)
+        for region in PRICING_REGIONS
+        for intro_offer_redeemed in (False, True)
+    ])
@@ -1,3 +1,119 @@
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from users.models import UserProfile
+from .models import Payment, WebhookEvent
+from .services import transition_payment
 
-# Create your tests here.
+
+class RecordOnceTests(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(username='ada')
+        self.payment = Payment.objects.create(user=user, amount=100, dodo_payment_id='pay_1')
+
+    def test_first_delivery_is_recorded(self):
+        # single INSERT ... ON CONFLICT DO NOTHING RETURNING
+        with self.assertNumQueries(1):
+            event = WebhookEvent.objects.record_once('evt_1', 'payment.succeeded', {'a': 1}, payment=self.payment)
+
+        self.assertIsNotNone(event)
+        stored = WebhookEvent.objects.get(event_id='evt_1')
+        self.assertEqual(event.pk, stored.pk)
+        self.assertEqual(stored.payload, {'a': 1})
+        self.assertEqual(stored.payment_id, self.payment.pk)
+        self.assertFalse(stored.processed)
+
+    def test_redelivery_is_ignored(self):
+        WebhookEvent.objects.record_once('evt_1', 'payment.succeeded', {'a': 1}, payment=self.payment)
+
+        with self.assertNumQueries(1):
+            duplicate = WebhookEvent.objects.record_once('evt_1', 'payment.succeeded', {'a': 2}, payment=self.payment)
+
+        self.assertIsNone(duplicate)
+        self.assertEqual(WebhookEvent.objects.filter(event_id='evt_1').count(), 1)
+        self.assertEqual(WebhookEvent.objects.get(event_id='evt_1').payload, {'a': 1})
+
+    def test_returned_event_can_be_saved(self):
+        event = WebhookEvent.objects.record_once('evt_1', 'payment.failed', {}, payment=None)
+        event.processed = True
+        event.save(update_fields=['processed'])
+
+        self.assertTrue(WebhookEvent.objects.get(event_id='evt_1').processed)
+        self.assertEqual(WebhookEvent.objects.count(), 1)
+
+
+class TransitionPaymentTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='ada')
+        self.payment = Payment.objects.create(user=self.user, amount=100, credits_purchased=50, status='pending')
+
+    def balance(self):
+        return UserProfile.objects.get(user=self.user).credit_balance
+
+    def test_completion_credits_once(self):
+        self.assertTrue(transition_payment(self.payment, 'completed'))
+        # A late webhook or status check for the same payment
+        stale = Payment.objects.get(pk=self.payment.pk)
+        stale.status = 'pending'
+        self.assertFalse(transition_payment(stale, 'completed'))
+
+        self.assertEqual(self.balance(), 50)
+        self.assertEqual(stale.status, 'completed')
+
+    def test_completion_after_failure_credits(self):
+        self.assertTrue(transition_payment(self.payment, 'failed'))
+        self.assertTrue(transition_payment(self.payment, 'completed'))
+
+        self.assertEqual(self.balance(), 50)
+        self.assertEqual(Payment.objects.get(pk=self.payment.pk).status, 'completed')
+
+    def test_failure_after_completion_is_ignored(self):
+        transition_payment(self.payment, 'completed')
+
+        self.assertFalse(transition_payment(self.payment, 'failed'))
+        self.assertEqual(Payment.objects.get(pk=self.payment.pk).status, 'completed')
+        self.assertEqual(self.balance(), 50)
+
+    def test_intro_offer_is_redeemed(self):
+        self.payment.metadata = {'is_intro': True}
+        self.payment.save()
+
+        transition_payment(self.payment, 'completed')
+
+        self.assertTrue(UserProfile.objects.get(user=self.user).intro_offer_redeemed)
+
+    def test_rejects_non_final_status(self):
+        with self.assertRaises(ValueError):
+            transition_payment(self.payment, 'processing')
+
+
+class WaitPaymentStatusTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='ada')
+        self.payment = Payment.objects.create(
+            user=self.user, amount=100, credits_purchased=50, status='pending', dodo_payment_id='pay_1'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def wait(self):
+        return self.client.get(reverse('payment-status-wait', args=[self.payment.pk]), {'timeout': 0})
+
+    @mock.patch('payments.views.DodoPaymentsClient.get_payment_status', return_value={'status': 'succeeded'})
+    def test_open_payment_falls_back_to_dodo(self, get_payment_status):
+        response = self.wait()
+
+        self.assertEqual(response.json()['status'], 'completed')
+        get_payment_status.assert_called_once_with('pay_1')
+        self.assertEqual(UserProfile.objects.get(user=self.user).credit_balance, 50)
+
+    @mock.patch('payments.views.DodoPaymentsClient.get_payment_status', return_value={'status': 'processing'})
+    def test_dodo_fallback_is_throttled(self, get_payment_status):
+        self.assertEqual(self.wait().json()['status'], 'pending')
+        self.assertEqual(self.wait().json()['status'], 'pending')
+
+        get_payment_status.assert_called_once()
@@ -5,6 +5,7 @@ urlpatterns = [
     path('plans/', views.get_pricing_plans, name='pricing-plans'),
     path('create/', views.CreatePaymentView.as_view(), name='create-payment'),
     path('<int:payment_id>/status/', views.check_payment_status, name='payment-status'),
+    path('<int:payment_id>/status/wait/', views.wait_payment_status, name='payment-status-wait'),
     path('history/', views.get_user_payments, name='user-payments'),
     path('webhook/', views.webhook_handler, name='webhook'),
 ]
\ No newline at end of file
@@ -1,27 +1,38 @@
 from django.contrib.gis.geoip2 import GeoIP2
 from django.conf import settings
+from django.core.cache import cache
 import os
 
+def get_client_ip(request):
+    """Return the client IP, preferring the first X-Forwarded-For hop"""
+    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded_for:
+        return x_forwarded_for.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR')
+
 def get_user_country(request):
     """
     Get user's country from IP address using GeoIP2.
     Returns country code (e.g. 'IN' for India, 'US' for United States).
+    Lookups are cached per IP for GEOIP_CACHE_TIMEOUT seconds.
     """
+    ip = get_client_ip(request)
+    cache_key = f'geoip_country_{ip}'
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached or None
+
     try:
-        # Get client IP
-        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-        if x_forwarded_for:
-            ip = x_forwarded_for.split(',')[0].strip()
-        else:
-            ip = request.META.get('REMOTE_ADDR')
-        
         g = GeoIP2()
         country = g.country(ip)
-        
-        return country['country_code']
+        country_code = country['country_code']
     except Exception as e:
         print(f"GeoIP lookup error: {e}")
-        return None
+        country_code = None
+
+    # Cache misses too (as '') so unknown IPs don't hit the GeoIP database every time
+    cache.set(cache_key, country_code or '', getattr(settings, 'GEOIP_CACHE_TIMEOUT', 60 * 60 * 24))
+    return country_code
 
 def get_user_region(request):
     """
@@ -8,37 +8,52 @@ from django.views.decorators.http import require_POST
 from django.http import HttpResponse
 from django.conf import settings
 from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from datetime import timedelta
 import json
 import logging
+import threading
 
 from .models import Payment, PricingPlan, WebhookEvent
 from .serializers import PaymentSerializer, PricingPlanSerializer
 from users.models import UserProfile
 from .dodo import DodoPaymentsClient, generate_order_id
+from .events import FINAL_STATUSES, subscribe_payment_status
+from .services import PRICING_PLANS_TIMEOUT, apply_dodo_status, pricing_plans_cache_key, transition_payment
 from .utils import get_user_region
+from config.caching import get_or_rebuild
 
 logger = logging.getLogger(__name__)
 
-@api_view(['GET'])
-@permission_classes([IsAuthenticated])
-def get_pricing_plans(request):
-    """Get active pricing plans based on user's region with intro offer handling"""
-    region = get_user_region(request)
-    user_profile = request.user.profile 
-
+def _build_pricing_plans(region, intro_offer_redeemed):
     plans_qs = PricingPlan.objects.filter(is_active=True, region=region)
 
     if not plans_qs.exists() and region != 'GLOBAL':
         plans_qs = PricingPlan.objects.filter(is_active=True, region='GLOBAL')
 
-    if user_profile.intro_offer_redeemed:
+    if intro_offer_redeemed:
         plans_qs = plans_qs.filter(is_intro_offer=False)
 
     if not plans_qs.exists():
         plans_qs = PricingPlan.objects.filter(is_active=True, region='GLOBAL', is_intro_offer=False)
 
     serializer = PricingPlanSerializer(plans_qs, many=True)
-    return Response(serializer.data)
+    return serializer.data
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_pricing_plans(request):
+    """Get active pricing plans based on user's region with intro offer handling"""
+    region = get_user_region(request)
+    intro_offer_redeemed = request.user.profile.intro_offer_redeemed
+
+    plans = get_or_rebuild(
+        pricing_plans_cache_key(region, intro_offer_redeemed),
+        lambda: _build_pricing_plans(region, intro_offer_redeemed),
+        timeout=PRICING_PLANS_TIMEOUT,
+    )
+    return Response(plans)
 
 
 class CreatePaymentView(views.APIView):
@@ -76,6 +91,39 @@ class CreatePaymentView(views.APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        existing_payment = self._find_reusable_payment(request.user, plan)
+        if existing_payment:
+            logger.info(f"Reusing pending payment {existing_payment.id} for user {request.user.id} and plan {plan.id}")
+            return Response(self._payment_response(existing_payment))
+
+        # Serialize concurrent clicks for the same plan so they cannot each create a payment
+        lock_key = f'checkout_lock_{request.user.id}_{plan.id}'
+        if not cache.add(lock_key, True, 60):
+            return Response(
+                {"error": "A checkout for this plan is already being created. Please wait."},
+                status=status.HTTP_409_CONFLICT
+            )
+
+        try:
+            return self._create_payment(request, plan)
+        finally:
+            cache.delete(lock_key)
+
+    def _find_reusable_payment(self, user, plan):
+        """Return a recent pending payment for the same plan whose link can be reused"""
+        reuse_seconds = getattr(settings, 'PAYMENT_LINK_REUSE_SECONDS', 900)
+        if not reuse_seconds:
+            return None
+
+        return Payment.objects.filter(
+            user=user,
+            created_at__gte=timezone.now() - timedelta(seconds=reuse_seconds),
+            status='pending',
+            dodo_payment_link__isnull=False,
+            metadata__plan_id=plan.id,
+        ).order_by('-created_at').first()
+
+    def _create_payment(self, request, plan):
         order_id = generate_order_id()
         
         if plan.region == 'GLOBAL':
@@ -97,20 +145,15 @@ class CreatePaymentView(views.APIView):
         
         try:
             dodo_client = DodoPaymentsClient()
-            payment_data = dodo_client.create_payment(request, plan, request.user)
+            payment_data = dodo_client.create_payment(
+                request, plan, request.user, idempotency_key=self._idempotency_key(payment)
+            )
             
             payment.dodo_payment_id = payment_data.get('payment_id')
             payment.dodo_payment_link = payment_data.get('payment_link')
-            payment.save()
+            payment.save(update_fields=['dodo_payment_id', 'dodo_payment_link', 'updated_at'])
             
-            return Response({
-                'payment_id': payment.id,
-                'dodo_payment_id': payment.dodo_payment_id,
-                'payment_url': payment.dodo_payment_link,
-                'amount': float(payment.amount),
-                'credits': payment.credits_purchased,
-                'status': payment.status
-            })
+            return Response(self._payment_response(payment))
             
         except Exception as e:
             logger.error(f"Payment creation failed: {str(e)}")
@@ -123,13 +166,42 @@ class CreatePaymentView(views.APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+    @staticmethod
+    def _idempotency_key(payment):
+        """
+        Key that Dodo deduplicates the retries of one checkout by
+
+        Tied to the Payment row, so retries of a request whose response was
+        lost get the same payment back, while every new checkout (including
+        one after a completed, failed or cancelled payment) gets a new one.
+        Repeat clicks reuse pending links through _find_reusable_payment.
+        """
+        return f"ghb-payment-{payment.pk}"
+
+    @staticmethod
+    def _payment_response(payment):
+        return {
+            'payment_id': payment.id,
+            'dodo_payment_id': payment.dodo_payment_id,
+            'payment_url': payment.dodo_payment_link,
+            'amount': float(payment.amount),
+            'credits': payment.credits_purchased,
+            'status': payment.status
+        }
+
+
+def _current_credit_balance(user):
+    """Read a user's credit balance straight from the database"""
+    return UserProfile.objects.filter(user=user).values_list('credit_balance', flat=True).first()
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def check_payment_status(request, payment_id):
     """Check the status of a payment"""
     payment = get_object_or_404(Payment, id=payment_id, user=request.user)
     
-    if payment.status in ['completed', 'failed', 'cancelled']:
+    if payment.status in FINAL_STATUSES:
         return Response({
             'payment_id': payment.id,
             'status': payment.status,
@@ -153,28 +225,25 @@ def check_payment_status(request, payment_id):
 
         if is_test_mode and came_from_success_page:
             logger.info(f"Test mode success condition MET for payment {payment.id}.")
-            if payment.status != 'completed':
-                payment.status = 'completed'
-                payment.save()
-
-                profile = request.user.profile
-                profile.credit_balance += payment.credits_purchased
-                if payment.metadata.get('is_intro'):
-                    profile.intro_offer_redeemed = True
-                    logger.info(f"Marked introductory offer as redeemed for user {request.user.id}")
-                profile.save()
-                cache.delete(f'user_profile_{request.user.id}')
-                logger.info(f"Test mode: Added {payment.credits_purchased} credits to user {request.user.id}. New balance: {profile.credit_balance}")
+            transition_payment(payment, 'completed')
 
             return Response({
                 'payment_id': payment.id,
                 'status': 'completed',
                 'credits_purchased': payment.credits_purchased,
-                'credit_balance': request.user.profile.credit_balance,
+                'credit_balance': _current_credit_balance(request.user),
                 'message': 'Payment completed (test mode)'
             })
         
         logger.info(f"Test mode success condition NOT MET for payment {payment.id}.")
+
+        if not _claim_dodo_poll(payment):
+            return Response({
+                'payment_id': payment.id,
+                'status': 'processing',
+                'message': 'Waiting for confirmation from payment provider.'
+            })
+
         status_data = dodo_client.get_payment_status(payment.dodo_payment_id)
 
         if status_data is None:
@@ -185,8 +254,8 @@ def check_payment_status(request, payment_id):
                 'message': 'Could not retrieve status from payment provider.'
             })
 
-        dodo_status_value = status_data.get('status')
-        if dodo_status_value is None:
+        dodo_status = apply_dodo_status(payment, status_data)
+        if dodo_status is None:
             logger.info(f"Dodo payment {payment.dodo_payment_id} reported status as null. Assuming pending/processing.")
             return Response({
                 'payment_id': payment.id,
@@ -194,45 +263,22 @@ def check_payment_status(request, payment_id):
                 'message': 'Payment status is currently initializing.'
             })
 
-        dodo_status = dodo_status_value.lower()
-
-        if dodo_status == 'succeeded':
-            if payment.status != 'completed':
-                payment.status = 'completed'
-                payment.save()
-
-                profile = request.user.profile
-                profile.credit_balance += payment.credits_purchased
-                if payment.metadata.get('is_intro'):
-                    profile.intro_offer_redeemed = True
-                    logger.info(f"Marked introductory offer as redeemed for user {request.user.id}")
-                profile.save()
-                cache.delete(f'user_profile_{request.user.id}')
-                logger.info(f"Payment {payment.id} completed via status check. Added {payment.credits_purchased} credits to user {request.user.id}. New balance: {profile.credit_balance}")
-
+        if payment.status == 'completed':
             return Response({
                 'payment_id': payment.id,
                 'status': 'completed',
                 'credits_purchased': payment.credits_purchased,
-                'credit_balance': request.user.profile.credit_balance
+                'credit_balance': _current_credit_balance(request.user)
             })
 
-        elif dodo_status == 'failed':
-            if payment.status != 'failed':
-                payment.status = 'failed'
-                payment.save()
-                logger.info(f"Payment {payment.id} failed via status check.")
+        elif payment.status == 'failed':
             return Response({
                 'payment_id': payment.id,
                 'status': 'failed',
                 'message': 'Payment was unsuccessful'
             })
 
-        elif dodo_status == 'cancelled':
-            if payment.status != 'cancelled':
-                payment.status = 'cancelled'
-                payment.save()
-                logger.info(f"Payment {payment.id} cancelled via status check.")
+        elif payment.status == 'cancelled':
             return Response({
                 'payment_id': payment.id,
                 'status': 'cancelled',
@@ -255,6 +301,71 @@ def check_payment_status(request, payment_id):
         )
 
 
+def _claim_dodo_poll(payment):
+    """
+    Only one poll per payment reaches Dodo per DODO_STATUS_POLL_INTERVAL;
+    concurrent polls report the stored status and pick up changes from the
+    webhook.
+    """
+    poll_interval = getattr(settings, 'DODO_STATUS_POLL_INTERVAL', 10)
+    return cache.add(f'dodo_status_poll_{payment.id}', True, poll_interval)
+
+
+# Each long-poll holds a worker thread, so only this many per process wait at once
+_status_waiters = threading.BoundedSemaphore(getattr(settings, 'PAYMENT_STATUS_MAX_WAITERS', 4))
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def wait_payment_status(request, payment_id):
+    """
+    Long-poll for a payment to change status.
+
+    Blocks until the webhook processor publishes a status change or the
+    timeout elapses, then returns the stored status. Clients should call this
+    in a loop instead of polling check_payment_status. When the process
+    already has PAYMENT_STATUS_MAX_WAITERS waiting, the current status is
+    returned at once with a Retry-After header instead.
+
+    A payment still open afterwards is checked with Dodo, throttled like
+    check_payment_status, in case its webhook was lost.
+    """
+    payment = get_object_or_404(Payment, id=payment_id, user=request.user)
+
+    max_timeout = getattr(settings, 'PAYMENT_STATUS_WAIT_TIMEOUT', 25)
+    try:
+        timeout = min(max(float(request.query_params.get('timeout', max_timeout)), 0), max_timeout)
+    except ValueError:
+        timeout = max_timeout
+
+    headers = None
+    if payment.status not in FINAL_STATUSES and timeout > 0:
+        if _status_waiters.acquire(blocking=False):
+            try:
+                with subscribe_payment_status(payment.id) as subscription:
+                    payment.refresh_from_db(fields=['status'])
+                    if payment.status not in FINAL_STATUSES:
+                        subscription.wait(timeout)
+                        payment.refresh_from_db(fields=['status'])
+            finally:
+                _status_waiters.release()
+        else:
+            logger.info(f"Too many status waiters, returning payment {payment.id} status without waiting")
+            headers = {'Retry-After': str(getattr(settings, 'PAYMENT_STATUS_BUSY_RETRY_AFTER', 2))}
+
+    if payment.status not in FINAL_STATUSES and payment.dodo_payment_id and _claim_dodo_poll(payment):
+        try:
+            apply_dodo_status(payment, DodoPaymentsClient().get_payment_status(payment.dodo_payment_id))
+        except Exception as e:
+            logger.exception(f"Error checking Dodo status for payment {payment.id}: {str(e)}")
+
+    return Response({
+        'payment_id': payment.id,
+        'status': payment.status,
+        'credits_purchased': payment.credits_purchased
+    }, headers=headers)
+
+
 @csrf_exempt
 @require_POST
 def webhook_handler(request):
@@ -280,50 +391,34 @@ def webhook_handler(request):
         event_id = webhook_id
         event_type = webhook_data.get('type')
         
-        if WebhookEvent.objects.filter(event_id=event_id).exists():
-            logger.info(f"Webhook event {event_id} already processed")
-            return HttpResponse(status=200)
-        
         payment_data = webhook_data.get('data', {})
         dodo_payment_id = payment_data.get('payment_id')
         
         try:
             payment = Payment.objects.get(dodo_payment_id=dodo_payment_id)
             
-            webhook_event = WebhookEvent.objects.create(
-                event_id=event_id,
-                event_type=event_type,
-                payment=payment,
-                payload=webhook_data,
-                processed=False
-            )
+            with transaction.atomic():
+                webhook_event = WebhookEvent.objects.record_once(
+                    event_id=event_id,
+                    event_type=event_type,
+                    payload=webhook_data,
+                    payment=payment
+                )
+                if webhook_event is None:
+                    logger.info(f"Webhook event {event_id} already processed")
+                    return HttpResponse(status=200)
             
-            if event_type == 'payment.succeeded':
-                if payment.status != 'completed':
-                    payment.status = 'completed'
-                    payment.save()
-                    
-                    user = payment.user
-                    profile = user.profile
-                    profile.credit_balance += payment.credits_purchased
-                    if payment.metadata.get('is_intro'):
-                        profile.intro_offer_redeemed = True
-                        logger.info(f"Marked introductory offer as redeemed for user {user.id}")
-                    profile.save()
-                    cache.delete(f'user_profile_{user.id}')
-                    
-                    logger.info(f"Added {payment.credits_purchased} credits to user {user.username}")
+                if event_type == 'payment.succeeded':
+                    transition_payment(payment, 'completed')
                 
-            elif event_type == 'payment.failed':
-                payment.status = 'failed'
-                payment.save()
+                elif event_type == 'payment.failed':
+                    transition_payment(payment, 'failed')
                 
-            elif event_type == 'payment.cancelled':
-                payment.status = 'cancelled'
-                payment.save()
+                elif event_type == 'payment.cancelled':
+                    transition_payment(payment, 'cancelled')
             
-            webhook_event.processed = True
-            webhook_event.save()
+                webhook_event.processed = True
+                webhook_event.save(update_fields=['processed'])
             
             return HttpResponse(status=200)
             
@@ -0,0 +1,80 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+from .cache import PRINCIPAL_CACHE_TIMEOUT, principal_cache_key
+from .models import UserProfile
+
+PRINCIPAL_USER_FIELDS = ('id', 'username', 'email', 'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser')
+PRINCIPAL_PROFILE_FIELDS = ('id', 'free_transform_used', 'intro_offer_redeemed', 'credit_balance')
+
+
+def build_principal_record(user):
+    """Compact, picklable snapshot of a user and their profile for the auth cache"""
+    try:
+        profile = user.profile
+    except UserProfile.DoesNotExist:
+        profile = None
+
+    return {
+        'user': {field: getattr(user, field) for field in PRINCIPAL_USER_FIELDS},
+        'profile': {field: getattr(profile, field) for field in PRINCIPAL_PROFILE_FIELDS} if profile else None,
+    }
+
+
+def _instance_from_values(model, values):
+    """Instantiate a model as if loaded from the database with only these fields"""
+    field_names = [f.attname for f in model._meta.concrete_fields if f.attname in values]
+    return model.from_db(DEFAULT_DB_ALIAS, field_names, [values[name] for name in field_names])
+
+
+def principal_from_record(record):
+    """
+    Rebuild a User (with its profile attached) from a cached principal record.
+
+    Fields outside the record are deferred, so reading them loads them from
+    the database and save() only writes the fields that were loaded.
+    """
+    user = _instance_from_values(User, record['user'])
+    if record['profile'] is not None:
+        user.profile = _instance_from_values(UserProfile, {**record['profile'], 'user_id': user.id})
+    return user
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWT authentication that resolves the user from a cached principal record.
+
+    A cache hit costs no queries and already carries the profile fields most
+    views need. A miss loads the user and profile with one query and caches
+    the result until invalidate_user_cache() is called for that user.
+    """
+
+    def get_user(self, validated_token):
+        if getattr(api_settings, 'CHECK_REVOKE_TOKEN', False):
+            # Revocation compares against the password hash, which is never cached
+            return super().get_user(validated_token)
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        cache_key = principal_cache_key(user_id)
+        record = cache.get(cache_key)
+        if record is not None:
+            user = principal_from_record(record)
+        else:
+            user = User.objects.select_related('profile').filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+            if user is None:
+                raise AuthenticationFailed(_("User not found"), code="user_not_found")
+            cache.set(cache_key, build_principal_record(user), PRINCIPAL_CACHE_TIMEOUT)
+
+        if getattr(api_settings, 'CHECK_USER_IS_ACTIVE', True) and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        return user
@@ -0,0 +1,44 @@
+import time
+from django.core.cache import cache
+
+# Bump when the layout of the cached principal record changes
+PRINCIPAL_RECORD_VERSION = 1
+PRINCIPAL_CACHE_TIMEOUT = 60 * 10
+
+PROFILE_PAYLOAD_TIMEOUT = 60 * 10
+# Versions must outlive the payloads keyed by them
+USER_CACHE_VERSION_TIMEOUT = 60 * 60 * 24 * 30
+
+
+def principal_cache_key(user_id):
+    return f'auth_principal_v{PRINCIPAL_RECORD_VERSION}_{user_id}'
+
+
+def _version_key(user_id):
+    return f'user_cache_version_{user_id}'
+
+
+def get_user_cache_version(user_id):
+    """
+    Current cache version for a user's derived payloads.
+
+    Versions are nanosecond timestamps rather than counters, so a version that
+    was evicted and recreated can never collide with an older one.
+    """
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = time.time_ns()
+        if not cache.add(key, version, USER_CACHE_VERSION_TIMEOUT):
+            version = cache.get(key, version)
+    return version
+
+
+def profile_payload_cache_key(user_id, version, region):
+    return f'user_profile_{user_id}_{version}_{region}'
+
+
+def invalidate_user_cache(user_id):
+    """Drop every cached view of a user after their account or credits change"""
+    cache.set(_version_key(user_id), time.time_ns(), USER_CACHE_VERSION_TIMEOUT)
+    cache.delete(principal_cache_key(user_id))
@@ -0,0 +1,62 @@
+import time
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from users.tokens import blacklist_jti, redis_blacklist_enabled
+
+class Command(BaseCommand):
+    help = 'Copies live blacklisted refresh tokens into Redis and deletes expired token rows in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=5000,
+            help='Number of rows deleted per statement',
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.0,
+            help='Seconds to sleep between delete batches to limit database load',
+        )
+        parser.add_argument(
+            '--skip-carry-over',
+            action='store_true',
+            help='Do not copy unexpired database blacklist entries into Redis',
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        now = timezone.now()
+
+        if not redis_blacklist_enabled():
+            # The database is the blacklist, so live rows must stay
+            self.stdout.write("Blacklist is kept in the database; only expired rows are deleted")
+        elif not options['skip_carry_over']:
+            # Tokens rotated before the Redis blacklist was deployed are
+            # only recorded in the database; keep them revoked until they expire.
+            carried_over = 0
+            live_blacklist = BlacklistedToken.objects.filter(
+                token__expires_at__gt=now
+            ).values_list('token__jti', 'token__expires_at')
+            for jti, expires_at in live_blacklist.iterator(chunk_size=batch_size):
+                blacklist_jti(jti, expires_at.timestamp())
+                carried_over += 1
+            self.stdout.write(f"Carried over {carried_over} blacklisted tokens to Redis")
+
+        started = time.monotonic()
+        deleted = 0
+        expired = OutstandingToken.objects.filter(expires_at__lte=now).order_by('id')
+        while True:
+            ids = list(expired.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                break
+            BlacklistedToken.objects.filter(token_id__in=ids).delete()
+            OutstandingToken.objects.filter(id__in=ids).delete()
+            deleted += len(ids)
+            if options['pause']:
+                time.sleep(options['pause'])
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired outstanding tokens in {elapsed:.1f}s"))
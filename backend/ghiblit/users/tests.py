@@ -1,3 +1,141 @@
-from django.test import TestCase
+from unittest import mock
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from redis.exceptions import ConnectionError as RedisConnectionError
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.token_blacklist.models import BlacklistedToken, OutstandingToken
+from .tokens import CachedBlacklistRefreshToken
 
-# Create your tests here.
+
+class FakeRedis:
+    """The two commands the blacklist uses, on a dict"""
+
+    def __init__(self):
+        self.keys = {}
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.keys:
+            return None
+        self.keys[key] = value
+        return True
+
+    def exists(self, key):
+        return int(key in self.keys)
+
+
+class RefreshTokenBlacklistTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='ada', password='secret')
+
+    def refresh(self, token):
+        return self.client.post(reverse('token_refresh'), {'refresh': str(token)}, content_type='application/json')
+
+    def logout(self, token):
+        return self.client.post(
+            reverse('logout'),
+            {'refresh_token': str(token)},
+            content_type='application/json',
+            HTTP_AUTHORIZATION=f'Bearer {token.access_token}',
+        )
+
+    def assert_rotation_revokes_old_token(self):
+        token = CachedBlacklistRefreshToken.for_user(self.user)
+
+        response = self.refresh(token)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.json()['refresh'], str(token))
+
+        self.assertEqual(self.refresh(token).status_code, 401)
+        self.assertEqual(self.refresh(response.json()['refresh']).status_code, 200)
+
+    def assert_logout_revokes_token(self):
+        token = CachedBlacklistRefreshToken.for_user(self.user)
+
+        self.assertEqual(self.logout(token).status_code, 205)
+        self.assertEqual(self.refresh(token).status_code, 401)
+        self.assertEqual(self.logout(token).status_code, 400)
+
+    @override_settings(JWT_BLACKLIST_REDIS=False)
+    def test_database_rotation(self):
+        self.assert_rotation_revokes_old_token()
+        # The original token and the one it was rotated into
+        self.assertEqual(BlacklistedToken.objects.count(), 2)
+
+    @override_settings(JWT_BLACKLIST_REDIS=False)
+    def test_database_logout(self):
+        self.assert_logout_revokes_token()
+
+    @override_settings(JWT_BLACKLIST_REDIS=False)
+    def test_database_blacklist_is_single_use(self):
+        token = CachedBlacklistRefreshToken.for_user(self.user)
+        token.blacklist()
+
+        with self.assertRaises(TokenError):
+            token.blacklist()
+
+    @override_settings(JWT_BLACKLIST_REDIS=True)
+    def test_redis_rotation(self):
+        with mock.patch('users.tokens._redis', return_value=FakeRedis()):
+            self.assert_rotation_revokes_old_token()
+
+        self.assertFalse(OutstandingToken.objects.exists())
+        self.assertFalse(BlacklistedToken.objects.exists())
+
+    @override_settings(JWT_BLACKLIST_REDIS=True)
+    def test_redis_logout(self):
+        with mock.patch('users.tokens._redis', return_value=FakeRedis()):
+            self.assert_logout_revokes_token()
+
+    @override_settings(JWT_BLACKLIST_REDIS=True)
+    def test_redis_blacklist_is_single_use(self):
+        with mock.patch('users.tokens._redis', return_value=FakeRedis()):
+            token = CachedBlacklistRefreshToken.for_user(self.user)
+            token.blacklist()
+
+            with self.assertRaises(TokenError):
+                token.blacklist()
+
+    @override_settings(JWT_BLACKLIST_REDIS=True)
+    def test_redis_outage_rejects_tokens(self):
+        with mock.patch('users.tokens._redis', return_value=FakeRedis()):
+            token = CachedBlacklistRefreshToken.for_user(self.user)
+
+        unavailable = mock.Mock()
+        unavailable.exists.side_effect = RedisConnectionError
+        unavailable.set.side_effect = RedisConnectionError
+        with mock.patch('users.tokens._redis', return_value=unavailable):
+            self.assertEqual(self.refresh(token).status_code, 401)
+            with self.assertRaises(TokenError):
+                token.blacklist()
+
+
+class PrincipalCacheInvalidationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='ada', password='secret', is_staff=True)
+        self.token = CachedBlacklistRefreshToken.for_user(self.user).access_token
+
+    def profile(self):
+        return self.client.get(reverse('profile'), HTTP_AUTHORIZATION=f'Bearer {self.token}')
+
+    def test_deactivated_user_is_rejected(self):
+        self.assertEqual(self.profile().status_code, 200)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+
+        self.assertEqual(self.profile().status_code, 401)
+
+    def test_profile_changes_are_served(self):
+        self.assertEqual(self.profile().json()['profile']['credit_balance'], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            profile = self.user.profile
+            profile.credit_balance = 7
+            profile.save()
+
+        self.assertEqual(self.profile().json()['profile']['credit_balance'], 7)
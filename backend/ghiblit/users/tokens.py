@@ -0,0 +1,115 @@
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import BlacklistMixin, RefreshToken
+
+
+def _blacklist_key(jti):
+    # Same key the cache API wrote before the blacklist moved to a raw connection, so no revocation is lost
+    return caches[getattr(settings, 'JWT_BLACKLIST_CACHE_ALIAS', 'default')].make_key(f'jwt_blacklist_{jti}')
+
+
+def redis_blacklist_enabled():
+    """Whether the blacklist lives in Redis; without Redis it stays in simplejwt's tables"""
+    return getattr(settings, 'JWT_BLACKLIST_REDIS', False)
+
+
+def _redis():
+    from django_redis import get_redis_connection
+
+    # The raw connection, so entries are shared by every worker and skip the process-local cache tier
+    return get_redis_connection(getattr(settings, 'JWT_BLACKLIST_CACHE_ALIAS', 'default'))
+
+
+def blacklist_jti(jti, expires_at):
+    """
+    Blacklist a token id in Redis until the token would have expired anyway.
+
+    Args:
+        jti: The token's unique identifier
+        expires_at: The token's expiry as a UNIX timestamp
+
+    Returns:
+        bool: False if the id was already blacklisted
+
+    Raises:
+        redis.exceptions.RedisError: If Redis can't be reached
+    """
+    ttl = int(expires_at - time.time())
+    if ttl <= 0:
+        # Expired tokens fail verification before the blacklist is consulted
+        return True
+    # SET NX: of two concurrent rotations of the same token, only one succeeds
+    return bool(_redis().set(_blacklist_key(jti), 1, ex=ttl, nx=True))
+
+
+def is_jti_blacklisted(jti):
+    return bool(_redis().exists(_blacklist_key(jti)))
+
+
+class CachedBlacklistRefreshToken(RefreshToken):
+    """
+    Refresh token whose blacklist lives in Redis.
+
+    simplejwt's default blacklist writes OutstandingToken/BlacklistedToken rows
+    on every issue and rotation and reads them on every refresh. Here a
+    blacklisted id is a single Redis key that expires with the token, so
+    nothing accumulates and each check is one lookup. Redis errors reject the
+    token rather than letting a possibly revoked one through.
+
+    Without JWT_BLACKLIST_REDIS the database blacklist is used as before, since
+    no other store is shared by all workers and survives restarts.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        if not redis_blacklist_enabled():
+            return super().for_user(user)
+        # Skip BlacklistMixin.for_user, which records an OutstandingToken row
+        return super(BlacklistMixin, cls).for_user(user)
+
+    def check_blacklist(self):
+        if not redis_blacklist_enabled():
+            return super().check_blacklist()
+
+        from redis.exceptions import RedisError
+
+        try:
+            blacklisted = is_jti_blacklisted(self.payload[api_settings.JTI_CLAIM])
+        except RedisError:
+            raise TokenError(_("Token blacklist is unavailable"))
+        if blacklisted:
+            raise TokenError(_("Token is blacklisted"))
+
+    def blacklist(self):
+        """
+        Revoke this token, failing if it was already revoked.
+
+        Raises:
+            TokenError: If the token was already blacklisted, e.g. by a
+                concurrent refresh of the same token, or the blacklist is
+                unavailable
+        """
+        if not redis_blacklist_enabled():
+            # BlacklistedToken is one-to-one with its token, so get_or_create only creates once
+            blacklisted_token, created = super().blacklist()
+            if not created:
+                raise TokenError(_("Token is blacklisted"))
+            return blacklisted_token
+
+        from redis.exceptions import RedisError
+
+        try:
+            created = blacklist_jti(self.payload[api_settings.JTI_CLAIM], self.payload['exp'])
+        except RedisError:
+            raise TokenError(_("Token blacklist is unavailable"))
+        if not created:
+            raise TokenError(_("Token is blacklisted"))
+
+    def outstand(self):
+        if not redis_blacklist_enabled():
+            return super().outstand()
+        return None
@@ -2,11 +2,13 @@
 from rest_framework import generics, permissions, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth.models import User
 from .serializers import RegisterSerializer, UserSerializer
+from .tokens import CachedBlacklistRefreshToken
 from django.core.cache import cache
+from django.utils.http import parse_etags, quote_etag
 from payments.utils import get_user_country
+from .cache import PROFILE_PAYLOAD_TIMEOUT, get_user_cache_version, profile_payload_cache_key
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -17,7 +19,7 @@ class RegisterView(generics.CreateAPIView):
         serializer = self.get_serializer(data=request.data)
         if serializer.is_valid():
             user = serializer.save()
-            refresh = RefreshToken.for_user(user)
+            refresh = CachedBlacklistRefreshToken.for_user(user)
             return Response({
                 "user": UserSerializer(user, context=self.get_serializer_context()).data,
                 "refresh": str(refresh),
@@ -30,32 +32,35 @@ class RegisterView(generics.CreateAPIView):
 class UserProfileView(generics.RetrieveAPIView):
     serializer_class = UserSerializer
     permission_classes = [permissions.IsAuthenticated]
-    
+
     def get_object(self):
-        cache_key = f'user_profile_{self.request.user.id}'
-        cached_profile = cache.get(cache_key)
-        
-        if cached_profile:
-            return cached_profile
-        
-        user = self.request.user
-        
-        cache.set(cache_key, user, 60 * 10)
-        
-        return user
+        return User.objects.select_related('profile').get(pk=self.request.user.pk)
 
     def retrieve(self, request, *args, **kwargs):
-        instance = self.get_object()
-        serializer = self.get_serializer(instance)
-        response_data = serializer.data
-        
-        # Get user country using the imported function
-        user_country = get_user_country(request)
-        
-        # Add the region directly to the response
-        response_data['region'] = user_country or 'GLOBAL'
-        
-        return Response(response_data)
+        user_id = request.user.id
+        region = get_user_country(request) or 'GLOBAL'
+
+        # The version changes whenever invalidate_user_cache() runs, so it
+        # doubles as the ETag and unchanged profiles are answered without the DB.
+        version = get_user_cache_version(user_id)
+        etag = quote_etag(f'{user_id}-{version}-{region}')
+        response_headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+
+        # Weak comparison: compression middleware may have weakened the ETag we sent
+        if_none_match = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+        if any(tag.removeprefix('W/') == etag for tag in if_none_match):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=response_headers)
+
+        cache_key = profile_payload_cache_key(user_id, version, region)
+        response_data = cache.get(cache_key)
+
+        if response_data is None:
+            serializer = self.get_serializer(self.get_object())
+            response_data = dict(serializer.data)
+            response_data['region'] = region
+            cache.set(cache_key, response_data, PROFILE_PAYLOAD_TIMEOUT)
+
+        return Response(response_data, headers=response_headers)
 
 
 class LogoutView(APIView):
@@ -64,7 +69,7 @@ class LogoutView(APIView):
     def post(self, request):
         try:
             refresh_token = request.data["refresh_token"]
-            token = RefreshToken(refresh_token)
+            token = CachedBlacklistRefreshToken(refresh_token)
             token.blacklist()
             return Response(status=status.HTTP_205_RESET_CONTENT)
         except Exception as e:
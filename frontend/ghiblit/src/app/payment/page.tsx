@@ -1,6 +1,6 @@
 "use client"
 
-import { useState, useEffect, useRef } from "react"
+import { useState, useEffect } from "react"
 import { useRouter } from "next/navigation"
 import { ArrowLeft, CheckCircle2, CreditCard, Loader2, Info } from "lucide-react"
 import { Button } from "@/components/ui/button"
@@ -33,7 +33,6 @@ export default function PaymentPage() {
 
   const [currentPaymentId, setCurrentPaymentId] = useState<number | null>(null)
   const [checkingStatus, setCheckingStatus] = useState(false)
-  const statusCheckIntervalRef = useRef<NodeJS.Timeout | null>(null)
 
   useEffect(() => {
     const fetchPricingPlans = async () => {
@@ -58,12 +57,6 @@ export default function PaymentPage() {
     }
 
     fetchPricingPlans()
-
-    return () => {
-      if (statusCheckIntervalRef.current) {
-        clearInterval(statusCheckIntervalRef.current)
-      }
-    }
   }, [toast])
 
   useEffect(() => {
@@ -106,55 +99,57 @@ export default function PaymentPage() {
     }
   }
 
-  const checkPaymentStatus = async () => {
-    if (!currentPaymentId || checkingStatus) return
-
-    try {
-      setCheckingStatus(true)
-      const statusResponse = await paymentService.checkPaymentStatus(currentPaymentId)
-
-      if (statusResponse.status === 'completed') {
-        toast({
-          title: "Payment successful!",
-          description: `${statusResponse.credits_purchased} credits added. Redirecting...`,
-          variant: "success",
-          duration: 3000
-        })
-
-        if (statusCheckIntervalRef.current) {
-          clearInterval(statusCheckIntervalRef.current)
+  useEffect(() => {
+    if (!currentPaymentId) return
+
+    let active = true
+    const waitForPayment = async () => {
+      while (active) {
+        const startedAt = Date.now()
+        try {
+          setCheckingStatus(true)
+          const statusResponse = await paymentService.waitForPaymentStatus(currentPaymentId)
+          if (!active) return
+
+          if (statusResponse.status === 'completed') {
+            toast({
+              title: "Payment successful!",
+              description: `${statusResponse.credits_purchased} credits added. Redirecting...`,
+              variant: "success",
+              duration: 3000
+            })
+
+            await refreshUserProfile()
+            setTimeout(() => router.push('/'), 1500)
+            return
+
+          } else if (statusResponse.status === 'failed' || statusResponse.status === 'cancelled') {
+            toast({
+              title: `Payment ${statusResponse.status}`,
+              description: statusResponse.message || `Your payment was not successful.`,
+              variant: "error"
+            })
+            setCurrentPaymentId(null)
+            return
+          }
+        } catch (error) {
+          console.error("Failed to check payment status:", error)
+        } finally {
+          setCheckingStatus(false)
         }
-        await refreshUserProfile()
-        setTimeout(() => router.push('/'), 1500)
 
-      } else if (statusResponse.status === 'failed' || statusResponse.status === 'cancelled') {
-        toast({
-          title: `Payment ${statusResponse.status}`,
-          description: statusResponse.message || `Your payment was not successful.`,
-          variant: "error"
-        })
-        if (statusCheckIntervalRef.current) {
-          clearInterval(statusCheckIntervalRef.current)
+        // The server answers at once after errors and while it is busy, so don't spin
+        const elapsed = Date.now() - startedAt
+        if (elapsed < 5000) {
+          await new Promise(resolve => setTimeout(resolve, 5000 - elapsed))
         }
-        setCurrentPaymentId(null)
       }
-    } catch (error) {
-      console.error("Failed to check payment status:", error)
-    } finally {
-      setCheckingStatus(false)
     }
-  }
 
-  useEffect(() => {
-    if (currentPaymentId) {
-      checkPaymentStatus()
-      statusCheckIntervalRef.current = setInterval(checkPaymentStatus, 5000)
+    waitForPayment()
 
-      return () => {
-        if (statusCheckIntervalRef.current) {
-          clearInterval(statusCheckIntervalRef.current)
-        }
-      }
+    return () => {
+      active = false
     }
   }, [currentPaymentId])
 
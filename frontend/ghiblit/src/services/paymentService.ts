@@ -62,6 +62,17 @@ const paymentService = {
         }
     },
 
+    waitForPaymentStatus: async (paymentId: number): Promise<PaymentStatusResponse> => {
+        try {
+            // Held open by the server until the payment changes status or its wait times out
+            const response = await api.get<PaymentStatusResponse>(`api/payments/${paymentId}/status/wait/`);
+            return response.data;
+        } catch (error) {
+            console.error("Failed to wait for payment status:", error);
+            throw error;
+        }
+    },
+
     getPaymentHistory: async (): Promise<any[]> => {
         try {
             const response = await api.get<any[]>('api/payments/history/');